@@ -35,7 +35,7 @@ class Identity(GstBase.BaseTransform):
                                            Gst.Caps.new_any()))
 
     def do_transform_ip(self, buffer):
-        Gst.info("timestamp(buffer):%s" % (Gst.TIME_ARGS(buffer.pts)))
+        Gst.info("timestamp(buffer):%s", Gst.TIME_ARGS(buffer.pts))
         return Gst.FlowReturn.OK
 
 GObject.type_register(Identity)
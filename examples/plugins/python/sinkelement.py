@@ -32,7 +32,7 @@ class MySink(GstBase.BaseSink):
                                            Gst.Caps.new_any())
 
     def do_render(self, buffer):
-        Gst.info("timestamp(buffer):%s" % (Gst.TIME_ARGS(buffer.pts)))
+        Gst.info("timestamp(buffer):%s", Gst.TIME_ARGS(buffer.pts))
         return Gst.FlowReturn.OK
 
 GObject.type_register(MySink)
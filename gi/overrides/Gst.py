@@ -26,6 +26,10 @@
 
 import sys
 import inspect
+import collections
+import threading
+import weakref
+from contextlib import contextmanager
 from ..overrides import override
 from ..importer import modules
 
@@ -97,48 +101,301 @@ class Caps(Gst.Caps):
 Caps = override(Caps)
 __all__.append('Caps')
 
-class Pad(Gst.Pad):
-    def __init__(self, *args, **kwargs):
-        self._real_chain_func = None
-        self._real_event_func = None
-        self._real_query_func = None
-        super(Gst.Pad, self).__init__(*args, **kwargs)
-
-    def _chain_override(self, pad, parent, buf):
-        return self._real_chain_func(pad, buf)
+class Buffer(Gst.Buffer):
 
-    def _event_override(self, pad, parent, event):
-        return self._real_event_func(pad, event)
-
-    def _query_override(self, pad, parent, query):
-        query.mini_object.refcount -= 1
+    @classmethod
+    def new_wrapped_object(cls, obj, release_func=None):
+        # Wraps the memory of any object implementing the buffer protocol
+        # without copying it, the object is kept alive as long as the buffer
+        # memory. The memory is read-only if the object is.
+        #
+        # @release_func is called with the object once the memory is freed,
+        # possibly from a streaming thread.
+        return _gi_gst.buffer_new_wrapped_object(obj, release_func)
+
+    @contextmanager
+    def map_memoryview(self, flags=Gst.MapFlags.READ):
+        # Zero copy access to the buffer content, the buffer is unmapped
+        # when leaving the context so views must not outlive it. BufferError
+        # is raised if some do when the block ends normally, the error of a
+        # failing block is raised as is.
+        mapping = _gi_gst.buffer_map(self, flags)
+        view = memoryview(mapping)
         try:
-            res = self._real_query_func(pad, query)
-        except TypeError:
+            yield view
+        except BaseException:
             try:
-                res = self._real_query_func(pad, parent, query)
-            except TypeError:
-                raise TypeError("Invalid query method %s, 2 or 3 arguments required"
-                                % self._real_query_func)
-        query.mini_object.refcount += 1
+                view.release()
+                mapping.unmap()
+            except BufferError:
+                pass
+            raise
+
+        view.release()
+        mapping.unmap()
+
+    def get_memfds(self):
+        # (fd, offset, size) of each memory of a buffer allocated with the
+        # allocator from memfd_allocator_get(), to share it with another
+        # process
+        return [_gi_gst.memory_get_memfd(self.peek_memory(i))
+                for i in range(self.n_memory())]
 
-        return res
+    @classmethod
+    def new_from_memfds(cls, memfds, readonly=False):
+        # Rebuilds a buffer from the result of get_memfds(), mapping the same
+        # shared memory without copying it. The file descriptors are
+        # duplicated, the caller still has to close its own.
+        buf = Gst.Buffer.new()
+        for fd, offset, size in memfds:
+            buf.append_memory(
+                _gi_gst.memfd_memory_import(fd, offset, size, readonly))
+        return buf
+
+Buffer = override(Buffer)
+__all__.append('Buffer')
+
+def _get_numpy(user):
+    # numpy is only needed by a few helpers of the overrides, don't pay for
+    # importing it when loading them
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy is required by %s" % user)
+    return numpy
+
+# pygobject does not register a GType for classes defined in gi.overrides, the
+# new GObject types implemented in the overrides need to live in a module of
+# their own
+_types_module = 'gstpython'
+
+class NumpyBufferPool(Gst.BufferPool):
+    __module__ = _types_module
+    __gtype_name__ = 'GstPyNumpyBufferPool'
+
+    # Buffer pool wrapping numpy arrays of the configured size. Gst.BufferPool
+    # already recycles the buffers themselves, arrays of buffers it discards
+    # are kept in a bounded free list and reused for the next allocations.
+    # Elements use it from their do_decide_allocation(), see
+    # decide_allocation().
+    def __init__(self, max_free_arrays=16):
+        Gst.BufferPool.__init__(self)
+        self._numpy = _get_numpy("Gst.NumpyBufferPool")
+        self._free_arrays = collections.deque()
+        self._max_free_arrays = max_free_arrays
+        self._size = 0
+
+        # the buffers only get a weak reference to the pool, which holds
+        # them, not to keep the pool alive through its own buffers
+        pool_ref = weakref.ref(self)
+
+        def recycle_array(array):
+            pool = pool_ref()
+            if pool is not None:
+                pool._recycle_array(array)
+        self._release_func = recycle_array
+
+    def decide_allocation(self, query, size=0, min_buffers=0, max_buffers=0):
+        # Makes the allocation @query of a do_decide_allocation() propose this
+        # pool first, for buffers of @size bytes or the size downstream asked
+        # for, before chaining up: the base classes then configure and
+        # activate it like any pool from the query.
+        proposed = query.get_n_allocation_pools() > 0
+        if proposed:
+            pool, query_size, query_min, query_max = \
+                query.parse_nth_allocation_pool(0)
+            size = size or query_size
+            min_buffers = max(min_buffers, query_min)
+            max_buffers = max_buffers or query_max
+
+        if size <= 0:
+            raise ValueError("The size of the buffers is not known")
+
+        if proposed:
+            query.set_nth_allocation_pool(0, self, size, min_buffers,
+                                          max_buffers)
+        else:
+            query.add_allocation_pool(self, size, min_buffers, max_buffers)
+
+    def do_set_config(self, config):
+        ret, caps, size, min_buffers, max_buffers = \
+            Gst.BufferPool.config_get_params(config)
+        if not ret:
+            return False
+
+        if size != self._size:
+            self._free_arrays.clear()
+            self._size = size
+
+        return Gst.BufferPool.do_set_config(self, config)
+
+    def do_alloc_buffer(self, params):
+        try:
+            array = self._free_arrays.pop()
+        except IndexError:
+            array = self._numpy.empty(self._size, dtype=self._numpy.uint8)
+
+        buf = Buffer.new_wrapped_object(array, self._release_func)
+        return Gst.FlowReturn.OK, buf
+
+    def do_reset_buffer(self, buffer):
+        # Drops the timestamps, flags and metas of the previous use and gives
+        # the whole array back when downstream shrank the buffer
+        Gst.BufferPool.do_reset_buffer(self, buffer)
+        size, offset, maxsize = buffer.get_sizes()
+        if (offset, size) != (0, self._size) and maxsize >= self._size:
+            buffer.resize(-offset, self._size)
+
+    def do_release_buffer(self, buffer):
+        # Buffers which no longer wrap a single array of the configured size
+        # are freed instead of going back to the queue, which recycles their
+        # array if it still has the right size
+        if buffer.n_memory() != 1 or buffer.get_sizes()[2] != self._size:
+            buffer.set_flags(Gst.BufferFlags.TAG_MEMORY)
+        Gst.BufferPool.do_release_buffer(self, buffer)
+
+    def _recycle_array(self, array):
+        if array.size == self._size and \
+                len(self._free_arrays) < self._max_free_arrays:
+            self._free_arrays.append(array)
+
+__all__.append('NumpyBufferPool')
+
+class ThreadPoolTaskPool(Gst.TaskPool):
+    __module__ = _types_module
+    __gtype_name__ = 'GstPyThreadPoolTaskPool'
+
+    # Task pool running the streaming threads of elements in a
+    # concurrent.futures.ThreadPoolExecutor. Its threads are python threads:
+    # their thread state, threading.local() data and context variables are
+    # kept between the calls into python of a task, whereas the threads of
+    # the default pool, not created by python, get new ones each time python
+    # code is called from them. Each pool has its own executor, pipelines
+    # share threads by sharing a pool.
+    #
+    # A task keeps its worker until it is stopped, so max_workers is the
+    # number of tasks that can run at once. It bounds the threads of the
+    # pipelines sharing the pool; pushing a task while all the workers are
+    # busy fails, so that the element fails to start it, since waiting for
+    # a free worker could block forever.
+    #
+    # Gst.TaskPool subclasses implement do_push_task(task), calling the
+    # PoolTask @task from any thread and returning a handle which is given
+    # to do_join_task(handle) to wait for the task to be done.
+    max_workers = 256
+
+    def __init__(self, max_workers=None):
+        Gst.TaskPool.__init__(self)
+        if max_workers is not None:
+            self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._running = 0
+
+    def _task_done(self, future):
+        with self._executor_lock:
+            self._running -= 1
+
+    def do_push_task(self, task):
+        with self._executor_lock:
+            if self._running >= self.max_workers:
+                raise RuntimeError("all the %d workers of %s are busy" %
+                                   (self.max_workers, self.get_name()))
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='gst-task')
+            self._running += 1
+            future = self._executor.submit(task)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def do_join_task(self, future):
+        future.result()
+
+    def do_cleanup(self):
+        # The threads are stopped once the running tasks are done, pushing
+        # tasks afterwards starts new ones
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+__all__.append('ThreadPoolTaskPool')
+
+class BufferList(Gst.BufferList):
+    def __getitem__(self, index):
+        # Buffers are not copied, they are returned with a new reference
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('buffer list index out of range')
+        return self.get(index)
 
+    def __len__(self):
+        return self.length()
+
+    def __iter__(self):
+        for i in range(self.length()):
+            yield self.get(i)
+
+BufferList = override(BufferList)
+__all__.append('BufferList')
+
+def _pad_function_with_parent(func):
+    # Pad functions take either (pad, obj) or (pad, parent, obj), find out
+    # once when setting them rather than on each call. The parent is only
+    # passed when a third parameter is required, so existing functions with
+    # an optional third parameter keep getting (pad, obj).
+    try:
+        params = inspect.signature(func).parameters.values()
+    except AttributeError:
+        spec = inspect.getargspec(func)
+        nargs = len(spec.args) - int(inspect.ismethod(func))
+        if nargs < 2 and spec.varargs is None:
+            raise TypeError("Invalid pad function %s, 2 or 3 arguments "
+                            "required" % func)
+        return nargs - len(spec.defaults or ()) >= 3
+    except ValueError:
+        return False
+
+    nargs = required = 0
+    for param in params:
+        if param.kind == param.VAR_POSITIONAL:
+            return required >= 3
+        if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+            nargs += 1
+            if param.default is param.empty:
+                required += 1
+
+    if nargs < 2:
+        raise TypeError("Invalid pad function %s, 2 or 3 arguments required"
+                        % func)
+    return required >= 3
+
+class Pad(Gst.Pad):
     def set_chain_function(self, func):
-        self._real_chain_func = func
-        self.set_chain_function_full(self._chain_override, None)
+        _gi_gst.pad_set_chain_function(self, func,
+                                       _pad_function_with_parent(func))
+
+    def set_chain_list_function(self, func):
+        # Lets a pad handle a whole Gst.BufferList in a single call instead
+        # of one chain function call per buffer
+        _gi_gst.pad_set_chain_list_function(self, func,
+                                            _pad_function_with_parent(func))
 
     def set_event_function(self, func):
-        self._real_event_func = func
-        self.set_event_function_full(self._event_override, None)
+        _gi_gst.pad_set_event_function(self, func,
+                                       _pad_function_with_parent(func))
 
     def set_query_function(self, func):
-        self._real_query_func = func
-        self.set_query_function_full(self._chain_override, None)
+        _gi_gst.pad_set_query_function(self, func,
+                                       _pad_function_with_parent(func))
 
     def set_query_function_full(self, func, udata):
-        self._real_query_func = func
-        self._real_set_query_function_full(self._query_override, None)
+        self.set_query_function(func)
 
     def query_caps(self, filter=None):
         return Gst.Pad.query_caps(self, filter)
@@ -149,7 +406,6 @@ class Pad(Gst.Pad):
             raise LinkError(ret)
         return ret
 
-Pad._real_set_query_function_full = Gst.Pad.set_query_function_full
 Pad = override(Pad)
 __all__.append('Pad')
 
@@ -199,6 +455,234 @@ class Iterator(Gst.Iterator):
 Iterator = override(Iterator)
 __all__.append('Iterator')
 
+class StateChangeError(Exception):
+    pass
+__all__.append('StateChangeError')
+
+class PromiseError(Exception):
+    pass
+__all__.append('PromiseError')
+
+# asyncio integration
+#
+# The messages of buses are handed over to an asyncio loop by their sync
+# handler, so any number of them can be followed from a loop without a GLib
+# main loop or a thread each. asyncio is only imported when used.
+
+def _get_event_loop():
+    import asyncio
+
+    try:
+        return asyncio.get_running_loop()
+    except (AttributeError, RuntimeError):
+        return asyncio.get_event_loop()
+
+class _BusDispatcher(object):
+    # Hands the messages of a bus its subscribers want over to their asyncio
+    # loop. It gets them in the sync handler of the bus, in the thread
+    # posting them, after the sync handler of the application if there is
+    # one. The messages of the subscribers taking them don't reach the bus,
+    # all the others are left on it. There is a single dispatcher per bus.
+    #
+    # It is kept on the bus wrapper, which pygobject keeps alive with the
+    # bus once it has attributes, and it holds the bus while it has
+    # subscribers, so that temporary wrappers like the ones get_bus() returns
+    # can be used.
+
+    @classmethod
+    def get(cls, bus, loop):
+        dispatcher = getattr(bus, '_bus_dispatcher', None)
+        if dispatcher is None:
+            dispatcher = bus._bus_dispatcher = cls(bus)
+        elif dispatcher._subscribers and dispatcher._loop is not loop:
+            raise RuntimeError("the bus is already watched by another loop")
+        dispatcher._loop = loop
+        return dispatcher
+
+    def __init__(self, bus):
+        # the wrapper refers to the dispatcher, only a weak reference while
+        # the bus is not watched
+        self._bus_ref = weakref.ref(bus)
+        self._bus = None
+        self._loop = None
+        self._subscribers = []
+
+    def subscribe(self, types, callback, take=True):
+        # @callback is called in the loop with the messages of @types, which
+        # are taken from the bus if @take
+        subscriber = (types, callback, take)
+        if not self._subscribers:
+            self._bus = self._bus_ref()
+        self._subscribers.append(subscriber)
+        self._update()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.remove(subscriber)
+        self._update()
+        if not self._subscribers:
+            self._bus = None
+
+    def _update(self):
+        types = drop_types = 0
+        for subscriber_types, callback, take in self._subscribers:
+            types |= subscriber_types
+            if take:
+                drop_types |= subscriber_types
+        _gi_gst.bus_set_dispatch(self._bus, types, drop_types,
+                                 self._post if types else None)
+
+    def _post(self, message):
+        # called from the thread posting the message
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+        except RuntimeError:
+            # the loop is closed
+            pass
+
+    def _dispatch(self, message):
+        # subscribers can unsubscribe meanwhile
+        for types, callback, take in list(self._subscribers):
+            if not message.type & types:
+                continue
+            try:
+                callback(message)
+            except Exception as e:
+                self._loop.call_exception_handler({
+                    'message': 'Exception in a bus message callback',
+                    'exception': e,
+                })
+
+class _BusMessages(object):
+    # Asynchronous iterator over the messages of a bus, queued from the moment
+    # it is created until it is closed
+    def __init__(self, bus, types):
+        self._loop = _get_event_loop()
+        self._messages = collections.deque()
+        self._waiter = None
+        self._dispatcher = _BusDispatcher.get(bus, self._loop)
+        self._subscriber = self._dispatcher.subscribe(types, self._on_message)
+
+    def _on_message(self, message):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(message)
+        else:
+            self._messages.append(message)
+        self._waiter = None
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        if self._subscriber is None and not self._messages:
+            raise StopAsyncIteration
+
+        future = self._loop.create_future()
+        if self._messages:
+            future.set_result(self._messages.popleft())
+        else:
+            self._waiter = future
+        return future
+
+    def close(self):
+        # Stops the iteration once the queued messages are consumed, waking
+        # up a consumer waiting for one
+        if self._subscriber is not None:
+            self._dispatcher.unsubscribe(self._subscriber)
+            self._subscriber = None
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(StopAsyncIteration())
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            # the loop is already closed
+            pass
+
+class Bus(Gst.Bus):
+    def drain(self, types=Gst.MessageType.ANY, max_messages=0):
+        # Pops the pending messages of @types, or at most @max_messages of
+        # them when not 0, in a single call. Unlike pop_filtered(), messages
+        # of other types are not dropped: they are posted again, in order,
+        # behind the ones posted meanwhile. Sync handlers set from python
+        # don't see them twice.
+        return _gi_gst.bus_drain(self, types, max_messages)
+
+    def set_sync_handler(self, func, *user_data):
+        # GStreamer ignores attempts to replace the sync handler of a bus,
+        # only logging a warning, RuntimeError is raised instead
+        self.set_sync_handler_filtered(Gst.MessageType.ANY, func, *user_data)
+
+    def set_sync_handler_filtered(self, types, func, *user_data):
+        # Like set_sync_handler(), but @func is only called, with the bus and
+        # the message, for messages of @types and the others are passed
+        # without running any python code
+        if func is None:
+            _gi_gst.bus_set_sync_handler(self, types, None)
+        elif user_data:
+            _gi_gst.bus_set_sync_handler(
+                self, types,
+                lambda bus, message: func(bus, message, *user_data))
+        else:
+            _gi_gst.bus_set_sync_handler(self, types, func)
+
+    def messages(self, types=Gst.MessageType.ANY):
+        # Messages of @types posted on the bus, for use with "async for" in an
+        # asyncio loop. While the iterator is open, the messages of @types
+        # are taken from the bus in its sync handler, after the one set with
+        # set_sync_handler() if any, which doesn't pass them to the iterator
+        # when it drops them. The messages of other types are left on the bus
+        # for pop(), drain() or a GLib bus watch.
+        return _BusMessages(self, types)
+
+Bus = override(Bus)
+__all__.append('Bus')
+
+class Promise(Gst.Promise):
+    @classmethod
+    def new_async(cls):
+        # Promise which can be awaited in the running asyncio loop without
+        # any thread, its reply is handed over to the loop when it changes
+        loop = _get_event_loop()
+        future = loop.create_future()
+
+        def changed(promise):
+            result = promise.wait()
+            reply = promise.get_reply()
+            loop.call_soon_threadsafe(_resolve_promise, future, result, reply)
+
+        promise = cls.new_with_change_func(changed)
+        promise._future = future
+        return promise
+
+    def __await__(self):
+        # The reply of the promise, awaiting promises not created with
+        # new_async() waits for them in a thread of the loop executor
+        future = getattr(self, '_future', None)
+        if future is None:
+            loop = _get_event_loop()
+            future = loop.create_future()
+
+            def wait():
+                result = self.wait()
+                loop.call_soon_threadsafe(_resolve_promise, future, result,
+                                          self.get_reply())
+            loop.run_in_executor(None, wait)
+        return future.__await__()
+
+def _resolve_promise(future, result, reply):
+    if future.done():
+        return
+    if result == Gst.PromiseResult.REPLIED:
+        future.set_result(reply)
+    else:
+        future.set_exception(PromiseError(result))
+
+Promise = override(Promise)
+__all__.append('Promise')
+
 
 class ElementFactory(Gst.ElementFactory):
 
@@ -220,6 +704,71 @@ class Pipeline(Gst.Pipeline):
     def __init__(self, name=None):
         Gst.Pipeline.__init__(self, name=name)
 
+    def set_state_async(self, state):
+        # asyncio future completed once the pipeline reached @state, or failed
+        # with StateChangeError if the state change or the pipeline failed
+        # meanwhile
+        loop = _get_event_loop()
+        future = loop.create_future()
+        dispatcher = _BusDispatcher.get(self.get_bus(), loop)
+
+        def on_message(message):
+            if message.type == Gst.MessageType.ERROR:
+                error, debug = message.parse_error()
+                result = StateChangeError(error.message)
+            elif message.src == self:
+                result = Gst.StateChangeReturn.SUCCESS
+            else:
+                return
+
+            dispatcher.unsubscribe(subscriber)
+            if future.done():
+                pass
+            elif isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        # subscribed first not to miss a message posted right away, the
+        # messages are left on the bus for the application
+        subscriber = dispatcher.subscribe(
+            Gst.MessageType.ASYNC_DONE | Gst.MessageType.ERROR, on_message,
+            take=False)
+        ret = self.set_state(state)
+        if ret != Gst.StateChangeReturn.ASYNC:
+            dispatcher.unsubscribe(subscriber)
+            if ret == Gst.StateChangeReturn.FAILURE:
+                future.set_exception(StateChangeError(
+                    "Could not change the state of %s to %s" %
+                    (self.get_name(), state.value_nick)))
+            else:
+                future.set_result(ret)
+
+        return future
+
+    def set_task_pool(self, pool):
+        # Runs the streaming threads the elements of the pipeline create from
+        # now on in @pool, a Gst.TaskPool such as ThreadPoolTaskPool, or in
+        # the default pool again if None. This uses the sync-message signal
+        # of the pipeline bus, its sync handler is left to the application.
+        bus = self.get_bus()
+        handler_id = getattr(self, '_task_pool_handler_id', None)
+        if handler_id is not None:
+            bus.disconnect(handler_id)
+            bus.disable_sync_message_emission()
+            self._task_pool_handler_id = None
+        if pool is None:
+            return
+
+        def on_stream_status(bus, message):
+            status, owner = message.parse_stream_status()
+            if status == Gst.StreamStatusType.CREATE:
+                message.get_stream_status_object().set_pool(pool)
+
+        bus.enable_sync_message_emission()
+        self._task_pool_handler_id = bus.connect(
+            'sync-message::stream-status', on_stream_status)
+
 Pipeline = override(Pipeline)
 __all__.append('Pipeline')
 
@@ -315,6 +864,12 @@ class Fraction(Gst.Fraction):
 Fraction = override(Fraction)
 __all__.append('Fraction')
 
+def memfd_allocator_get():
+    # Allocator whose memories are backed by shared memory file descriptors,
+    # see Buffer.get_memfds() and Buffer.new_from_memfds()
+    return _gi_gst.memfd_allocator_get()
+__all__.append('memfd_allocator_get')
+
 def TIME_ARGS(time):
     if time == Gst.CLOCK_TIME_NONE:
         return "CLOCK_TIME_NONE"
@@ -339,6 +894,25 @@ Gst.error = _gi_gst.error
 Gst.fixme = _gi_gst.fixme
 Gst.memdump = _gi_gst.memdump
 
+def debug_category_new(name, color=0, description=None):
+    # Category to log python code in, its trace() ... memdump() methods work
+    # like Gst.trace() and friends but follow the category threshold, so the
+    # output of one element can be enabled with GST_DEBUG=name:level
+    return _gi_gst.debug_category_new(name, int(color), description)
+__all__.append('debug_category_new')
+
+def python_plugin_report():
+    # What the python plugin loader did for each module: a list of dicts with
+    # its 'module' name, 'source' ("manifest", "cache" or "import"), load
+    # 'duration' in seconds, registered 'factories' and the 'error' it raised,
+    # slowest first. The plugin is loaded in this process if it wasn't yet.
+    repository = sys.modules['gi.repository.Gst']
+    if not hasattr(repository, '__python_plugin_report__'):
+        if Gst.Plugin.load_by_name('python') is None:
+            raise RuntimeError("The python plugin loader is not available")
+    return list(getattr(repository, '__python_plugin_report__', []))
+__all__.append('python_plugin_report')
+
 # Make sure PyGst is not usable if GStreamer has not been initialized
 class NotInitialized(Exception):
     pass
@@ -348,32 +922,54 @@ def fake_method(*args):
     raise NotInitialized("Please call Gst.init(argv) before using GStreamer")
 
 
-real_functions = [o for o in inspect.getmembers(Gst) if isinstance(o[1], type(Gst.init))]
-
-class_methods = []
-for cname_klass in [o for o in inspect.getmembers(Gst) if isinstance(o[1], type(Gst.Element)) or isinstance(o[1], type(Gst.Caps))]:
-    class_methods.append((cname_klass,
-                         [(o, cname_klass[1].__dict__[o])
-                          for o in cname_klass[1].__dict__
-                          if isinstance(cname_klass[1].__dict__[o], type(Gst.init))]))
+# Functions and methods of classes are replaced by fake_method until Gst is
+# initialized. Resolving the whole namespace to do so is slow, so only what
+# has already been resolved is guarded at once, anything else is guarded
+# when the introspection module resolves it on first access.
+_initialized = False
+_function_type = type(Gst.init)
+_guarded_types = (type(Gst.Element), type(Gst.Caps))
+_unguarded_functions = ("init", "init_check", "deinit")
+_real_attributes = []
+
+def _fake_attribute(owner, name, value):
+    _real_attributes.append((owner, name, value))
+    setattr(owner, name, fake_method)
+
+def _guard(name, value):
+    if isinstance(value, _function_type):
+        if name not in _unguarded_functions:
+            _fake_attribute(Gst, name, value)
+    elif isinstance(value, _guarded_types):
+        for mname, method in list(value.__dict__.items()):
+            if isinstance(method, _function_type):
+                _fake_attribute(value, mname, method)
+
+class _GuardedIntrospectionModule(type(Gst)):
+    def __getattr__(self, name):
+        value = super(_GuardedIntrospectionModule, self).__getattr__(name)
+        if not _initialized:
+            _guard(name, value)
+            value = self.__dict__.get(name, value)
+        return value
+
+Gst.__class__ = _GuardedIntrospectionModule
 
 def init_pygst():
-    for fname, function in real_functions:
-        if fname not in ["init", "init_check", "deinit"]:
-            setattr(Gst, fname, function)
+    global _initialized
 
-    for cname_class, methods in class_methods:
-        for mname, method in methods:
-            setattr(cname_class[1], mname, method)
+    _initialized = True
+    for owner, name, value in _real_attributes:
+        setattr(owner, name, value)
+    del _real_attributes[:]
 
 
 def deinit_pygst():
-    for fname, func in real_functions:
-        if fname not in ["init", "init_check", "deinit"]:
-            setattr(Gst, fname, fake_method)
-    for cname_class, methods in class_methods:
-        for mname, method in methods:
-            setattr(cname_class[1], mname, fake_method)
+    global _initialized
+
+    _initialized = False
+    for name, value in list(Gst.__dict__.items()):
+        _guard(name, value)
 
 real_init = Gst.init
 def init(argv):
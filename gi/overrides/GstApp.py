@@ -0,0 +1,361 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+#       GstApp.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import threading
+from ..importer import modules
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst  # noqa
+# the loop lookup of the Gst overrides, loaded by the import above
+from .Gst import _get_event_loop
+
+GstApp = modules['GstApp']._introspection_module
+__all__ = []
+
+
+class AppSinkStream(object):
+    # Samples of an appsink as a sync or an asyncio iterator, ending at EOS.
+    #
+    # The samples are queued by the appsink itself, up to @max_buffers of
+    # them. With the "block" @policy the streaming thread waits for room in
+    # the queue, with "drop-oldest" the oldest sample is dropped instead. No
+    # python code runs in the streaming thread unless an asyncio consumer is
+    # waiting for a sample.
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop-oldest'
+
+    def __init__(self, appsink, max_buffers=8, policy=BLOCK):
+        if policy not in (self.BLOCK, self.DROP_OLDEST):
+            raise ValueError("Invalid policy %r, must be %r or %r" %
+                             (policy, self.BLOCK, self.DROP_OLDEST))
+
+        self.appsink = appsink
+        appsink.set_max_buffers(max_buffers)
+        appsink.set_drop(policy == self.DROP_OLDEST)
+
+        self._lock = threading.Lock()
+        self._waiter = None
+        self._loop = None
+        self._handlers = []
+        self._closed = False
+
+    # Synchronous iteration, pulling blocks without holding the GIL
+
+    def __iter__(self):
+        while True:
+            sample = self.appsink.pull_sample()
+            if sample is None:
+                return
+            yield sample
+
+    def views(self, flags=Gst.MapFlags.READ):
+        # The content of the buffer of each sample as a memoryview, without
+        # copying it. A view is only valid until the next one is requested.
+        for sample in self:
+            with sample.get_buffer().map_memoryview(flags) as view:
+                yield view
+
+    # asyncio iteration
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+
+        if self._loop is None:
+            self._loop = _get_event_loop()
+            self._handlers = [
+                self.appsink.connect('new-sample', self._on_new_sample),
+                self.appsink.connect('eos', self._on_eos)]
+
+        future = self._loop.create_future()
+        if not self._try_resolve(future):
+            # the signals are only emitted while someone waits, then check
+            # again for a sample queued before that
+            with self._lock:
+                self._waiter = future
+            self.appsink.set_emit_signals(True)
+            self._wake()
+        return future
+
+    def _try_resolve(self, future):
+        sample = self.appsink.try_pull_sample(0)
+        if sample is not None:
+            future.set_result(sample)
+        elif self.appsink.is_eos():
+            future.set_exception(StopAsyncIteration())
+        else:
+            return False
+        return True
+
+    def _wake(self):
+        with self._lock:
+            future = self._waiter
+            if future is None:
+                return
+            if not future.done() and not self._try_resolve(future):
+                return
+            self._waiter = None
+        self.appsink.set_emit_signals(False)
+
+    def _notify(self):
+        # called from the streaming thread
+        with self._lock:
+            loop = self._loop if self._waiter is not None else None
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wake)
+
+    def _on_new_sample(self, appsink):
+        self._notify()
+        return Gst.FlowReturn.OK
+
+    def _on_eos(self, appsink):
+        self._notify()
+
+    def close(self):
+        # Ends the asyncio iteration, waking up its consumer, the samples
+        # left are only pulled by the synchronous iteration
+        for handler in self._handlers:
+            self.appsink.disconnect(handler)
+        self._handlers = []
+        self.appsink.set_emit_signals(False)
+        with self._lock:
+            self._closed = True
+            future, self._waiter = self._waiter, None
+            self._loop = None
+        if future is not None and not future.done():
+            future.set_exception(StopAsyncIteration())
+
+__all__.append('AppSinkStream')
+
+
+class AppSrcDriver(object):
+    # Feeds an appsrc from an iterable or an async iterable of Gst.Buffer or
+    # objects implementing the buffer protocol, which are wrapped without
+    # copying them, then ends the stream.
+    #
+    # The producer is paused when the appsrc queue is full (enough-data) and
+    # resumed once it needs data again (need-data), so at most one batch more
+    # than the appsrc max-bytes is queued. Buffers are pushed by batches of
+    # @batch_size with push_buffer_list(). When a @rate in frames per second
+    # is given, as a Gst.Fraction, a (num, denom) tuple or an integer, the
+    # appsrc is switched to the time format and the buffers are timestamped
+    # from it.
+    def __init__(self, appsrc, source, rate=None, batch_size=16):
+        if isinstance(rate, tuple):
+            rate = Gst.Fraction(*rate)
+        elif rate is not None and not isinstance(rate, Gst.Fraction):
+            rate = Gst.Fraction(rate)
+
+        self.appsrc = appsrc
+        self.source = source
+        self.batch_size = max(batch_size, 1)
+        self._rate = rate
+        if rate is not None:
+            appsrc.set_property('format', Gst.Format.TIME)
+
+        self._count = 0
+        self._batch = []
+        self._ready = threading.Event()
+        self._ready.set()
+        self._stopped = False
+        self._handlers = []
+
+        self._loop = None
+        self._done = None
+        self._iter = None
+        self._aiter = None
+        self._exhausted = False
+        self._waiting = False
+        self._busy = False
+
+    def _connect(self):
+        self._handlers = [
+            self.appsrc.connect('need-data', self._on_need_data),
+            self.appsrc.connect('enough-data', self._on_enough_data)]
+
+    def _disconnect(self):
+        for handler in self._handlers:
+            self.appsrc.disconnect(handler)
+        self._handlers = []
+
+    def _on_need_data(self, appsrc, length):
+        # called from the streaming thread
+        self._ready.set()
+        if self._waiting:
+            self._loop.call_soon_threadsafe(self._step)
+
+    def _on_enough_data(self, appsrc):
+        self._ready.clear()
+
+    def _timestamp(self, n):
+        return Gst.util_uint64_scale(n, Gst.SECOND * self._rate.denom,
+                                     self._rate.num)
+
+    def _add(self, item):
+        if isinstance(item, Gst.Buffer):
+            buf = item
+        else:
+            buf = Gst.Buffer.new_wrapped_object(item)
+
+        if self._rate is not None:
+            buf.pts = self._timestamp(self._count)
+            buf.duration = self._timestamp(self._count + 1) - buf.pts
+        self._count += 1
+        self._batch.append(buf)
+
+    def _push_batch(self):
+        batch, self._batch = self._batch, []
+        if len(batch) == 1:
+            return self.appsrc.push_buffer(batch[0])
+
+        buffer_list = Gst.BufferList.new_sized(len(batch))
+        for buf in batch:
+            buffer_list.insert(-1, buf)
+        return self.appsrc.push_buffer_list(buffer_list)
+
+    def stop(self):
+        # Stops feeding the appsrc, without ending the stream
+        self._stopped = True
+        self._ready.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._step)
+
+    # Synchronous driving
+
+    def run(self):
+        # Feeds the appsrc from the calling thread, returning the last flow
+        # return, which is not OK if downstream stopped accepting data
+        self._connect()
+        try:
+            for item in self.source:
+                self._add(item)
+                if len(self._batch) >= self.batch_size:
+                    ret = self._wait_and_push()
+                    if ret != Gst.FlowReturn.OK:
+                        return ret
+
+            if self._batch:
+                ret = self._wait_and_push()
+                if ret != Gst.FlowReturn.OK:
+                    return ret
+            return self.appsrc.end_of_stream()
+        finally:
+            self._disconnect()
+
+    def _wait_and_push(self):
+        self._ready.wait()
+        if self._stopped:
+            return Gst.FlowReturn.FLUSHING
+        return self._push_batch()
+
+    # asyncio driving
+
+    def run_async(self):
+        # Feeds the appsrc from the asyncio loop, returning a future of the
+        # last flow return. Items of synchronous iterables are pulled in the
+        # loop, so they should be quick to produce.
+        self._loop = _get_event_loop()
+        self._done = self._loop.create_future()
+        if hasattr(self.source, '__aiter__'):
+            self._aiter = self.source.__aiter__()
+        else:
+            self._iter = iter(self.source)
+
+        self._connect()
+        self._loop.call_soon(self._step)
+        return self._done
+
+    def _finish(self, ret=None, exception=None):
+        self._disconnect()
+        if self._done.done():
+            return
+        if exception is not None:
+            self._done.set_exception(exception)
+        else:
+            self._done.set_result(ret)
+
+    def _step(self):
+        # Produces and pushes until paused, waiting for an item or done
+        import asyncio
+
+        self._waiting = False
+        if self._busy or self._done.done():
+            return
+
+        if self._stopped:
+            self._finish(Gst.FlowReturn.FLUSHING)
+            return
+
+        while True:
+            if self._batch and (len(self._batch) >= self.batch_size or
+                                self._exhausted):
+                # flagged first not to miss a need-data emitted meanwhile
+                self._waiting = True
+                if not self._ready.is_set():
+                    return
+                self._waiting = False
+
+                ret = self._push_batch()
+                if ret != Gst.FlowReturn.OK:
+                    self._finish(ret)
+                else:
+                    # let the other tasks of the loop run between batches
+                    self._loop.call_soon(self._step)
+                return
+
+            if self._exhausted:
+                self._finish(self.appsrc.end_of_stream())
+                return
+
+            if self._aiter is not None:
+                self._busy = True
+                future = asyncio.ensure_future(self._aiter.__anext__())
+                future.add_done_callback(self._on_item)
+                return
+
+            try:
+                self._add(next(self._iter))
+            except StopIteration:
+                self._exhausted = True
+            except Exception as e:
+                self._finish(exception=e)
+                return
+
+    def _on_item(self, future):
+        self._busy = False
+        if self._done.done():
+            return
+
+        try:
+            self._add(future.result())
+        except StopAsyncIteration:
+            self._exhausted = True
+        except Exception as e:
+            self._finish(exception=e)
+            return
+
+        self._step()
+
+__all__.append('AppSrcDriver')
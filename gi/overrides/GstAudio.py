@@ -0,0 +1,109 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+#       GstAudio.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+
+from ..importer import modules
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst  # noqa
+from . import _gi_gst
+# loaded by the import above
+from .Gst import _get_numpy
+
+GstAudio = modules['GstAudio']._introspection_module
+__all__ = []
+
+
+def _sample_dtype(numpy, finfo):
+    if finfo.width not in (8, 16, 32, 64):
+        raise ValueError("%s samples can't be exposed as arrays" % finfo.name)
+
+    if finfo.flags & GstAudio.AudioFormatFlags.FLOAT:
+        kind = 'f'
+    elif finfo.flags & GstAudio.AudioFormatFlags.SIGNED:
+        kind = 'i'
+    else:
+        kind = 'u'
+
+    if finfo.width == 8:
+        order = '|'
+    elif finfo.endianness == 1234:  # G_LITTLE_ENDIAN
+        order = '<'
+    else:
+        order = '>'
+
+    return numpy.dtype('%s%s%d' % (order, kind, finfo.width // 8))
+
+
+def _plane_stride(offsets):
+    # Distance between the channel planes, which must be evenly spaced to be
+    # exposed as a single array
+    stride = offsets[1] - offsets[0] if len(offsets) > 1 else 0
+    for channel, offset in enumerate(offsets):
+        if offset != offsets[0] + channel * stride:
+            raise ValueError("channel planes are not evenly spaced, they "
+                             "can't be exposed as a single array")
+    return stride
+
+
+def buf_as_array(buffer, info, flags=Gst.MapFlags.READ):
+    # Map @buffer and return its samples, described by the GstAudio.AudioInfo
+    # @info, as a numpy array without copying them. The array is shaped
+    # (frames, channels) for interleaved audio and (channels, frames) for
+    # non-interleaved audio. The number of frames and the position of the
+    # channel planes come from the audio meta of the buffer when it has one,
+    # otherwise the planes follow each other.
+    #
+    # The array is writable when mapping with Gst.MapFlags.WRITE and the
+    # buffer stays mapped until the array and all views of it are released.
+    if info.finfo is None or info.bpf <= 0 or info.channels <= 0:
+        raise ValueError("invalid audio info, its format is not set")
+
+    numpy = _get_numpy("GstAudio.buf_as_array()")
+    dtype = _sample_dtype(numpy, info.finfo)
+    layout = _gi_gst.audio_meta_layout(buffer)
+    mapping = _gi_gst.buffer_map(buffer, flags)
+
+    if layout is not None:
+        frames, offsets = layout
+    else:
+        frames, offsets = mapping.size // info.bpf, None
+
+    if info.layout == GstAudio.AudioLayout.INTERLEAVED:
+        shape = (frames, info.channels)
+        strides = (info.bpf, dtype.itemsize)
+        offset = 0
+    else:
+        if offsets is None:
+            offsets = [channel * frames * dtype.itemsize
+                       for channel in range(info.channels)]
+        shape = (info.channels, frames)
+        strides = (_plane_stride(offsets), dtype.itemsize)
+        offset = offsets[0]
+
+    return numpy.ndarray(shape, dtype=dtype, buffer=mapping, offset=offset,
+                         strides=strides)
+
+__all__.append('buf_as_array')
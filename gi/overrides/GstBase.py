@@ -0,0 +1,303 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+#       GstBase.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import collections
+import os
+import threading
+import traceback
+from ..importer import modules
+from . import _gst_workers
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import GLib, Gst  # noqa
+# loaded by the import above
+from .Gst import _types_module
+
+GstBase = modules['GstBase']._introspection_module
+__all__ = []
+
+
+class ThreadPoolTransform(GstBase.BaseTransform):
+    __module__ = _types_module
+    __gtype_name__ = 'GstPyThreadPoolTransform'
+
+    # Base class for transforms whose process() method runs in a thread pool,
+    # the streaming thread keeps accepting input while previous buffers are
+    # processed, which scales when process() releases the GIL (numpy, zlib,
+    # hashlib...). Subclasses implement process(buffer), returning the buffer
+    # to push or None to drop it, and set their metadata and pad templates
+    # like any other element.
+    #
+    # Results are pushed in input order. At most max_in_flight buffers are
+    # processed at once, the streaming thread waits for the oldest one when
+    # the window is full. Serialized events are only forwarded once the
+    # buffers received before them have been pushed and flushing cancels the
+    # pending work.
+    max_workers = None
+    max_in_flight = 4
+
+    def __init__(self):
+        GstBase.BaseTransform.__init__(self)
+        self._executor = None
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._flushing = False
+        # completed on FLUSH_START, to stop waiting for a result
+        self._flush = None
+
+    def process(self, buffer):
+        raise NotImplementedError("ThreadPoolTransform subclasses must "
+                                  "implement process()")
+
+    def _create_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _submit(self, inbuf):
+        # Returns the future of the work on @inbuf and what _result() needs
+        # to know about it
+        return self._executor.submit(self.process, inbuf), None
+
+    def _result(self, future, context):
+        return future.result()
+
+    def _cancel_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, collections.deque()
+        for future, context in pending:
+            future.cancel()
+        return [future for future, context in pending]
+
+    def _pop_result(self):
+        # Waits for the oldest buffer or a flush, the GIL is released
+        # meanwhile
+        from concurrent.futures import CancelledError, wait, FIRST_COMPLETED
+
+        with self._lock:
+            if self._flushing or not self._pending:
+                return Gst.FlowReturn.FLUSHING, None
+            future, context = self._pending[0]
+            flush = self._flush
+
+        wait([future, flush], return_when=FIRST_COMPLETED)
+        if not future.done():
+            return Gst.FlowReturn.FLUSHING, None
+
+        try:
+            outbuf = self._result(future, context)
+        except CancelledError:
+            return Gst.FlowReturn.FLUSHING, None
+        except Exception as e:
+            error = GLib.Error.new_literal(Gst.stream_error_quark(), str(e),
+                                           Gst.StreamError.FAILED)
+            self.post_message(Gst.Message.new_error(
+                self, error, traceback.format_exc()))
+            return Gst.FlowReturn.ERROR, None
+        finally:
+            with self._lock:
+                if self._pending and self._pending[0][0] is future:
+                    self._pending.popleft()
+
+        return Gst.FlowReturn.OK, outbuf
+
+    def _drain(self):
+        # Pushes everything that was submitted before a serialized event,
+        # posting an error when downstream fails like a streaming task would
+        while self._pending:
+            ret, outbuf = self._pop_result()
+            if ret != Gst.FlowReturn.OK:
+                return ret
+            if outbuf is not None:
+                ret = self.srcpad.push(outbuf)
+                if ret == Gst.FlowReturn.NOT_LINKED or \
+                        ret < Gst.FlowReturn.EOS:
+                    error = GLib.Error.new_literal(
+                        Gst.stream_error_quark(),
+                        "Internal data stream error.", Gst.StreamError.FAILED)
+                    self.post_message(Gst.Message.new_error(
+                        self, error, "streaming stopped, reason %s (%d)" %
+                        (Gst.flow_get_name(ret), ret)))
+                if ret != Gst.FlowReturn.OK:
+                    return ret
+        return Gst.FlowReturn.OK
+
+    def do_start(self):
+        from concurrent.futures import Future
+
+        self._executor = self._create_executor()
+        self._flushing = False
+        self._flush = Future()
+        return True
+
+    def do_stop(self):
+        self._cancel_pending()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return True
+
+    def do_submit_input_buffer(self, is_discont, inbuf):
+        if self._flushing:
+            return Gst.FlowReturn.FLUSHING
+
+        item = self._submit(inbuf)
+        with self._lock:
+            self._pending.append(item)
+        return Gst.FlowReturn.OK
+
+    def do_generate_output(self):
+        # Called until no buffer is returned after each input buffer, only
+        # wait for a result when the window is full
+        while self._pending:
+            if not self._pending[0][0].done() and \
+                    len(self._pending) < self.max_in_flight:
+                break
+
+            ret, outbuf = self._pop_result()
+            if ret != Gst.FlowReturn.OK or outbuf is not None:
+                return ret, outbuf
+
+        return Gst.FlowReturn.OK, None
+
+    def do_sink_event(self, event):
+        # Flushing cancels the queued work without waiting for the running
+        # one, whose result is dropped. Serialized events are dropped when
+        # the buffers before them can't be pushed.
+        if event.type == Gst.EventType.FLUSH_START:
+            with self._lock:
+                self._flushing = True
+                if self._flush is not None and not self._flush.done():
+                    self._flush.set_result(None)
+            self._cancel_pending()
+        elif event.type == Gst.EventType.FLUSH_STOP:
+            from concurrent.futures import Future
+
+            self._cancel_pending()
+            with self._lock:
+                self._flush = Future()
+                self._flushing = False
+        elif Gst.EventType.get_flags(event.type) & \
+                Gst.EventTypeFlags.SERIALIZED:
+            if self._drain() != Gst.FlowReturn.OK:
+                return False
+
+        return GstBase.BaseTransform.do_sink_event(self, event)
+
+__all__.append('ThreadPoolTransform')
+
+
+class ProcessPoolTransform(ThreadPoolTransform):
+    __module__ = _types_module
+    __gtype_name__ = 'GstPyProcessPoolTransform'
+
+    # ThreadPoolTransform running the work in worker processes, for pure
+    # python code the GIL would serialize. Subclasses implement the static
+    # method process_data(data), which gets the content of a buffer as a
+    # memoryview and returns the content of the buffer to push, as a bytes-like
+    # object, or None to drop it. Like anything sent to a process pool, it
+    # must be defined at the top level of an importable module.
+    #
+    # Buffer contents are not pickled: buffers are allocated from
+    # Gst.memfd_allocator_get(), proposed to upstream elements, and the
+    # workers map their memory. Input buffers from another allocator are
+    # copied first. Results are written by the workers into output buffers
+    # of the size of the input buffer and at least output_size bytes, they
+    # must fit in them. The metadata and timestamps of the input buffer are
+    # copied to the output buffer. The workers reopen the memory of this
+    # process through /proc, which is only available on Linux.
+    output_size = 0
+
+    @staticmethod
+    def process_data(data):
+        raise NotImplementedError("ProcessPoolTransform subclasses must "
+                                  "implement process_data()")
+
+    def _create_executor(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if not os.path.isdir('/proc/self/fd'):
+            raise NotImplementedError("ProcessPoolTransform needs /proc")
+
+        # forking a process running streaming threads is not safe
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in methods else 'spawn')
+        executable = _gst_workers.python_executable()
+        if executable is not None:
+            context.set_executable(executable)
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=context)
+
+    def _get_memfd(self, buffer):
+        # The only memory of @buffer when it comes from the memfd allocator
+        if buffer.n_memory() != 1:
+            return None
+        try:
+            return buffer.get_memfds()[0]
+        except ValueError:
+            return None
+
+    def _submit(self, inbuf):
+        allocator = Gst.memfd_allocator_get()
+        size = inbuf.get_size()
+
+        shared = inbuf
+        input = self._get_memfd(inbuf)
+        if input is None:
+            shared = Gst.Buffer.new_allocate(allocator, max(size, 1), None)
+            with shared.map_memoryview(Gst.MapFlags.WRITE) as mv, \
+                    inbuf.map_memoryview(Gst.MapFlags.READ) as data:
+                mv[:size] = data
+            input = self._get_memfd(shared)[:2] + (size,)
+
+        outbuf = Gst.Buffer.new_allocate(
+            allocator, max(size, self.output_size, 1), None)
+        output = self._get_memfd(outbuf)
+
+        future = self._executor.submit(
+            _gst_workers.process_memfd, type(self).process_data, os.getpid(),
+            input, output)
+        # the buffers keep the memory open until the result is read
+        return future, (inbuf, shared, outbuf)
+
+    def _result(self, future, context):
+        inbuf, shared, outbuf = context
+        size = future.result()
+        if size is None:
+            return None
+
+        outbuf.set_size(size)
+        outbuf.copy_into(inbuf, Gst.BufferCopyFlags.FLAGS |
+                         Gst.BufferCopyFlags.TIMESTAMPS |
+                         Gst.BufferCopyFlags.META, 0, inbuf.get_size())
+        return outbuf
+
+    def do_propose_allocation(self, decide_query, query):
+        if not GstBase.BaseTransform.do_propose_allocation(
+                self, decide_query, query):
+            return False
+        query.add_allocation_param(Gst.memfd_allocator_get(), None)
+        return True
+
+__all__.append('ProcessPoolTransform')
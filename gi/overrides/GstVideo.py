@@ -0,0 +1,139 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+#       GstVideo.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+
+from contextlib import contextmanager
+from ..importer import modules
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst  # noqa
+from . import _gi_gst
+# loaded by the import above
+from .Gst import _get_numpy
+
+GstVideo = modules['GstVideo']._introspection_module
+__all__ = []
+
+
+def _sub_scale(sub, size):
+    # GST_VIDEO_SUB_SCALE
+    return -((-size) >> sub)
+
+
+def _plane_layout(info, plane):
+    finfo = info.finfo
+    flags = finfo.flags
+
+    if flags & GstVideo.VideoFormatFlags.PALETTE and plane == 1:
+        return (256, 4), (4, 1), 'u1'
+
+    comps = [c for c in range(finfo.n_components) if finfo.plane[c] == plane]
+    if not comps:
+        # nothing describes the plane, rows of bytes as tall as the frame
+        return (info.height, None), (None, 1), 'u1'
+
+    if finfo.bits <= 8:
+        dtype = 'u1'
+    elif finfo.bits <= 16:
+        dtype = '<u2' if flags & GstVideo.VideoFormatFlags.LE else '>u2'
+    else:
+        dtype = None
+
+    # Components of the plane describe the element layout, formats where
+    # they don't share a single pixel stride (YUY2, v210, ...) are exposed
+    # as raw rows of bytes
+    h_sub = max(finfo.h_sub[c] for c in comps)
+    height = _sub_scale(h_sub, info.height)
+    pixel_strides = set(finfo.pixel_stride[c] for c in comps)
+    w_subs = set(finfo.w_sub[c] for c in comps)
+    if dtype is not None and len(pixel_strides) == 1 and len(w_subs) == 1:
+        pixel_stride = pixel_strides.pop()
+        itemsize = 1 if dtype == 'u1' else 2
+        if pixel_stride > 0 and pixel_stride % itemsize == 0:
+            width = _sub_scale(w_subs.pop(), info.width)
+            n_items = pixel_stride // itemsize
+            if n_items == 1:
+                return (height, width), (None, itemsize), dtype
+            return ((height, width, n_items),
+                    (None, pixel_stride, itemsize), dtype)
+
+    return (height, None), (None, 1), 'u1'
+
+
+def _plane_arrays(numpy, mapping, info):
+    # The strides are the ones of the mapped frame, which follow the video
+    # meta of the buffer when upstream uses another layout than the caps.
+    # The memory of the planes of bottom-up frames, with negative strides,
+    # starts with their last row.
+    planes = []
+    for plane, (data, stride) in enumerate(zip(mapping.planes,
+                                               mapping.strides)):
+        shape, item_strides, dtype = _plane_layout(info, plane)
+        if shape[1] is None:
+            shape = (shape[0], abs(stride))
+        if item_strides[0] is None:
+            item_strides = (stride,) + item_strides[1:]
+        offset = -stride * (shape[0] - 1) if stride < 0 else 0
+
+        planes.append(numpy.ndarray(shape, dtype=dtype, buffer=data,
+                                    offset=offset, strides=item_strides))
+
+    return tuple(planes)
+
+
+@contextmanager
+def map_frame_planes(buffer, info, flags=Gst.MapFlags.READ):
+    # Map @buffer as a GstVideo.VideoFrame of the GstVideo.VideoInfo @info
+    # and yield one numpy array per plane, the arrays are views of the buffer
+    # memory and are writable when mapping with Gst.MapFlags.WRITE.
+    #
+    # The frame is unmapped when leaving the context, the arrays and views of
+    # them must have been released by then (del them in the block, they are
+    # still bound to their names otherwise). BufferError is raised if some
+    # are still alive when the block ends normally, the error of a failing
+    # block is raised as is. Either way the frame stays mapped until the
+    # last of them is released.
+    numpy = _get_numpy("GstVideo.map_frame_planes()")
+    if info.finfo.flags & GstVideo.VideoFormatFlags.TILED:
+        raise ValueError("tiled video formats can't be exposed as arrays")
+
+    mapping = _gi_gst.video_frame_map(buffer, info, flags)
+    planes = _plane_arrays(numpy, mapping, info)
+    try:
+        yield planes
+    except BaseException:
+        # the views still alive are most likely the ones of the failing
+        # block, its error is the one to report
+        del planes
+        try:
+            mapping.unmap()
+        except BufferError:
+            pass
+        raise
+
+    del planes
+    mapping.unmap()
+
+__all__.append('map_frame_planes')
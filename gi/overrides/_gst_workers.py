@@ -0,0 +1,86 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+#       _gst_workers.py
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+# What the worker processes of GstBase.ProcessPoolTransform run. Functions
+# are sent to workers by reference and the workers import their module, so
+# this one must not import gi: gi.overrides.GstBase can only be imported
+# through gi.repository.
+
+import mmap
+import os
+import sys
+
+
+def python_executable():
+    # Returns the python interpreter to start workers with when it is not
+    # sys.executable, which is the program that loaded the python plugin
+    # when python is embedded, None if it is
+    executable = sys.executable
+    if executable and \
+            os.path.basename(executable).lower().startswith('python'):
+        return None
+
+    version = '%d.%d' % sys.version_info[:2]
+    candidates = [os.path.join(sys.exec_prefix, 'bin', 'python' + version),
+                  os.path.join(sys.exec_prefix, 'bin',
+                               'python%d' % sys.version_info[0]),
+                  os.path.join(sys.exec_prefix, 'python.exe')]
+    for candidate in candidates:
+        if os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def _map_memfd(pid, fd, writable):
+    # Maps the whole memfd segment @fd of the process @pid, which is reopened
+    # through /proc since file descriptors can't be sent to pool workers
+    with open('/proc/%d/fd/%d' % (pid, fd), 'r+b' if writable else 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE
+                         if writable else mmap.ACCESS_READ)
+
+
+def process_memfd(process_data, pid, input, output):
+    # Runs process_data() in a worker on the input memory and writes the
+    # result to the output memory, both given as the (fd, offset, size) of a
+    # memory of the pid process, returning the size of the result
+    in_fd, in_offset, in_size = input
+    out_fd, out_offset, out_size = output
+    in_map = _map_memfd(pid, in_fd, False)
+    out_map = _map_memfd(pid, out_fd, True)
+    data = memoryview(in_map)[in_offset:in_offset + in_size]
+    try:
+        result = process_data(data)
+        if result is None:
+            return None
+
+        result = memoryview(result).cast('B')
+        try:
+            if result.nbytes > out_size:
+                raise ValueError("process_data() returned %d bytes, more "
+                                 "than the %d bytes of the output buffer" %
+                                 (result.nbytes, out_size))
+            out_map[out_offset:out_offset + result.nbytes] = result
+            return result.nbytes
+        finally:
+            result.release()
+    finally:
+        data.release()
+        in_map.close()
+        out_map.close()
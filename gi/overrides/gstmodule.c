@@ -29,6 +29,8 @@
 #include <Python.h>
 #include <pygobject.h>
 #include <gst/gst.h>
+#include <gst/video/video.h>
+#include <gst/audio/audio.h>
 
 #include <locale.h>
 
@@ -51,6 +53,7 @@ PyMODINIT_FUNC PyInit_##symbol(void)                    \
     PyObject *module;                                   \
     module = PyModule_Create(&_##symbol##module);
 #define PYGLIB_MODULE_END return module; }
+#define PYGLIB_MODULE_ERROR_RETURN return NULL
 #else
 #define PYGLIB_MODULE_START(symbol, modname)            \
 DL_EXPORT(void) init##symbol(void);         \
@@ -59,8 +62,41 @@ DL_EXPORT(void) init##symbol(void)          \
     PyObject *module;                                   \
     module = Py_InitModule(modname, symbol##_functions);
 #define PYGLIB_MODULE_END }
+#define PYGLIB_MODULE_ERROR_RETURN return
 #endif
 
+/* Free-threaded python
+ *
+ * Without a GIL, state shared between threads must be protected by other
+ * means: objects with mutable state use critical sections, which are
+ * no-ops with a GIL, and items are taken from dicts as strong references
+ * as another thread can remove them at any time. */
+#ifdef Py_GIL_DISABLED
+#define PYGST_BEGIN_CRITICAL_SECTION(op) Py_BEGIN_CRITICAL_SECTION (op)
+#define PYGST_END_CRITICAL_SECTION() Py_END_CRITICAL_SECTION ()
+#else
+#define PYGST_BEGIN_CRITICAL_SECTION(op) {
+#define PYGST_END_CRITICAL_SECTION() }
+#endif
+
+/* Returns a new reference to the item @key of @dict, or NULL without setting
+ * an exception if there is none */
+static PyObject *
+pygst_dict_get_item_string (PyObject * dict, const gchar * key)
+{
+  PyObject *item;
+
+#if PY_VERSION_HEX >= 0x030D0000
+  if (PyDict_GetItemStringRef (dict, key, &item) < 0)
+    PyErr_Clear ();
+#else
+  item = PyDict_GetItemString (dict, key);
+  Py_XINCREF (item);
+#endif
+
+  return item;
+}
+
 GST_DEBUG_CATEGORY_STATIC (python_debug);
 GST_DEBUG_CATEGORY_STATIC (pygst_debug);
 #define GST_CAT_DEFAULT pygst_debug
@@ -228,167 +264,2227 @@ _pygst_element_init (gpointer gclass, PyTypeObject * pyclass)
   PyObject *templates, *metadata;
 
   GST_DEBUG ("_pygst_element_init for gclass %p", gclass);
-  templates = PyDict_GetItemString (pyclass->tp_dict, "__gsttemplates__");
+  templates = pygst_dict_get_item_string (pyclass->tp_dict,
+      "__gsttemplates__");
   if (templates) {
-    if (add_templates (gclass, templates) != 0)
+    gint ret = add_templates (gclass, templates);
+
+    Py_DECREF (templates);
+    if (ret != 0)
       return -1;
-  } else {
-    PyErr_Clear ();
   }
-  metadata = PyDict_GetItemString (pyclass->tp_dict, "__gstmetadata__");
+  metadata = pygst_dict_get_item_string (pyclass->tp_dict, "__gstmetadata__");
   if (metadata) {
-    if (_pygst_element_set_metadata (gclass, metadata) != 0)
+    gint ret = _pygst_element_set_metadata (gclass, metadata);
+
+    Py_DECREF (metadata);
+    if (ret != 0)
       return -1;
-    PyDict_DelItemString (pyclass->tp_dict, "__gstmetadata__");
-  } else {
-    PyErr_Clear ();
+    if (PyDict_DelItemString (pyclass->tp_dict, "__gstmetadata__") < 0)
+      PyErr_Clear ();
   }
 
   return 0;
 }
 
-#include <frameobject.h>
+/* Buffer mappings
+ *
+ * A BufferMapping keeps a GstBuffer mapped for as long as it is alive and
+ * exposes the mapped memory through the buffer protocol, so memoryview,
+ * numpy and friends can access the data without copying it. The mapping
+ * holds a reference on the buffer and can only be unmapped once every
+ * exported view has been released. */
 
-static PyObject *
-pygst_debug_log (PyObject * pyobject, PyObject * string, GstDebugLevel level,
-    gboolean isgstobject)
+#if PY_MAJOR_VERSION < 3
+#define PYGST_TPFLAGS_BUFFER Py_TPFLAGS_HAVE_NEWBUFFER
+#else
+#define PYGST_TPFLAGS_BUFFER 0
+#endif
+
+typedef struct
 {
-#ifndef GST_DISABLE_GST_DEBUG
-  gchar *str;
-  gchar *function;
-  gchar *filename;
-  int lineno;
-  PyFrameObject *frame;
-  GObject *object = NULL;
+  PyObject_HEAD
+  GstBuffer *buffer;
+  GstMapInfo info;
+  gboolean mapped;
+  Py_ssize_t exports;
+} PyGstBufferMapping;
 
-  if (!PyArg_ParseTuple (string, "s:gst.debug_log", &str)) {
-    PyErr_SetString (PyExc_TypeError, "Need a string!");
-    return NULL;
+static PyTypeObject PyGstBufferMapping_Type;
+
+static void
+pygst_buffer_mapping_release (PyGstBufferMapping * self)
+{
+  if (self->mapped) {
+    gst_buffer_unmap (self->buffer, &self->info);
+    self->mapped = FALSE;
   }
+}
 
-  frame = PyEval_GetFrame ();
-#if PY_MAJOR_VERSION >= 3
-  {
-    PyObject *utf8;
-    const gchar *utf8_str;
+static void
+pygst_buffer_mapping_dealloc (PyGstBufferMapping * self)
+{
+  pygst_buffer_mapping_release (self);
+  if (self->buffer)
+    gst_buffer_unref (self->buffer);
+  Py_TYPE (self)->tp_free ((PyObject *) self);
+}
+
+static int
+pygst_buffer_mapping_getbuffer (PyGstBufferMapping * self, Py_buffer * view,
+    int flags)
+{
+  if (!self->mapped) {
+    PyErr_SetString (PyExc_ValueError, "buffer is not mapped");
+    view->obj = NULL;
+    return -1;
+  }
+
+  if (PyBuffer_FillInfo (view, (PyObject *) self, self->info.data,
+          self->info.size, !(self->info.flags & GST_MAP_WRITE), flags) < 0)
+    return -1;
+
+  self->exports++;
+  return 0;
+}
+
+static int
+pygst_buffer_mapping_getbuffer_locked (PyGstBufferMapping * self,
+    Py_buffer * view, int flags)
+{
+  int ret;
 
-    utf8 = PyUnicode_AsUTF8String (frame->f_code->co_name);
-    utf8_str = PyBytes_AS_STRING (utf8);
+  PYGST_BEGIN_CRITICAL_SECTION (self);
+  ret = pygst_buffer_mapping_getbuffer (self, view, flags);
+  PYGST_END_CRITICAL_SECTION ();
+
+  return ret;
+}
+
+static void
+pygst_buffer_mapping_releasebuffer (PyGstBufferMapping * self,
+    Py_buffer * view)
+{
+  PYGST_BEGIN_CRITICAL_SECTION (self);
+  self->exports--;
+  PYGST_END_CRITICAL_SECTION ();
+}
 
-    function = g_strdup (utf8_str);
-    Py_DECREF (utf8);
+static PyObject *
+pygst_buffer_mapping_unmap (PyGstBufferMapping * self, PyObject * unused)
+{
+  gssize exports;
 
-    utf8 = PyUnicode_AsUTF8String (frame->f_code->co_filename);
-    utf8_str = PyBytes_AS_STRING (utf8);
+  PYGST_BEGIN_CRITICAL_SECTION (self);
+  exports = self->exports;
+  if (exports == 0)
+    pygst_buffer_mapping_release (self);
+  PYGST_END_CRITICAL_SECTION ();
 
-    filename = g_strdup (utf8_str);
-    Py_DECREF (utf8);
+  if (exports > 0) {
+    PyErr_Format (PyExc_BufferError,
+        "cannot unmap buffer, %" G_GSSIZE_FORMAT " exported views still exist",
+        exports);
+    return NULL;
   }
-#else
-  function = g_strdup (PyString_AsString (frame->f_code->co_name));
-  filename =
-      g_path_get_basename (PyString_AsString (frame->f_code->co_filename));
-#endif
-  lineno = PyCode_Addr2Line (frame->f_code, frame->f_lasti);
-  /* gst_debug_log : category, level, file, function, line, object, format, va_list */
-  if (isgstobject)
-    object = G_OBJECT (pygobject_get (pyobject));
-  gst_debug_log (python_debug, level, filename, function, lineno, object,
-      "%s", str);
-  if (function)
-    g_free (function);
-  if (filename)
-    g_free (filename);
-#endif
+
   Py_INCREF (Py_None);
   return Py_None;
 }
 
 static PyObject *
-_wrap_gst_trace (PyObject * whatever, PyObject * string)
+pygst_buffer_mapping_get_size (PyGstBufferMapping * self, void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_TRACE, FALSE);
+  return PyLong_FromSize_t (self->info.size);
 }
 
 static PyObject *
-_wrap_gst_log (PyObject * whatever, PyObject * string)
+pygst_buffer_mapping_get_writable (PyGstBufferMapping * self, void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_LOG, FALSE);
+  return PyBool_FromLong ((self->info.flags & GST_MAP_WRITE) != 0);
 }
 
 static PyObject *
-_wrap_gst_debug (PyObject * whatever, PyObject * string)
+pygst_buffer_mapping_get_mapped (PyGstBufferMapping * self, void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_DEBUG, FALSE);
+  return PyBool_FromLong (self->mapped);
 }
 
+static PyMethodDef pygst_buffer_mapping_methods[] = {
+  {"unmap", (PyCFunction) pygst_buffer_mapping_unmap, METH_NOARGS,
+      "Unmap the buffer, all exported views must have been released"},
+  {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef pygst_buffer_mapping_getsets[] = {
+  {(char *) "size", (getter) pygst_buffer_mapping_get_size, NULL,
+      (char *) "Size in bytes of the mapped memory", NULL},
+  {(char *) "writable", (getter) pygst_buffer_mapping_get_writable, NULL,
+      (char *) "Whether the buffer was mapped for writing", NULL},
+  {(char *) "mapped", (getter) pygst_buffer_mapping_get_mapped, NULL,
+      (char *) "Whether the buffer is still mapped", NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyBufferProcs pygst_buffer_mapping_as_buffer = {
+  .bf_getbuffer = (getbufferproc) pygst_buffer_mapping_getbuffer_locked,
+  .bf_releasebuffer = (releasebufferproc) pygst_buffer_mapping_releasebuffer,
+};
+
+static PyTypeObject PyGstBufferMapping_Type = {
+  PyVarObject_HEAD_INIT (NULL, 0)
+  .tp_name = "_gi_gst.BufferMapping",
+  .tp_basicsize = sizeof (PyGstBufferMapping),
+  .tp_dealloc = (destructor) pygst_buffer_mapping_dealloc,
+  .tp_as_buffer = &pygst_buffer_mapping_as_buffer,
+  .tp_flags = Py_TPFLAGS_DEFAULT | PYGST_TPFLAGS_BUFFER,
+  .tp_doc = "Mapped memory of a Gst.Buffer",
+  .tp_methods = pygst_buffer_mapping_methods,
+  .tp_getset = pygst_buffer_mapping_getsets,
+};
+
 static PyObject *
-_wrap_gst_info (PyObject * whatever, PyObject * string)
+_wrap_gst_buffer_map (PyObject * whatever, PyObject * args)
+{
+  PyObject *py_buffer;
+  PyGstBufferMapping *mapping;
+  GstBuffer *buffer;
+  guint flags;
+  gboolean ret;
+
+  if (!PyArg_ParseTuple (args, "OI:buffer_map", &py_buffer, &flags))
+    return NULL;
+
+  if (!pyg_boxed_check (py_buffer, GST_TYPE_BUFFER)) {
+    PyErr_SetString (PyExc_TypeError, "buffer_map expects a Gst.Buffer");
+    return NULL;
+  }
+
+  buffer = pyg_boxed_get (py_buffer, GstBuffer);
+  if ((flags & GST_MAP_WRITE) && !gst_buffer_is_writable (buffer)) {
+    PyErr_SetString (PyExc_ValueError, "buffer is not writable");
+    return NULL;
+  }
+
+  mapping = PyObject_New (PyGstBufferMapping, &PyGstBufferMapping_Type);
+  if (mapping == NULL)
+    return NULL;
+
+  mapping->buffer = NULL;
+  mapping->mapped = FALSE;
+  mapping->exports = 0;
+
+  Py_BEGIN_ALLOW_THREADS;
+  ret = gst_buffer_map (buffer, &mapping->info, flags);
+  Py_END_ALLOW_THREADS;
+
+  if (!ret) {
+    Py_DECREF (mapping);
+    PyErr_SetString (PyExc_ValueError, "could not map buffer");
+    return NULL;
+  }
+
+  /* Only take our reference once mapped, the buffer must be writable for
+   * write mappings */
+  mapping->buffer = gst_buffer_ref (buffer);
+  mapping->mapped = TRUE;
+
+  return (PyObject *) mapping;
+}
+
+/* Video frame mappings
+ *
+ * A VideoFrameMapping keeps a GstVideoFrame mapped with
+ * gst_video_frame_map(), which follows the video meta of the buffer and its
+ * map function, and exposes each plane through the buffer protocol with a
+ * VideoPlane. Like with buffer mappings, the frame can only be unmapped
+ * once every view exported by its planes has been released. */
+
+typedef struct
+{
+  PyObject_HEAD
+  GstVideoFrame frame;
+  GstMapFlags flags;
+  gboolean mapped;
+  Py_ssize_t exports;
+} PyGstVideoFrameMapping;
+
+typedef struct
+{
+  PyObject_HEAD
+  PyGstVideoFrameMapping *mapping;
+  guint plane;
+} PyGstVideoPlane;
+
+static PyTypeObject PyGstVideoFrameMapping_Type;
+static PyTypeObject PyGstVideoPlane_Type;
+
+/* Memory of a plane, from its lowest address: the rows of bottom-up frames,
+ * with a negative stride, start at the end of the plane. Planes without
+ * components are as tall as the frame. */
+static guint8 *
+pygst_video_plane_region (GstVideoFrame * frame, guint plane, gsize * size)
+{
+  const GstVideoFormatInfo *finfo = frame->info.finfo;
+  GstMapInfo *map;
+  guint8 *data, *start, *end;
+  gint comp, stride, height = -1;
+
+  data = GST_VIDEO_FRAME_PLANE_DATA (frame, plane);
+  if (GST_VIDEO_FORMAT_INFO_HAS_PALETTE (finfo) && plane == 1) {
+    *size = 256 * 4;
+    return data;
+  }
+
+  for (comp = 0; comp < GST_VIDEO_FORMAT_INFO_N_COMPONENTS (finfo); comp++) {
+    if (GST_VIDEO_FORMAT_INFO_PLANE (finfo, comp) == plane)
+      height = MAX (height, GST_VIDEO_FRAME_COMP_HEIGHT (frame, comp));
+  }
+  if (height < 0)
+    height = GST_VIDEO_FRAME_HEIGHT (frame);
+
+  stride = GST_VIDEO_FRAME_PLANE_STRIDE (frame, plane);
+  if (stride < 0) {
+    start = data + (gssize) stride * MAX (height - 1, 0);
+    end = data - stride;
+  } else {
+    start = data;
+    end = data + (gsize) stride * height;
+  }
+
+  /* planes are mapped one by one through the video meta, or all at once */
+  map = &frame->map[frame->meta ? plane : 0];
+  start = MAX (start, map->data);
+  end = MIN (end, map->data + map->size);
+  *size = end > start ? end - start : 0;
+
+  return start;
+}
+
+static void
+pygst_video_frame_mapping_dealloc (PyGstVideoFrameMapping * self)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_INFO, FALSE);
+  if (self->mapped)
+    gst_video_frame_unmap (&self->frame);
+  Py_TYPE (self)->tp_free ((PyObject *) self);
 }
 
 static PyObject *
-_wrap_gst_warning (PyObject * whatever, PyObject * string)
+pygst_video_frame_mapping_unmap (PyGstVideoFrameMapping * self,
+    PyObject * unused)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_WARNING, FALSE);
+  gssize exports;
+
+  PYGST_BEGIN_CRITICAL_SECTION (self);
+  exports = self->exports;
+  if (exports == 0 && self->mapped) {
+    gst_video_frame_unmap (&self->frame);
+    self->mapped = FALSE;
+  }
+  PYGST_END_CRITICAL_SECTION ();
+
+  if (exports > 0) {
+    PyErr_Format (PyExc_BufferError,
+        "cannot unmap video frame, %" G_GSSIZE_FORMAT
+        " exported views still exist", exports);
+    return NULL;
+  }
+
+  Py_INCREF (Py_None);
+  return Py_None;
 }
 
 static PyObject *
-_wrap_gst_error (PyObject * whatever, PyObject * string)
+pygst_video_frame_mapping_get_planes (PyGstVideoFrameMapping * self,
+    void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_ERROR, FALSE);
+  PyObject *planes;
+  guint i, n_planes = GST_VIDEO_FRAME_N_PLANES (&self->frame);
+
+  planes = PyTuple_New (n_planes);
+  if (planes == NULL)
+    return NULL;
+
+  for (i = 0; i < n_planes; i++) {
+    PyGstVideoPlane *plane;
+
+    plane = PyObject_New (PyGstVideoPlane, &PyGstVideoPlane_Type);
+    if (plane == NULL) {
+      Py_DECREF (planes);
+      return NULL;
+    }
+    Py_INCREF (self);
+    plane->mapping = self;
+    plane->plane = i;
+    PyTuple_SET_ITEM (planes, i, (PyObject *) plane);
+  }
+
+  return planes;
 }
 
 static PyObject *
-_wrap_gst_fixme (PyObject * whatever, PyObject * string)
+pygst_video_frame_mapping_get_strides (PyGstVideoFrameMapping * self,
+    void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_FIXME, FALSE);
+  PyObject *strides;
+  guint i, n_planes = GST_VIDEO_FRAME_N_PLANES (&self->frame);
+
+  strides = PyTuple_New (n_planes);
+  if (strides == NULL)
+    return NULL;
+
+  for (i = 0; i < n_planes; i++)
+    PyTuple_SET_ITEM (strides, i,
+        PyLong_FromLong (GST_VIDEO_FRAME_PLANE_STRIDE (&self->frame, i)));
+
+  return strides;
 }
 
 static PyObject *
-_wrap_gst_memdump (PyObject * whatever, PyObject * string)
+pygst_video_frame_mapping_get_mapped (PyGstVideoFrameMapping * self,
+    void *closure)
 {
-  return pygst_debug_log (whatever, string, GST_LEVEL_MEMDUMP, FALSE);
+  return PyBool_FromLong (self->mapped);
 }
 
-static PyMethodDef _gi_gst_functions[] = {
-  {"trace", (PyCFunction) _wrap_gst_trace, METH_VARARGS,
-      NULL},
-  {"log", (PyCFunction) _wrap_gst_log, METH_VARARGS,
-      NULL},
-  {"debug", (PyCFunction) _wrap_gst_debug, METH_VARARGS,
-      NULL},
-  {"info", (PyCFunction) _wrap_gst_info, METH_VARARGS,
-      NULL},
-  {"warning", (PyCFunction) _wrap_gst_warning, METH_VARARGS,
-      NULL},
-  {"error", (PyCFunction) _wrap_gst_error, METH_VARARGS,
-      NULL},
-  {"fixme", (PyCFunction) _wrap_gst_fixme, METH_VARARGS,
-      NULL},
-  {"memdump", (PyCFunction) _wrap_gst_memdump, METH_VARARGS,
-      NULL},
+static PyMethodDef pygst_video_frame_mapping_methods[] = {
+  {"unmap", (PyCFunction) pygst_video_frame_mapping_unmap, METH_NOARGS,
+      "Unmap the frame, all views exported by its planes must have been "
+        "released"},
   {NULL, NULL, 0, NULL}
 };
 
-PYGLIB_MODULE_START (_gi_gst, "_gi_gst")
+static PyGetSetDef pygst_video_frame_mapping_getsets[] = {
+  {(char *) "planes", (getter) pygst_video_frame_mapping_get_planes, NULL,
+      (char *) "Memory of each plane of the frame", NULL},
+  {(char *) "strides", (getter) pygst_video_frame_mapping_get_strides, NULL,
+      (char *) "Stride in bytes of each plane of the frame", NULL},
+  {(char *) "mapped", (getter) pygst_video_frame_mapping_get_mapped, NULL,
+      (char *) "Whether the frame is still mapped", NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject PyGstVideoFrameMapping_Type = {
+  PyVarObject_HEAD_INIT (NULL, 0)
+  .tp_name = "_gi_gst.VideoFrameMapping",
+  .tp_basicsize = sizeof (PyGstVideoFrameMapping),
+  .tp_dealloc = (destructor) pygst_video_frame_mapping_dealloc,
+  .tp_flags = Py_TPFLAGS_DEFAULT,
+  .tp_doc = "Mapped GstVideoFrame of a Gst.Buffer",
+  .tp_methods = pygst_video_frame_mapping_methods,
+  .tp_getset = pygst_video_frame_mapping_getsets,
+};
+
+static void
+pygst_video_plane_dealloc (PyGstVideoPlane * self)
 {
-  PyObject *d;
+  Py_DECREF (self->mapping);
+  Py_TYPE (self)->tp_free ((PyObject *) self);
+}
 
-  /* gst should have been initialized already */
+static int
+pygst_video_plane_getbuffer (PyGstVideoPlane * self, Py_buffer * view,
+    int flags)
+{
+  PyGstVideoFrameMapping *mapping = self->mapping;
+  int ret = -1;
 
-  /* Initialize debugging category */
-  GST_DEBUG_CATEGORY_INIT (pygst_debug, "pygst", 0,
-      "GStreamer python bindings");
-  GST_DEBUG_CATEGORY_INIT (python_debug, "python", GST_DEBUG_FG_GREEN,
-      "python code using gst-python");
+  PYGST_BEGIN_CRITICAL_SECTION (mapping);
+  if (!mapping->mapped) {
+    PyErr_SetString (PyExc_ValueError, "video frame is not mapped");
+    view->obj = NULL;
+  } else {
+    guint8 *data;
+    gsize size;
 
-  pygobject_init (3, 0, 0);
+    data = pygst_video_plane_region (&mapping->frame, self->plane, &size);
+    if (PyBuffer_FillInfo (view, (PyObject *) self, data, size,
+            !(mapping->flags & GST_MAP_WRITE), flags) == 0) {
+      mapping->exports++;
+      ret = 0;
+    }
+  }
+  PYGST_END_CRITICAL_SECTION ();
+
+  return ret;
+}
+
+static void
+pygst_video_plane_releasebuffer (PyGstVideoPlane * self, Py_buffer * view)
+{
+  PYGST_BEGIN_CRITICAL_SECTION (self->mapping);
+  self->mapping->exports--;
+  PYGST_END_CRITICAL_SECTION ();
+}
+
+static PyBufferProcs pygst_video_plane_as_buffer = {
+  .bf_getbuffer = (getbufferproc) pygst_video_plane_getbuffer,
+  .bf_releasebuffer = (releasebufferproc) pygst_video_plane_releasebuffer,
+};
+
+static PyTypeObject PyGstVideoPlane_Type = {
+  PyVarObject_HEAD_INIT (NULL, 0)
+  .tp_name = "_gi_gst.VideoPlane",
+  .tp_basicsize = sizeof (PyGstVideoPlane),
+  .tp_dealloc = (destructor) pygst_video_plane_dealloc,
+  .tp_as_buffer = &pygst_video_plane_as_buffer,
+  .tp_flags = Py_TPFLAGS_DEFAULT | PYGST_TPFLAGS_BUFFER,
+  .tp_doc = "Memory of a plane of a mapped GstVideoFrame",
+};
+
+static PyObject *
+_wrap_gst_video_frame_map (PyObject * whatever, PyObject * args)
+{
+  PyObject *py_buffer, *py_info;
+  PyGstVideoFrameMapping *mapping;
+  GstBuffer *buffer;
+  GstVideoInfo *info;
+  guint flags;
+  gboolean ret;
+
+  if (!PyArg_ParseTuple (args, "OOI:video_frame_map", &py_buffer, &py_info,
+          &flags))
+    return NULL;
+
+  if (!pyg_boxed_check (py_buffer, GST_TYPE_BUFFER)) {
+    PyErr_SetString (PyExc_TypeError, "video_frame_map expects a Gst.Buffer");
+    return NULL;
+  }
+
+  if (!pyg_boxed_check (py_info, GST_TYPE_VIDEO_INFO)) {
+    PyErr_SetString (PyExc_TypeError,
+        "video_frame_map expects a GstVideo.VideoInfo");
+    return NULL;
+  }
+
+  buffer = pyg_boxed_get (py_buffer, GstBuffer);
+  info = pyg_boxed_get (py_info, GstVideoInfo);
+  if ((flags & GST_MAP_WRITE) && !gst_buffer_is_writable (buffer)) {
+    PyErr_SetString (PyExc_ValueError, "buffer is not writable");
+    return NULL;
+  }
+
+  mapping = PyObject_New (PyGstVideoFrameMapping,
+      &PyGstVideoFrameMapping_Type);
+  if (mapping == NULL)
+    return NULL;
+
+  mapping->flags = flags;
+  mapping->mapped = FALSE;
+  mapping->exports = 0;
+
+  /* the frame holds a reference on the buffer while mapped */
+  Py_BEGIN_ALLOW_THREADS;
+  ret = gst_video_frame_map (&mapping->frame, info, buffer,
+      (GstMapFlags) flags);
+  Py_END_ALLOW_THREADS;
+
+  if (!ret) {
+    Py_DECREF (mapping);
+    PyErr_SetString (PyExc_ValueError, "could not map video frame");
+    return NULL;
+  }
+
+  mapping->mapped = TRUE;
+
+  return (PyObject *) mapping;
+}
+
+/* Layout of the samples of an audio buffer from its GstAudioMeta, as a
+ * (samples, offsets) tuple where offsets is None for interleaved audio, or
+ * None when the buffer has no audio meta */
+static PyObject *
+_wrap_gst_audio_meta_layout (PyObject * whatever, PyObject * args)
+{
+#if GST_CHECK_VERSION (1, 16, 0)
+  PyObject *py_buffer, *offsets;
+  GstAudioMeta *meta;
+  gint i;
+
+  if (!PyArg_ParseTuple (args, "O:audio_meta_layout", &py_buffer))
+    return NULL;
+
+  if (!pyg_boxed_check (py_buffer, GST_TYPE_BUFFER)) {
+    PyErr_SetString (PyExc_TypeError,
+        "audio_meta_layout expects a Gst.Buffer");
+    return NULL;
+  }
+
+  meta = gst_buffer_get_audio_meta (pyg_boxed_get (py_buffer, GstBuffer));
+  if (meta == NULL)
+    Py_RETURN_NONE;
+
+  if (meta->offsets == NULL) {
+    Py_INCREF (Py_None);
+    offsets = Py_None;
+  } else {
+    offsets = PyTuple_New (meta->info.channels);
+    if (offsets == NULL)
+      return NULL;
+    for (i = 0; i < meta->info.channels; i++)
+      PyTuple_SET_ITEM (offsets, i, PyLong_FromSize_t (meta->offsets[i]));
+  }
+
+  return Py_BuildValue ("(nN)", (Py_ssize_t) meta->samples, offsets);
+#else
+  Py_RETURN_NONE;
+#endif
+}
+
+/* Wrapping of Python objects
+ *
+ * Creates a GstBuffer pointing to the memory of any object implementing the
+ * buffer protocol. The exported view, and thus the object, is kept alive
+ * until the memory is freed, which can happen from any thread. An optional
+ * callable gets the object back at that point, so it can be recycled. */
+
+typedef struct
+{
+  Py_buffer view;
+  PyObject *object;
+  PyObject *release_func;
+} PyGstWrappedObject;
+
+static void
+pygst_wrapped_object_free (PyGstWrappedObject * wrapped)
+{
+  PyGILState_STATE state;
+  PyObject *ret;
+
+  /* Buffers can outlive the interpreter, there is nothing to release then */
+  if (Py_IsInitialized ()) {
+    state = PyGILState_Ensure ();
+    PyBuffer_Release (&wrapped->view);
+    if (wrapped->release_func) {
+      ret = PyObject_CallFunctionObjArgs (wrapped->release_func,
+          wrapped->object, NULL);
+      if (ret == NULL)
+        PyErr_Print ();
+      Py_XDECREF (ret);
+      Py_DECREF (wrapped->release_func);
+    }
+    Py_DECREF (wrapped->object);
+    PyGILState_Release (state);
+  }
+
+  g_free (wrapped);
+}
+
+static PyObject *
+_wrap_gst_buffer_new_wrapped_object (PyObject * whatever, PyObject * args)
+{
+  PyObject *obj, *release_func = Py_None;
+  PyGstWrappedObject *wrapped;
+  GstBuffer *buffer;
+  GstMemoryFlags flags = 0;
+
+  if (!PyArg_ParseTuple (args, "O|O:buffer_new_wrapped_object", &obj,
+          &release_func))
+    return NULL;
+
+  if (release_func != Py_None && !PyCallable_Check (release_func)) {
+    PyErr_SetString (PyExc_TypeError, "release function must be callable");
+    return NULL;
+  }
+
+  wrapped = g_new0 (PyGstWrappedObject, 1);
+  if (PyObject_GetBuffer (obj, &wrapped->view, PyBUF_WRITABLE) < 0) {
+    PyErr_Clear ();
+    if (PyObject_GetBuffer (obj, &wrapped->view, PyBUF_SIMPLE) < 0) {
+      g_free (wrapped);
+      return NULL;
+    }
+    flags = GST_MEMORY_FLAG_READONLY;
+  }
+
+  Py_INCREF (obj);
+  wrapped->object = obj;
+  if (release_func != Py_None) {
+    Py_INCREF (release_func);
+    wrapped->release_func = release_func;
+  }
+
+  buffer = gst_buffer_new_wrapped_full (flags, wrapped->view.buf,
+      wrapped->view.len, 0, wrapped->view.len, wrapped,
+      (GDestroyNotify) pygst_wrapped_object_free);
+
+  return pyg_boxed_new (GST_TYPE_BUFFER, buffer, FALSE, TRUE);
+}
+
+/* Shared memory allocator
+ *
+ * Allocates memory backed by memfd segments (unlinked temporary files where
+ * memfd_create() is not available) which stay mapped for their whole life.
+ * The file descriptor of such a memory can be passed to another process that
+ * imports it, mapping the very same pages instead of copying the data. */
+
+#define PYGST_MEMFD_ALLOCATOR_NAME "pythonmemfd"
+#define PYGST_MEMFD_MEMORY_TYPE "PythonMemfdMemory"
+
+#ifdef G_OS_UNIX
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <errno.h>
+#include <unistd.h>
+#include <glib/gstdio.h>
+
+typedef struct
+{
+  GstMemory mem;
+
+  gint fd;
+  gpointer data;
+} PyGstMemfdMemory;
+
+typedef struct
+{
+  GstAllocator parent;
+} PyGstMemfdAllocator;
+
+typedef struct
+{
+  GstAllocatorClass parent_class;
+} PyGstMemfdAllocatorClass;
+
+GType pygst_memfd_allocator_get_type (void);
+G_DEFINE_TYPE (PyGstMemfdAllocator, pygst_memfd_allocator, GST_TYPE_ALLOCATOR);
+
+static GstAllocator *_memfd_allocator = NULL;
+
+static gint
+pygst_memfd_create (gsize size)
+{
+  gint fd;
+
+#ifdef HAVE_MEMFD_CREATE
+  fd = memfd_create ("gst-python", MFD_CLOEXEC);
+#else
+  gchar *path = NULL;
+
+  fd = g_file_open_tmp ("gst-python-XXXXXX", &path, NULL);
+  if (fd >= 0)
+    g_unlink (path);
+  g_free (path);
+#endif
+
+  if (fd < 0)
+    return -1;
+
+  if (ftruncate (fd, size) < 0) {
+    close (fd);
+    return -1;
+  }
+
+  return fd;
+}
+
+static GstMemory *
+pygst_memfd_memory_new (GstAllocator * allocator, GstMemoryFlags flags,
+    gint fd, gsize maxsize, gsize offset, gsize size)
+{
+  PyGstMemfdMemory *mem;
+  gpointer data;
+  gint prot = PROT_READ;
+
+  if (!(flags & GST_MEMORY_FLAG_READONLY))
+    prot |= PROT_WRITE;
+
+  data = mmap (NULL, maxsize, prot, MAP_SHARED, fd, 0);
+  if (data == MAP_FAILED) {
+    GST_WARNING ("could not map %" G_GSIZE_FORMAT " bytes of fd %d: %s",
+        maxsize, fd, g_strerror (errno));
+    return NULL;
+  }
+
+  mem = g_slice_new (PyGstMemfdMemory);
+  gst_memory_init (GST_MEMORY_CAST (mem), flags, allocator, NULL, maxsize, 0,
+      offset, size);
+  mem->fd = fd;
+  mem->data = data;
+
+  return GST_MEMORY_CAST (mem);
+}
+
+static GstMemory *
+pygst_memfd_allocator_alloc (GstAllocator * allocator, gsize size,
+    GstAllocationParams * params)
+{
+  GstAllocationParams defparams;
+  GstMemory *mem;
+  gsize maxsize;
+  gint fd;
+
+  if (params == NULL) {
+    gst_allocation_params_init (&defparams);
+    params = &defparams;
+  }
+
+  maxsize = params->prefix + size + params->padding;
+  fd = pygst_memfd_create (maxsize);
+  if (fd < 0) {
+    GST_WARNING ("could not create shared memory segment of %" G_GSIZE_FORMAT
+        " bytes: %s", maxsize, g_strerror (errno));
+    return NULL;
+  }
+
+  mem = pygst_memfd_memory_new (allocator, params->flags, fd, maxsize,
+      params->prefix, size);
+  if (mem == NULL)
+    close (fd);
+
+  return mem;
+}
+
+static void
+pygst_memfd_allocator_free (GstAllocator * allocator, GstMemory * memory)
+{
+  PyGstMemfdMemory *mem = (PyGstMemfdMemory *) memory;
+
+  /* Shared sub-memories use the mapping of their parent */
+  if (memory->parent == NULL) {
+    munmap (mem->data, memory->maxsize);
+    close (mem->fd);
+  }
+
+  g_slice_free (PyGstMemfdMemory, mem);
+}
+
+static gpointer
+pygst_memfd_memory_map (PyGstMemfdMemory * mem, gsize maxsize,
+    GstMapFlags flags)
+{
+  return mem->data;
+}
+
+static void
+pygst_memfd_memory_unmap (PyGstMemfdMemory * mem)
+{
+}
+
+static PyGstMemfdMemory *
+pygst_memfd_memory_share (PyGstMemfdMemory * mem, gssize offset, gsize size)
+{
+  PyGstMemfdMemory *sub;
+  GstMemory *parent;
+
+  if ((parent = mem->mem.parent) == NULL)
+    parent = (GstMemory *) mem;
+
+  if (size == (gsize) - 1)
+    size = mem->mem.size - offset;
+
+  sub = g_slice_new (PyGstMemfdMemory);
+  gst_memory_init (GST_MEMORY_CAST (sub),
+      GST_MINI_OBJECT_FLAGS (parent) | GST_MINI_OBJECT_FLAG_LOCK_READONLY,
+      mem->mem.allocator, parent, mem->mem.maxsize, mem->mem.align,
+      mem->mem.offset + offset, size);
+  sub->fd = mem->fd;
+  sub->data = mem->data;
+
+  return sub;
+}
+
+static void
+pygst_memfd_allocator_class_init (PyGstMemfdAllocatorClass * klass)
+{
+  GstAllocatorClass *allocator_class = (GstAllocatorClass *) klass;
+
+  allocator_class->alloc = pygst_memfd_allocator_alloc;
+  allocator_class->free = pygst_memfd_allocator_free;
+}
+
+static void
+pygst_memfd_allocator_init (PyGstMemfdAllocator * self)
+{
+  GstAllocator *allocator = GST_ALLOCATOR_CAST (self);
+
+  allocator->mem_type = PYGST_MEMFD_MEMORY_TYPE;
+  allocator->mem_map = (GstMemoryMapFunction) pygst_memfd_memory_map;
+  allocator->mem_unmap = (GstMemoryUnmapFunction) pygst_memfd_memory_unmap;
+  allocator->mem_share = (GstMemoryShareFunction) pygst_memfd_memory_share;
+}
+
+static GstAllocator *
+pygst_memfd_allocator_get (void)
+{
+  static gsize registered = 0;
+
+  if (g_once_init_enter (&registered)) {
+    _memfd_allocator = g_object_new (pygst_memfd_allocator_get_type (), NULL);
+    gst_object_ref_sink (_memfd_allocator);
+    gst_allocator_register (PYGST_MEMFD_ALLOCATOR_NAME,
+        gst_object_ref (_memfd_allocator));
+    g_once_init_leave (&registered, 1);
+  }
+
+  return _memfd_allocator;
+}
+
+static PyObject *
+_wrap_gst_memfd_allocator_get (PyObject * whatever, PyObject * unused)
+{
+  if (!gst_is_initialized ()) {
+    PyErr_SetString (PyExc_RuntimeError, "GStreamer is not initialized");
+    return NULL;
+  }
+
+  return pygobject_new (G_OBJECT (pygst_memfd_allocator_get ()));
+}
+
+static PyObject *
+_wrap_gst_memory_get_memfd (PyObject * whatever, PyObject * args)
+{
+  PyObject *py_memory;
+  GstMemory *memory;
+
+  if (!PyArg_ParseTuple (args, "O:memory_get_memfd", &py_memory))
+    return NULL;
+
+  if (!pyg_boxed_check (py_memory, GST_TYPE_MEMORY)) {
+    PyErr_SetString (PyExc_TypeError, "memory_get_memfd expects a Gst.Memory");
+    return NULL;
+  }
+
+  memory = pyg_boxed_get (py_memory, GstMemory);
+  if (!gst_memory_is_type (memory, PYGST_MEMFD_MEMORY_TYPE)) {
+    PyErr_SetString (PyExc_ValueError,
+        "memory was not allocated by the memfd allocator");
+    return NULL;
+  }
+
+  return Py_BuildValue ("(inn)", ((PyGstMemfdMemory *) memory)->fd,
+      (Py_ssize_t) memory->offset, (Py_ssize_t) memory->size);
+}
+
+static PyObject *
+_wrap_gst_memfd_memory_import (PyObject * whatever, PyObject * args)
+{
+  GstMemory *memory;
+  GstMemoryFlags flags = 0;
+  Py_ssize_t offset, size;
+  struct stat st;
+  int fd, readonly = FALSE;
+
+  if (!PyArg_ParseTuple (args, "inn|i:memfd_memory_import", &fd, &offset,
+          &size, &readonly))
+    return NULL;
+
+  if (!gst_is_initialized ()) {
+    PyErr_SetString (PyExc_RuntimeError, "GStreamer is not initialized");
+    return NULL;
+  }
+
+  if (fstat (fd, &st) < 0 || offset < 0 || size < 0
+      || offset + size > st.st_size) {
+    PyErr_SetString (PyExc_ValueError, "invalid shared memory segment");
+    return NULL;
+  }
+
+  /* The memory owns its file descriptor, the caller keeps its own */
+  fd = dup (fd);
+  if (fd < 0)
+    return PyErr_SetFromErrno (PyExc_OSError);
+
+  if (readonly)
+    flags = GST_MEMORY_FLAG_READONLY;
+
+  memory = pygst_memfd_memory_new (pygst_memfd_allocator_get (), flags, fd,
+      st.st_size, offset, size);
+  if (memory == NULL) {
+    close (fd);
+    PyErr_SetString (PyExc_OSError, "could not map shared memory segment");
+    return NULL;
+  }
+
+  return pyg_boxed_new (GST_TYPE_MEMORY, memory, FALSE, TRUE);
+}
+
+#else
+
+static PyObject *
+_wrap_gst_memfd_allocator_get (PyObject * whatever, PyObject * unused)
+{
+  PyErr_SetString (PyExc_NotImplementedError,
+      "shared memory allocation is not supported on this platform");
+  return NULL;
+}
+
+static PyObject *
+_wrap_gst_memory_get_memfd (PyObject * whatever, PyObject * args)
+{
+  return _wrap_gst_memfd_allocator_get (whatever, NULL);
+}
+
+static PyObject *
+_wrap_gst_memfd_memory_import (PyObject * whatever, PyObject * args)
+{
+  return _wrap_gst_memfd_allocator_get (whatever, NULL);
+}
+
+#endif
+
+/* Pad functions
+ *
+ * Python chain, chain list, event and query functions are called straight
+ * from the pad function trampolines below. Whether they take the parent
+ * (pad, parent, object) or not (pad, object) is resolved once when setting
+ * them, so a call only costs building the arguments. */
+
+typedef struct
+{
+  PyObject *func;
+  gboolean with_parent;
+} PyGstPadFunction;
+
+static void
+pygst_pad_function_free (PyGstPadFunction * pad_func)
+{
+  PyGILState_STATE state;
+
+  if (Py_IsInitialized ()) {
+    state = PyGILState_Ensure ();
+    Py_DECREF (pad_func->func);
+    PyGILState_Release (state);
+  }
+
+  g_free (pad_func);
+}
+
+static PyObject *
+pygst_pad_function_call (PyGstPadFunction * pad_func, GstPad * pad,
+    GstObject * parent, PyObject * object)
+{
+  PyObject *pypad, *pyparent, *ret;
+
+  pypad = pygobject_new (G_OBJECT (pad));
+  if (pad_func->with_parent) {
+    pyparent = pygobject_new (G_OBJECT (parent));
+    ret = PyObject_CallFunctionObjArgs (pad_func->func, pypad, pyparent,
+        object, NULL);
+    Py_DECREF (pyparent);
+  } else {
+    ret = PyObject_CallFunctionObjArgs (pad_func->func, pypad, object, NULL);
+  }
+  Py_DECREF (pypad);
+
+  return ret;
+}
+
+static GstFlowReturn
+pygst_pad_flow_call (PyGstPadFunction * pad_func, GstPad * pad,
+    GstObject * parent, GType gtype, gpointer object)
+{
+  PyGILState_STATE state;
+  PyObject *pyobject, *ret;
+  GstFlowReturn flow = GST_FLOW_ERROR;
+
+  state = PyGILState_Ensure ();
+
+  /* buffers and buffer lists are transfer full */
+  pyobject = pyg_boxed_new (gtype, object, FALSE, TRUE);
+  ret = pygst_pad_function_call (pad_func, pad, parent, pyobject);
+  Py_DECREF (pyobject);
+
+  if (ret != NULL) {
+    flow = (GstFlowReturn) PyLong_AsLong (ret);
+    Py_DECREF (ret);
+  }
+
+  if (PyErr_Occurred ()) {
+    PyErr_Print ();
+    flow = GST_FLOW_ERROR;
+  }
+
+  PyGILState_Release (state);
+
+  return flow;
+}
+
+static GstFlowReturn
+pygst_pad_chain (GstPad * pad, GstObject * parent, GstBuffer * buffer)
+{
+  return pygst_pad_flow_call (GST_PAD_CHAINDATA (pad), pad, parent,
+      GST_TYPE_BUFFER, buffer);
+}
+
+static GstFlowReturn
+pygst_pad_chain_list (GstPad * pad, GstObject * parent,
+    GstBufferList * buffer_list)
+{
+  return pygst_pad_flow_call (GST_PAD_CHAINLISTDATA (pad), pad, parent,
+      GST_TYPE_BUFFER_LIST, buffer_list);
+}
+
+static gboolean
+pygst_pad_event (GstPad * pad, GstObject * parent, GstEvent * event)
+{
+  PyGILState_STATE state;
+  PyObject *pyevent, *ret;
+  gboolean res = FALSE;
+
+  state = PyGILState_Ensure ();
+
+  pyevent = pyg_boxed_new (GST_TYPE_EVENT, event, FALSE, TRUE);
+  ret = pygst_pad_function_call (GST_PAD_EVENTDATA (pad), pad, parent,
+      pyevent);
+  Py_DECREF (pyevent);
+
+  if (ret != NULL) {
+    res = PyObject_IsTrue (ret) == 1;
+    Py_DECREF (ret);
+  }
+
+  if (PyErr_Occurred ()) {
+    PyErr_Print ();
+    res = FALSE;
+  }
+
+  PyGILState_Release (state);
+
+  return res;
+}
+
+static gboolean
+pygst_pad_query (GstPad * pad, GstObject * parent, GstQuery * query)
+{
+  PyGILState_STATE state;
+  PyObject *pyquery, *ret;
+  gboolean res = FALSE;
+
+  state = PyGILState_Ensure ();
+
+  /* Queries are transfer none and must stay writable for the function to
+   * answer them, so the wrapper doesn't hold a reference. In case python
+   * keeps it around after the call it gets a copy of its own. */
+  pyquery = pyg_boxed_new (GST_TYPE_QUERY, query, FALSE, FALSE);
+  ret = pygst_pad_function_call (GST_PAD_QUERYDATA (pad), pad, parent,
+      pyquery);
+  if (Py_REFCNT (pyquery) > 1) {
+    ((PyGBoxed *) pyquery)->boxed = gst_query_copy (query);
+    ((PyGBoxed *) pyquery)->free_on_dealloc = TRUE;
+  }
+  Py_DECREF (pyquery);
+
+  if (ret != NULL) {
+    res = PyObject_IsTrue (ret) == 1;
+    Py_DECREF (ret);
+  }
+
+  if (PyErr_Occurred ()) {
+    PyErr_Print ();
+    res = FALSE;
+  }
+
+  PyGILState_Release (state);
+
+  return res;
+}
+
+static PyGstPadFunction *
+pygst_pad_function_parse (PyObject * args, const gchar * format,
+    GstPad ** pad)
+{
+  PyObject *pypad, *func;
+  PyGstPadFunction *pad_func;
+  int with_parent;
+
+  if (!PyArg_ParseTuple (args, format, &pypad, &func, &with_parent))
+    return NULL;
+
+  if (!pygobject_check (pypad, &PyGObject_Type) ||
+      !GST_IS_PAD (pygobject_get (pypad))) {
+    PyErr_SetString (PyExc_TypeError, "first argument must be a Gst.Pad");
+    return NULL;
+  }
+
+  if (!PyCallable_Check (func)) {
+    PyErr_SetString (PyExc_TypeError, "pad function must be callable");
+    return NULL;
+  }
+
+  pad_func = g_new0 (PyGstPadFunction, 1);
+  Py_INCREF (func);
+  pad_func->func = func;
+  pad_func->with_parent = with_parent;
+  *pad = GST_PAD (pygobject_get (pypad));
+
+  return pad_func;
+}
+
+static PyObject *
+_wrap_gst_pad_set_chain_function (PyObject * whatever, PyObject * args)
+{
+  PyGstPadFunction *pad_func;
+  GstPad *pad;
+
+  pad_func = pygst_pad_function_parse (args, "OOi:pad_set_chain_function",
+      &pad);
+  if (pad_func == NULL)
+    return NULL;
+
+  gst_pad_set_chain_function_full (pad, pygst_pad_chain, pad_func,
+      (GDestroyNotify) pygst_pad_function_free);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+_wrap_gst_pad_set_chain_list_function (PyObject * whatever, PyObject * args)
+{
+  PyGstPadFunction *pad_func;
+  GstPad *pad;
+
+  pad_func = pygst_pad_function_parse (args,
+      "OOi:pad_set_chain_list_function", &pad);
+  if (pad_func == NULL)
+    return NULL;
+
+  gst_pad_set_chain_list_function_full (pad, pygst_pad_chain_list, pad_func,
+      (GDestroyNotify) pygst_pad_function_free);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+_wrap_gst_pad_set_event_function (PyObject * whatever, PyObject * args)
+{
+  PyGstPadFunction *pad_func;
+  GstPad *pad;
+
+  pad_func = pygst_pad_function_parse (args, "OOi:pad_set_event_function",
+      &pad);
+  if (pad_func == NULL)
+    return NULL;
+
+  gst_pad_set_event_function_full (pad, pygst_pad_event, pad_func,
+      (GDestroyNotify) pygst_pad_function_free);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+_wrap_gst_pad_set_query_function (PyObject * whatever, PyObject * args)
+{
+  PyGstPadFunction *pad_func;
+  GstPad *pad;
+
+  pad_func = pygst_pad_function_parse (args, "OOi:pad_set_query_function",
+      &pad);
+  if (pad_func == NULL)
+    return NULL;
+
+  gst_pad_set_query_function_full (pad, pygst_pad_query, pad_func,
+      (GDestroyNotify) pygst_pad_function_free);
+
+  Py_RETURN_NONE;
+}
+
+/* Buses
+ *
+ * Popping messages or filtering them in a sync handler one python call at a
+ * time can't keep up with chatty pipelines. bus_drain() pops the pending
+ * messages of some types in a single call and the sync handlers set with
+ * bus_set_sync_handler() only call into python, taking the GIL, for the
+ * message types they are interested in.
+ *
+ * Unlike gst_bus_pop_filtered(), bus_drain() doesn't discard messages of
+ * other types: it pops all the pending messages and posts the ones of other
+ * types again, in order, behind the messages posted meanwhile. Those are
+ * marked so that the python sync handlers don't see them twice, sync
+ * handlers set from C and the sync-message signal still do. */
+
+/* Marks the messages bus_drain() posted again */
+static GQuark
+pygst_bus_reposted_quark (void)
+{
+  return g_quark_from_static_string ("pygst-bus-reposted");
+}
+
+static GstBus *
+pygst_bus_get (PyObject * py_bus, const gchar * function)
+{
+  if (!pygobject_check (py_bus, &PyGObject_Type) ||
+      !GST_IS_BUS (pygobject_get (py_bus))) {
+    PyErr_Format (PyExc_TypeError, "%s expects a Gst.Bus", function);
+    return NULL;
+  }
+
+  return GST_BUS (pygobject_get (py_bus));
+}
+
+static PyObject *
+_wrap_gst_bus_drain (PyObject * whatever, PyObject * args)
+{
+  PyObject *py_bus, *list;
+  GPtrArray *messages, *skipped;
+  GstMessage *message;
+  GstBus *bus;
+  guint types, max_messages, i;
+
+  if (!PyArg_ParseTuple (args, "OII:bus_drain", &py_bus, &types,
+          &max_messages))
+    return NULL;
+
+  bus = pygst_bus_get (py_bus, "bus_drain");
+  if (bus == NULL)
+    return NULL;
+
+  messages = g_ptr_array_new ();
+  skipped = g_ptr_array_new ();
+  Py_BEGIN_ALLOW_THREADS;
+  while ((message = gst_bus_pop (bus)) != NULL) {
+    /* the ones after the last match are skipped too, to keep their order */
+    if ((GST_MESSAGE_TYPE (message) & types) &&
+        (max_messages == 0 || messages->len < max_messages))
+      g_ptr_array_add (messages, message);
+    else
+      g_ptr_array_add (skipped, message);
+  }
+
+  for (i = 0; i < skipped->len; i++) {
+    message = g_ptr_array_index (skipped, i);
+    gst_mini_object_set_qdata (GST_MINI_OBJECT_CAST (message),
+        pygst_bus_reposted_quark (), GINT_TO_POINTER (TRUE), NULL);
+    gst_bus_post (bus, message);
+  }
+  g_ptr_array_free (skipped, TRUE);
+  Py_END_ALLOW_THREADS;
+
+  list = PyList_New (messages->len);
+  for (i = 0; i < messages->len; i++) {
+    PyObject *item = NULL;
+
+    message = g_ptr_array_index (messages, i);
+    if (list != NULL)
+      item = pyg_boxed_new (GST_TYPE_MESSAGE, message, FALSE, TRUE);
+
+    if (item == NULL) {
+      gst_message_unref (message);
+      Py_CLEAR (list);
+      continue;
+    }
+    PyList_SET_ITEM (list, i, item);
+  }
+  g_ptr_array_free (messages, TRUE);
+
+  return list;
+}
+
+/* The sync handler set from python has two slots: the handler of the
+ * application, called for its message types with the bus and the message,
+ * and the one of the asyncio dispatcher of the bus, called with the message
+ * after it. Messages of the dispatch types are passed on, the ones of the
+ * drop types are taken from the bus. The handler is only unset once both
+ * slots are empty. */
+
+typedef struct
+{
+  PyObject *func;
+  guint types;
+  PyObject *dispatch;
+  guint dispatch_types;
+  guint drop_types;
+} PyGstBusSyncHandler;
+
+static void
+pygst_bus_sync_handler_free (PyGstBusSyncHandler * handler)
+{
+  PyGILState_STATE state;
+
+  if (Py_IsInitialized ()) {
+    state = PyGILState_Ensure ();
+    Py_XDECREF (handler->func);
+    Py_XDECREF (handler->dispatch);
+    PyGILState_Release (state);
+  }
+
+  g_free (handler);
+}
+
+static GstBusSyncReply
+pygst_bus_sync_handler (GstBus * bus, GstMessage * message,
+    PyGstBusSyncHandler * handler)
+{
+  PyGILState_STATE state;
+  PyObject *func = NULL, *dispatch = NULL;
+  PyObject *py_bus = NULL, *py_message, *ret = NULL;
+  GstMessageType type = GST_MESSAGE_TYPE (message);
+  GstBusSyncReply reply = GST_BUS_PASS;
+  gboolean drop = FALSE;
+
+  if (!(type & (handler->types | handler->dispatch_types)) ||
+      gst_mini_object_get_qdata (GST_MINI_OBJECT_CAST (message),
+          pygst_bus_reposted_quark ()))
+    return GST_BUS_PASS;
+
+  state = PyGILState_Ensure ();
+
+  /* the handler can be freed by the functions unsetting it */
+  if (handler->func && (type & handler->types)) {
+    func = handler->func;
+    Py_INCREF (func);
+  }
+  if (handler->dispatch && (type & handler->dispatch_types)) {
+    dispatch = handler->dispatch;
+    Py_INCREF (dispatch);
+    drop = (type & handler->drop_types) != 0;
+  }
+
+  py_message = pyg_boxed_new (GST_TYPE_MESSAGE, gst_message_ref (message),
+      FALSE, TRUE);
+
+  if (func != NULL) {
+    py_bus = pygobject_new (G_OBJECT (bus));
+    if (py_bus != NULL && py_message != NULL)
+      ret = PyObject_CallFunctionObjArgs (func, py_bus, py_message, NULL);
+
+    if (ret != NULL) {
+      reply = PyLong_AsLong (ret);
+      Py_DECREF (ret);
+    }
+    if (PyErr_Occurred ()) {
+      PyErr_Print ();
+      reply = GST_BUS_PASS;
+    }
+  }
+
+  /* the dispatcher gets the messages the application passes */
+  if (dispatch != NULL && reply != GST_BUS_DROP) {
+    ret = NULL;
+    if (py_message != NULL)
+      ret = PyObject_CallFunctionObjArgs (dispatch, py_message, NULL);
+    Py_XDECREF (ret);
+    if (PyErr_Occurred ())
+      PyErr_Print ();
+    if (drop)
+      reply = GST_BUS_DROP;
+  }
+
+  Py_XDECREF (func);
+  Py_XDECREF (dispatch);
+  Py_XDECREF (py_message);
+  Py_XDECREF (py_bus);
+  PyGILState_Release (state);
+
+  return reply;
+}
+
+/* The handler set from python on a bus, which can't be replaced by another
+ * one */
+static GQuark
+pygst_bus_sync_handler_quark (void)
+{
+  return g_quark_from_static_string ("pygst-bus-sync-handler");
+}
+
+/* Returns the handler of @bus, setting it first if it has none */
+static PyGstBusSyncHandler *
+pygst_bus_sync_handler_get (GstBus * bus)
+{
+  PyGstBusSyncHandler *handler;
+
+  handler = g_object_get_qdata (G_OBJECT (bus),
+      pygst_bus_sync_handler_quark ());
+  if (handler == NULL) {
+    handler = g_new0 (PyGstBusSyncHandler, 1);
+    gst_bus_set_sync_handler (bus, (GstBusSyncHandler) pygst_bus_sync_handler,
+        handler, (GDestroyNotify) pygst_bus_sync_handler_free);
+    g_object_set_qdata (G_OBJECT (bus), pygst_bus_sync_handler_quark (),
+        handler);
+  }
+
+  return handler;
+}
+
+/* Unsets the handler of @bus once both of its slots are empty */
+static void
+pygst_bus_sync_handler_check (GstBus * bus, PyGstBusSyncHandler * handler)
+{
+  if (handler->func == NULL && handler->dispatch == NULL) {
+    g_object_set_qdata (G_OBJECT (bus), pygst_bus_sync_handler_quark (),
+        NULL);
+    gst_bus_set_sync_handler (bus, NULL, NULL, NULL);
+  }
+}
+
+static PyObject *
+_wrap_gst_bus_set_sync_handler (PyObject * whatever, PyObject * args)
+{
+  PyGstBusSyncHandler *handler;
+  PyObject *py_bus, *func, *old = NULL;
+  GstBus *bus;
+  guint types;
+  gboolean replaced = FALSE;
+
+  if (!PyArg_ParseTuple (args, "OIO:bus_set_sync_handler", &py_bus, &types,
+          &func))
+    return NULL;
+
+  bus = pygst_bus_get (py_bus, "bus_set_sync_handler");
+  if (bus == NULL)
+    return NULL;
+
+  if (func != Py_None && !PyCallable_Check (func)) {
+    PyErr_SetString (PyExc_TypeError, "sync handler must be callable");
+    return NULL;
+  }
+
+  PYGST_BEGIN_CRITICAL_SECTION (py_bus);
+  handler = g_object_get_qdata (G_OBJECT (bus),
+      pygst_bus_sync_handler_quark ());
+  if (func == Py_None) {
+    if (handler != NULL) {
+      old = handler->func;
+      handler->func = NULL;
+      handler->types = 0;
+      pygst_bus_sync_handler_check (bus, handler);
+    }
+  } else if (handler != NULL && handler->func != NULL) {
+    /* gst_bus_set_sync_handler() would only log a warning, and leak the
+     * handler */
+    replaced = TRUE;
+  } else {
+    handler = pygst_bus_sync_handler_get (bus);
+    Py_INCREF (func);
+    handler->func = func;
+    handler->types = types;
+  }
+  PYGST_END_CRITICAL_SECTION ();
+
+  Py_XDECREF (old);
+
+  if (replaced) {
+    PyErr_SetString (PyExc_RuntimeError,
+        "the bus already has a sync handler, it must be unset first");
+    return NULL;
+  }
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+_wrap_gst_bus_set_dispatch (PyObject * whatever, PyObject * args)
+{
+  PyGstBusSyncHandler *handler;
+  PyObject *py_bus, *func, *old = NULL;
+  GstBus *bus;
+  guint types, drop_types;
+
+  if (!PyArg_ParseTuple (args, "OIIO:bus_set_dispatch", &py_bus, &types,
+          &drop_types, &func))
+    return NULL;
+
+  bus = pygst_bus_get (py_bus, "bus_set_dispatch");
+  if (bus == NULL)
+    return NULL;
+
+  if (func != Py_None && !PyCallable_Check (func)) {
+    PyErr_SetString (PyExc_TypeError, "dispatch function must be callable");
+    return NULL;
+  }
+
+  PYGST_BEGIN_CRITICAL_SECTION (py_bus);
+  if (func == Py_None) {
+    handler = g_object_get_qdata (G_OBJECT (bus),
+        pygst_bus_sync_handler_quark ());
+    if (handler != NULL) {
+      old = handler->dispatch;
+      handler->dispatch = NULL;
+      handler->dispatch_types = handler->drop_types = 0;
+      pygst_bus_sync_handler_check (bus, handler);
+    }
+  } else {
+    handler = pygst_bus_sync_handler_get (bus);
+    old = handler->dispatch;
+    Py_INCREF (func);
+    handler->dispatch = func;
+    handler->dispatch_types = types;
+    handler->drop_types = drop_types;
+  }
+  PYGST_END_CRITICAL_SECTION ();
+
+  Py_XDECREF (old);
+
+  Py_RETURN_NONE;
+}
+
+/* Task pools
+ *
+ * The push and join virtual methods of GstTaskPool take a C function and
+ * its data, which can't go through introspection. Python subclasses
+ * implementing do_push_task() and do_join_task() get trampolines instead:
+ * the task is handed to do_push_task() as a PoolTask object, which runs the
+ * task without holding the GIL when called, and whatever it returns is the
+ * handle given back to do_join_task(), or released when the task is not
+ * joined. */
+
+typedef struct
+{
+  PyObject_HEAD
+  GstTaskPoolFunction func;
+  gpointer user_data;
+} PyGstPoolTask;
+
+static PyObject *
+pygst_pool_task_call (PyGstPoolTask * self, PyObject * args, PyObject * kwargs)
+{
+  GstTaskPoolFunction func = self->func;
+
+  if (func == NULL) {
+    PyErr_SetString (PyExc_RuntimeError, "pool task already ran");
+    return NULL;
+  }
+  self->func = NULL;
+
+  Py_BEGIN_ALLOW_THREADS;
+  func (self->user_data);
+  Py_END_ALLOW_THREADS;
+
+  Py_RETURN_NONE;
+}
+
+static PyTypeObject PyGstPoolTask_Type = {
+  PyVarObject_HEAD_INIT (NULL, 0)
+  .tp_name = "_gi_gst.PoolTask",
+  .tp_basicsize = sizeof (PyGstPoolTask),
+  .tp_call = (ternaryfunc) pygst_pool_task_call,
+  .tp_flags = Py_TPFLAGS_DEFAULT,
+  .tp_doc = "Task pushed to a Gst.TaskPool, runs it once when called",
+};
+
+static gpointer
+pygst_task_pool_push (GstTaskPool * pool, GstTaskPoolFunction func,
+    gpointer user_data, GError ** error)
+{
+  PyGILState_STATE state;
+  PyGstPoolTask *task;
+  PyObject *py_pool, *handle = NULL;
+
+  state = PyGILState_Ensure ();
+
+  py_pool = pygobject_new (G_OBJECT (pool));
+  task = PyObject_New (PyGstPoolTask, &PyGstPoolTask_Type);
+  if (py_pool == NULL || task == NULL)
+    goto done;
+
+  task->func = func;
+  task->user_data = user_data;
+  handle = PyObject_CallMethod (py_pool, "do_push_task", "O", task);
+
+done:
+  if (handle == NULL) {
+    PyErr_Print ();
+    g_set_error (error, GST_CORE_ERROR, GST_CORE_ERROR_FAILED,
+        "Could not push task to %s", GST_OBJECT_NAME (pool));
+  }
+  Py_XDECREF ((PyObject *) task);
+  Py_XDECREF (py_pool);
+  PyGILState_Release (state);
+
+  /* the reference on the handle is released when joining */
+  return handle;
+}
+
+static void
+pygst_task_pool_join (GstTaskPool * pool, gpointer id)
+{
+  PyGILState_STATE state;
+  PyObject *py_pool, *ret;
+
+  state = PyGILState_Ensure ();
+
+  py_pool = pygobject_new (G_OBJECT (pool));
+  ret = PyObject_CallMethod (py_pool, "do_join_task", "O", (PyObject *) id);
+  if (ret == NULL)
+    PyErr_Print ();
+
+  Py_XDECREF (ret);
+  Py_XDECREF (py_pool);
+  Py_DECREF ((PyObject *) id);
+  PyGILState_Release (state);
+}
+
+#if GST_CHECK_VERSION (1, 20, 0)
+/* Releases the handle of a task which is not joined */
+static void
+pygst_task_pool_dispose_handle (GstTaskPool * pool, gpointer id)
+{
+  PyGILState_STATE state;
+
+  if (id == NULL)
+    return;
+
+  state = PyGILState_Ensure ();
+  Py_DECREF ((PyObject *) id);
+  PyGILState_Release (state);
+}
+#endif
+
+static int
+_pygst_task_pool_init (gpointer gclass, PyTypeObject * pyclass)
+{
+  GstTaskPoolClass *klass = GST_TASK_POOL_CLASS (gclass);
+
+  if (PyObject_HasAttrString ((PyObject *) pyclass, "do_push_task")) {
+    klass->push = pygst_task_pool_push;
+#if GST_CHECK_VERSION (1, 20, 0)
+    klass->dispose_handle = pygst_task_pool_dispose_handle;
+#endif
+  }
+  if (PyObject_HasAttrString ((PyObject *) pyclass, "do_join_task"))
+    klass->join = pygst_task_pool_join;
+
+  return 0;
+}
+
+#include <frameobject.h>
+
+#ifndef GST_DISABLE_GST_DEBUG
+/* Call sites
+ *
+ * The function name and file name logged for a call only depend on the code
+ * object it is made from, they are converted once per code object. Entries
+ * are keyed by the address of the code object and hold a weak reference to
+ * it, whose callback removes the entry when the code object is destroyed,
+ * before its address can be reused: code objects from exec(), lambdas or
+ * reloaded modules don't accumulate. */
+
+typedef struct
+{
+  gchar *function;
+  gchar *filename;
+  PyObject *weakref;
+} PyGstCallSite;
+
+static GHashTable *call_sites = NULL;
+G_LOCK_DEFINE_STATIC (call_sites);
+
+static void
+pygst_call_site_free (PyGstCallSite * site)
+{
+  g_free (site->function);
+  g_free (site->filename);
+  Py_XDECREF (site->weakref);
+  g_free (site);
+}
+
+static PyObject *
+pygst_call_site_expired (PyObject * key, PyObject * weakref)
+{
+  PyGstCallSite *site;
+  gpointer code = PyLong_AsVoidPtr (key);
+
+  G_LOCK (call_sites);
+  site = g_hash_table_lookup (call_sites, code);
+  if (site != NULL && site->weakref == weakref)
+    g_hash_table_steal (call_sites, code);
+  else
+    site = NULL;
+  G_UNLOCK (call_sites);
+
+  if (site != NULL)
+    pygst_call_site_free (site);
+
+  Py_INCREF (Py_None);
+  return Py_None;
+}
+
+static PyMethodDef pygst_call_site_expired_def = {
+  "call_site_expired", (PyCFunction) pygst_call_site_expired, METH_O, NULL
+};
+
+static PyGstCallSite *
+pygst_call_site_get (PyCodeObject * code)
+{
+  PyGstCallSite *site, *other;
+  PyObject *key, *callback;
+  const gchar *function, *filename;
+
+  G_LOCK (call_sites);
+  site = g_hash_table_lookup (call_sites, code);
+  G_UNLOCK (call_sites);
+  if (site != NULL)
+    return site;
+
+#if PY_MAJOR_VERSION >= 3
+  function = PyUnicode_AsUTF8 (code->co_name);
+  filename = PyUnicode_AsUTF8 (code->co_filename);
+#else
+  function = PyString_AsString (code->co_name);
+  filename = PyString_AsString (code->co_filename);
+#endif
+  if (function == NULL || filename == NULL)
+    return NULL;
+
+  site = g_new0 (PyGstCallSite, 1);
+  site->function = g_strdup (function);
+#if PY_MAJOR_VERSION >= 3
+  site->filename = g_strdup (filename);
+#else
+  site->filename = g_path_get_basename (filename);
+#endif
+
+  key = PyLong_FromVoidPtr (code);
+  if (key == NULL) {
+    pygst_call_site_free (site);
+    return NULL;
+  }
+  callback = PyCFunction_New (&pygst_call_site_expired_def, key);
+  Py_DECREF (key);
+  if (callback != NULL) {
+    site->weakref = PyWeakref_NewRef ((PyObject *) code, callback);
+    Py_DECREF (callback);
+  }
+  if (site->weakref == NULL) {
+    pygst_call_site_free (site);
+    return NULL;
+  }
+
+  /* another thread might have converted it meanwhile, dropping our weak
+   * reference cancels its callback */
+  G_LOCK (call_sites);
+  other = g_hash_table_lookup (call_sites, code);
+  if (other == NULL)
+    g_hash_table_insert (call_sites, code, site);
+  G_UNLOCK (call_sites);
+
+  if (other != NULL) {
+    pygst_call_site_free (site);
+    site = other;
+  }
+
+  return site;
+}
+#endif
+
+/* The arguments are the message, or a format and the values to format it
+ * with, which is only done when the message is going to be logged so that
+ * debug calls are cheap when @category is disabled. */
+static PyObject *
+pygst_debug_log (GstDebugCategory * category, PyObject * pyobject,
+    PyObject * args, GstDebugLevel level, gboolean isgstobject)
+{
+#ifndef GST_DISABLE_GST_DEBUG
+  const gchar *str;
+  const gchar *function = "";
+  const gchar *filename = "";
+  int lineno = 0;
+  Py_ssize_t n_args;
+  PyObject *message, *format_args;
+  PyFrameObject *frame;
+  PyCodeObject *code;
+  PyGstCallSite *site;
+  GObject *object = NULL;
+
+  if (level > gst_debug_category_get_threshold (category))
+    Py_RETURN_NONE;
+
+  n_args = PyTuple_GET_SIZE (args);
+  if (n_args < 1) {
+    PyErr_SetString (PyExc_TypeError, "Need a string!");
+    return NULL;
+  }
+
+  message = PyTuple_GET_ITEM (args, 0);
+  if (n_args > 1) {
+    format_args = PyTuple_GetSlice (args, 1, n_args);
+    message = PyNumber_Remainder (message, format_args);
+    Py_DECREF (format_args);
+    if (message == NULL)
+      return NULL;
+  } else {
+    Py_INCREF (message);
+  }
+
+  if (!PyArg_Parse (message, "s;Need a string!", &str)) {
+    Py_DECREF (message);
+    return NULL;
+  }
+
+  frame = PyEval_GetFrame ();
+  if (frame != NULL) {
+#if PY_VERSION_HEX >= 0x030900B1
+    code = PyFrame_GetCode (frame);
+#else
+    code = frame->f_code;
+    Py_INCREF (code);
+#endif
+    /* the code object, and thus its call site, is kept alive until the
+     * message is logged */
+    site = pygst_call_site_get (code);
+    if (site == NULL) {
+      Py_DECREF (code);
+      Py_DECREF (message);
+      return NULL;
+    }
+
+    function = site->function;
+    filename = site->filename;
+    lineno = PyFrame_GetLineNumber (frame);
+  } else {
+    code = NULL;
+  }
+
+  /* gst_debug_log : category, level, file, function, line, object, format, va_list */
+  if (isgstobject)
+    object = G_OBJECT (pygobject_get (pyobject));
+  gst_debug_log (category, level, filename, function, lineno, object,
+      "%s", str);
+
+  Py_XDECREF (code);
+  Py_DECREF (message);
+#endif
+  Py_INCREF (Py_None);
+  return Py_None;
+}
+
+static PyObject *
+_wrap_gst_trace (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_TRACE,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_log (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_LOG,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_debug (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_DEBUG,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_info (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_INFO,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_warning (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_WARNING,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_error (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_ERROR,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_fixme (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_FIXME,
+      FALSE);
+}
+
+static PyObject *
+_wrap_gst_memdump (PyObject * whatever, PyObject * string)
+{
+  return pygst_debug_log (python_debug, whatever, string, GST_LEVEL_MEMDUMP,
+      FALSE);
+}
+
+/* Debug categories
+ *
+ * Python code can log in categories of its own, with their own threshold,
+ * instead of the shared "python" one. Categories are never freed, the
+ * python objects only reference them. */
+
+typedef struct
+{
+  PyObject_HEAD GstDebugCategory *category;
+} PyGstDebugCategory;
+
+static PyTypeObject PyGstDebugCategory_Type;
+
+static PyObject *
+pygst_debug_category_trace (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_TRACE, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_log (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_LOG, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_debug (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_DEBUG, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_info (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_INFO, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_warning (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_WARNING,
+      FALSE);
+}
+
+static PyObject *
+pygst_debug_category_error (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_ERROR, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_fixme (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_FIXME, FALSE);
+}
+
+static PyObject *
+pygst_debug_category_memdump (PyGstDebugCategory * self, PyObject * args)
+{
+  return pygst_debug_log (self->category, NULL, args, GST_LEVEL_MEMDUMP,
+      FALSE);
+}
+
+static PyObject *
+pygst_debug_category_get_threshold (PyGstDebugCategory * self,
+    PyObject * unused)
+{
+  return pyg_enum_from_gtype (GST_TYPE_DEBUG_LEVEL,
+      gst_debug_category_get_threshold (self->category));
+}
+
+static PyObject *
+pygst_debug_category_set_threshold (PyGstDebugCategory * self,
+    PyObject * args)
+{
+  int level;
+
+  if (!PyArg_ParseTuple (args, "i:DebugCategory.set_threshold", &level))
+    return NULL;
+
+  gst_debug_category_set_threshold (self->category, level);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+pygst_debug_category_reset_threshold (PyGstDebugCategory * self,
+    PyObject * unused)
+{
+  gst_debug_category_reset_threshold (self->category);
+
+  Py_RETURN_NONE;
+}
+
+static PyObject *
+pygst_debug_category_get_name (PyGstDebugCategory * self, void *closure)
+{
+  return Py_BuildValue ("s", gst_debug_category_get_name (self->category));
+}
+
+static PyObject *
+pygst_debug_category_get_description (PyGstDebugCategory * self,
+    void *closure)
+{
+  return Py_BuildValue ("z",
+      gst_debug_category_get_description (self->category));
+}
+
+static PyMethodDef pygst_debug_category_methods[] = {
+  {"trace", (PyCFunction) pygst_debug_category_trace, METH_VARARGS,
+      NULL},
+  {"log", (PyCFunction) pygst_debug_category_log, METH_VARARGS,
+      NULL},
+  {"debug", (PyCFunction) pygst_debug_category_debug, METH_VARARGS,
+      NULL},
+  {"info", (PyCFunction) pygst_debug_category_info, METH_VARARGS,
+      NULL},
+  {"warning", (PyCFunction) pygst_debug_category_warning, METH_VARARGS,
+      NULL},
+  {"error", (PyCFunction) pygst_debug_category_error, METH_VARARGS,
+      NULL},
+  {"fixme", (PyCFunction) pygst_debug_category_fixme, METH_VARARGS,
+      NULL},
+  {"memdump", (PyCFunction) pygst_debug_category_memdump, METH_VARARGS,
+      NULL},
+  {"get_threshold", (PyCFunction) pygst_debug_category_get_threshold,
+        METH_NOARGS,
+      NULL},
+  {"set_threshold", (PyCFunction) pygst_debug_category_set_threshold,
+        METH_VARARGS,
+      NULL},
+  {"reset_threshold", (PyCFunction) pygst_debug_category_reset_threshold,
+        METH_NOARGS,
+      NULL},
+  {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef pygst_debug_category_getsets[] = {
+  {(char *) "name", (getter) pygst_debug_category_get_name, NULL, NULL, NULL},
+  {(char *) "description", (getter) pygst_debug_category_get_description,
+      NULL, NULL, NULL},
+  {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject PyGstDebugCategory_Type = {
+  PyVarObject_HEAD_INIT (NULL, 0)
+  .tp_name = "_gi_gst.DebugCategory",
+  .tp_basicsize = sizeof (PyGstDebugCategory),
+  .tp_flags = Py_TPFLAGS_DEFAULT,
+  .tp_doc = "GStreamer debug category",
+  .tp_methods = pygst_debug_category_methods,
+  .tp_getset = pygst_debug_category_getsets,
+};
+
+static PyObject *
+_wrap_gst_debug_category_new (PyObject * whatever, PyObject * args)
+{
+  const gchar *name, *description = NULL;
+  int color = 0;
+  PyGstDebugCategory *self;
+
+  if (!PyArg_ParseTuple (args, "s|iz:debug_category_new", &name, &color,
+          &description))
+    return NULL;
+
+  self = PyObject_New (PyGstDebugCategory, &PyGstDebugCategory_Type);
+  if (self == NULL)
+    return NULL;
+
+  /* returns the existing category if there is one with that name */
+  self->category = _gst_debug_category_new (name, color, description);
+
+  return (PyObject *) self;
+}
+
+static PyMethodDef _gi_gst_functions[] = {
+  {"trace", (PyCFunction) _wrap_gst_trace, METH_VARARGS,
+      NULL},
+  {"log", (PyCFunction) _wrap_gst_log, METH_VARARGS,
+      NULL},
+  {"debug", (PyCFunction) _wrap_gst_debug, METH_VARARGS,
+      NULL},
+  {"info", (PyCFunction) _wrap_gst_info, METH_VARARGS,
+      NULL},
+  {"warning", (PyCFunction) _wrap_gst_warning, METH_VARARGS,
+      NULL},
+  {"error", (PyCFunction) _wrap_gst_error, METH_VARARGS,
+      NULL},
+  {"fixme", (PyCFunction) _wrap_gst_fixme, METH_VARARGS,
+      NULL},
+  {"memdump", (PyCFunction) _wrap_gst_memdump, METH_VARARGS,
+      NULL},
+  {"buffer_map", (PyCFunction) _wrap_gst_buffer_map, METH_VARARGS,
+      NULL},
+  {"video_frame_map", (PyCFunction) _wrap_gst_video_frame_map, METH_VARARGS,
+      NULL},
+  {"audio_meta_layout", (PyCFunction) _wrap_gst_audio_meta_layout,
+        METH_VARARGS,
+      NULL},
+  {"buffer_new_wrapped_object", (PyCFunction)
+        _wrap_gst_buffer_new_wrapped_object, METH_VARARGS,
+      NULL},
+  {"memfd_allocator_get", (PyCFunction) _wrap_gst_memfd_allocator_get,
+        METH_NOARGS,
+      NULL},
+  {"memory_get_memfd", (PyCFunction) _wrap_gst_memory_get_memfd,
+        METH_VARARGS,
+      NULL},
+  {"memfd_memory_import", (PyCFunction) _wrap_gst_memfd_memory_import,
+        METH_VARARGS,
+      NULL},
+  {"pad_set_chain_function", (PyCFunction) _wrap_gst_pad_set_chain_function,
+        METH_VARARGS,
+      NULL},
+  {"pad_set_chain_list_function", (PyCFunction)
+        _wrap_gst_pad_set_chain_list_function, METH_VARARGS,
+      NULL},
+  {"pad_set_event_function", (PyCFunction) _wrap_gst_pad_set_event_function,
+        METH_VARARGS,
+      NULL},
+  {"pad_set_query_function", (PyCFunction) _wrap_gst_pad_set_query_function,
+        METH_VARARGS,
+      NULL},
+  {"bus_drain", (PyCFunction) _wrap_gst_bus_drain, METH_VARARGS,
+      NULL},
+  {"bus_set_sync_handler", (PyCFunction) _wrap_gst_bus_set_sync_handler,
+        METH_VARARGS,
+      NULL},
+  {"bus_set_dispatch", (PyCFunction) _wrap_gst_bus_set_dispatch,
+        METH_VARARGS,
+      NULL},
+  {"debug_category_new", (PyCFunction) _wrap_gst_debug_category_new,
+        METH_VARARGS,
+      NULL},
+  {NULL, NULL, 0, NULL}
+};
+
+PYGLIB_MODULE_START (_gi_gst, "_gi_gst")
+{
+  PyObject *d;
+
+  /* gst should have been initialized already */
+
+  /* Initialize debugging category */
+  GST_DEBUG_CATEGORY_INIT (pygst_debug, "pygst", 0,
+      "GStreamer python bindings");
+  GST_DEBUG_CATEGORY_INIT (python_debug, "python", GST_DEBUG_FG_GREEN,
+      "python code using gst-python");
+
+  pygobject_init (3, 0, 0);
+
+  d = PyModule_GetDict (module);
+  gi_gst_register_types (d);
+
+#ifdef Py_GIL_DISABLED
+  PyUnstable_Module_SetGIL (module, Py_MOD_GIL_NOT_USED);
+#endif
+
+  if (PyType_Ready (&PyGstBufferMapping_Type) < 0)
+    PYGLIB_MODULE_ERROR_RETURN;
+  Py_INCREF (&PyGstBufferMapping_Type);
+  PyModule_AddObject (module, "BufferMapping",
+      (PyObject *) & PyGstBufferMapping_Type);
+
+  if (PyType_Ready (&PyGstVideoFrameMapping_Type) < 0 ||
+      PyType_Ready (&PyGstVideoPlane_Type) < 0)
+    PYGLIB_MODULE_ERROR_RETURN;
+  Py_INCREF (&PyGstVideoFrameMapping_Type);
+  PyModule_AddObject (module, "VideoFrameMapping",
+      (PyObject *) & PyGstVideoFrameMapping_Type);
+  Py_INCREF (&PyGstVideoPlane_Type);
+  PyModule_AddObject (module, "VideoPlane",
+      (PyObject *) & PyGstVideoPlane_Type);
+
+  if (PyType_Ready (&PyGstDebugCategory_Type) < 0)
+    PYGLIB_MODULE_ERROR_RETURN;
+  Py_INCREF (&PyGstDebugCategory_Type);
+  PyModule_AddObject (module, "DebugCategory",
+      (PyObject *) & PyGstDebugCategory_Type);
+
+  if (PyType_Ready (&PyGstPoolTask_Type) < 0)
+    PYGLIB_MODULE_ERROR_RETURN;
+  Py_INCREF (&PyGstPoolTask_Type);
+  PyModule_AddObject (module, "PoolTask", (PyObject *) & PyGstPoolTask_Type);
+
+#ifndef GST_DISABLE_GST_DEBUG
+  call_sites = g_hash_table_new (NULL, NULL);
+#endif
 
-  d = PyModule_GetDict (module);
-  gi_gst_register_types (d);
   pyg_register_class_init (GST_TYPE_ELEMENT, _pygst_element_init);
+  pyg_register_class_init (GST_TYPE_TASK_POOL, _pygst_task_pool_init);
 }
 
 PYGLIB_MODULE_END;
@@ -26,7 +26,9 @@
 #include <pygobject.h>
 #include <gst/gst.h>
 #include <gmodule.h>
+#include <glib/gstdio.h>
 #include <Python.h>
+#include <errno.h>
 
 void *_PyGstElement_Type;
 
@@ -35,84 +37,2149 @@ GST_DEBUG_CATEGORY_STATIC (pyplugindebug);
 
 #define GST_ORIGIN "http://gstreamer.freedesktop.org"
 
+/* An entry of __gstelementfactory__, which is either a single
+ * (name, rank, class) tuple or a list of them for modules providing several
+ * elements */
+typedef struct
+{
+  gchar *name;
+  guint rank;
+  GType type;
+} GstPythonFactory;
+
+static void
+gst_python_factory_free (GstPythonFactory * factory)
+{
+  g_free (factory->name);
+  g_free (factory);
+}
+
+static GstPythonFactory *
+gst_python_factory_parse (PyObject * entry)
+{
+  GstPythonFactory *factory;
+  const gchar *factory_name;
+  guint rank;
+  PyObject *class;
+  GType type;
+
+  /* parse tuple : name, rank, gst.ElementClass */
+  if (!PyTuple_Check (entry) ||
+      !PyArg_ParseTuple (entry, "sIO", &factory_name, &rank, &class)) {
+    GST_WARNING ("__gstelementfactory__ isn't correctly formatted");
+    PyErr_Print ();
+    PyErr_Clear ();
+    return NULL;
+  }
+
+  if (!PyObject_IsSubclass (class, (PyObject *) & PyGObject_Type)) {
+    GST_WARNING ("the class provided isn't a subclass of GObject.Object");
+    PyErr_Print ();
+    PyErr_Clear ();
+    return NULL;
+  }
+
+  type = pyg_type_from_object (class);
+  if (!g_type_is_a (type, GST_TYPE_ELEMENT)) {
+    GST_WARNING ("the class provided isn't a subclass of Gst.Element");
+    PyErr_Print ();
+    PyErr_Clear ();
+    return NULL;
+  }
+
+  factory = g_new (GstPythonFactory, 1);
+  factory->name = g_strdup (factory_name);
+  factory->rank = rank;
+  factory->type = type;
+
+  return factory;
+}
+
+/* Returns the valid factories described by __gstelementfactory__ in
+ * @module, the python error is cleared if there are none */
+static GList *
+gst_python_module_get_factories (PyObject * module, const gchar * name)
+{
+  PyObject *elementfactory, *entries;
+  GList *factories = NULL;
+  Py_ssize_t i;
+
+  /* Get __gstelementfactory__ from file */
+  elementfactory = PyObject_GetAttrString (module, "__gstelementfactory__");
+  if (!elementfactory) {
+    GST_DEBUG ("python file doesn't contain __gstelementfactory__");
+    PyErr_Clear ();
+    return NULL;
+  }
+
+  if (PyList_Check (elementfactory) || (PyTuple_Check (elementfactory) &&
+          PyTuple_GET_SIZE (elementfactory) > 0 &&
+          PyTuple_Check (PyTuple_GET_ITEM (elementfactory, 0)))) {
+    entries = elementfactory;
+    Py_INCREF (entries);
+  } else {
+    entries = PyTuple_Pack (1, elementfactory);
+  }
+
+  for (i = 0; i < PySequence_Size (entries); i++) {
+    PyObject *entry = PySequence_GetItem (entries, i);
+    GstPythonFactory *factory = gst_python_factory_parse (entry);
+
+    if (factory) {
+      GST_INFO ("Valid plugin %s providing %s", name, factory->name);
+      factories = g_list_append (factories, factory);
+    }
+    Py_DECREF (entry);
+  }
+
+  Py_DECREF (entries);
+  Py_DECREF (elementfactory);
+
+  return factories;
+}
+
+/* Load report
+ *
+ * How long each module took to load and how, the factories it registered
+ * and the error it raised if any. The records are logged once every
+ * directory has been scanned so the costly ones stand out, and stored as
+ * gi.repository.Gst.__python_plugin_report__ for Gst.python_plugin_report(). */
+
+typedef struct
+{
+  gchar *module;
+  const gchar *source;
+  gint64 start;
+  gint64 duration;
+  GPtrArray *factories;
+  gchar *error;
+} GstPythonModuleRecord;
+
+static GList *module_records = NULL;
+
+static GstPythonModuleRecord *
+gst_python_module_record_new (const gchar * module)
+{
+  GstPythonModuleRecord *record = g_new0 (GstPythonModuleRecord, 1);
+
+  record->module = g_strdup (module);
+  record->start = g_get_monotonic_time ();
+  record->factories = g_ptr_array_new_with_free_func (g_free);
+
+  return record;
+}
+
+static void
+gst_python_module_record_free (GstPythonModuleRecord * record)
+{
+  g_free (record->module);
+  g_ptr_array_unref (record->factories);
+  g_free (record->error);
+  g_free (record);
+}
+
+/* Takes ownership of @record */
+static void
+gst_python_module_record_add (GstPythonModuleRecord * record,
+    const gchar * source)
+{
+  record->source = source;
+  record->duration = g_get_monotonic_time () - record->start;
+  module_records = g_list_prepend (module_records, record);
+
+  GST_DEBUG ("loaded %s from %s in %" G_GINT64_FORMAT " us, %u factories%s%s",
+      record->module, source, record->duration, record->factories->len,
+      record->error ? ", " : "", record->error ? record->error : "");
+}
+
+/* Prints the pending python error, returning its description */
+static gchar *
+gst_python_error_print (void)
+{
+  PyObject *type, *value, *traceback, *text;
+  const gchar *str;
+  gchar *ret = NULL;
+
+  PyErr_Fetch (&type, &value, &traceback);
+  PyErr_NormalizeException (&type, &value, &traceback);
+  text = value ? PyObject_Str (value) : NULL;
+  if (text != NULL && PyArg_Parse (text, "s", &str))
+    ret = g_strdup_printf ("%s: %s", ((PyTypeObject *) type)->tp_name, str);
+  else
+    ret = g_strdup (type ? ((PyTypeObject *) type)->tp_name : "unknown error");
+  Py_XDECREF (text);
+  PyErr_Clear ();
+
+  PyErr_Restore (type, value, traceback);
+  PyErr_Print ();
+  PyErr_Clear ();
+
+  return ret;
+}
+
+static gint
+gst_python_module_record_compare (GstPythonModuleRecord * a,
+    GstPythonModuleRecord * b)
+{
+  return (a->duration < b->duration) - (a->duration > b->duration);
+}
+
+static PyObject *
+gst_python_module_record_to_dict (GstPythonModuleRecord * record)
+{
+  PyObject *factories, *dict;
+  guint i;
+
+  factories = PyList_New (record->factories->len);
+  for (i = 0; i < record->factories->len; i++)
+    PyList_SET_ITEM (factories, i,
+        PyUnicode_FromString (g_ptr_array_index (record->factories, i)));
+
+  dict = Py_BuildValue ("{s:s,s:s,s:d,s:N,s:z}", "module", record->module,
+      "source", record->source, "duration",
+      record->duration / (gdouble) G_USEC_PER_SEC, "factories", factories,
+      "error", record->error);
+
+  return dict;
+}
+
+static void
+gst_python_module_records_report (void)
+{
+  PyObject *gst, *report;
+  GList *l;
+  gint64 total = 0;
+
+  report = PyList_New (0);
+  module_records = g_list_sort (module_records,
+      (GCompareFunc) gst_python_module_record_compare);
+  for (l = module_records; l; l = l->next) {
+    GstPythonModuleRecord *record = l->data;
+    PyObject *item;
+
+    GST_INFO ("%8" G_GINT64_FORMAT " us  %-8s %s%s%s", record->duration,
+        record->source, record->module, record->error ? ": " : "",
+        record->error ? record->error : "");
+    total += record->duration;
+
+    item = gst_python_module_record_to_dict (record);
+    if (item != NULL) {
+      PyList_Append (report, item);
+      Py_DECREF (item);
+    }
+  }
+  GST_INFO ("loaded %u python modules in %" G_GINT64_FORMAT " us",
+      g_list_length (module_records), total);
+
+  gst = PyImport_ImportModule ("gi.repository.Gst");
+  if (gst == NULL
+      || PyObject_SetAttrString (gst, "__python_plugin_report__", report)) {
+    GST_WARNING ("Couldn't set __python_plugin_report__ attribute");
+    PyErr_Clear ();
+  }
+  Py_XDECREF (gst);
+  Py_DECREF (report);
+
+  g_list_free_full (module_records,
+      (GDestroyNotify) gst_python_module_record_free);
+  module_records = NULL;
+}
+
+/* Manifests
+ *
+ * A python module can come with a <module>.gstmanifest key file describing
+ * the element factories it provides, in which case they are registered
+ * without importing the module when scanning the plugin directories:
+ *
+ *   [identity_py]
+ *   rank=0
+ *   long-name=Identity Python
+ *   klass=Transform
+ *   description=Simple identity element written in python
+ *   author=Marianna S. Buschle
+ *   pad-templates=src;sink;
+ *   properties=silent;
+ *
+ *   [identity_py:src]
+ *   direction=src
+ *   presence=always
+ *   caps=ANY
+ *
+ *   [identity_py::silent]
+ *   type=gboolean
+ *   nick=Silent
+ *   blurb=Don't print anything
+ *   flags=readable;writable;
+ *   default=false
+ *
+ * The type of a property is the name of a GType known without importing the
+ * module, numbers have a minimum and a maximum too. Its flags are among
+ * readable, writable, deprecated, controllable, mutable-ready,
+ * mutable-paused and mutable-playing. An interfaces key lists the interfaces
+ * of the class, the placeholder can only stand for GstChildProxy.
+ *
+ * The manifest of a package module is its __init__.gstmanifest.
+ *
+ * Each factory is registered with a placeholder element type carrying its
+ * metadata and pad templates, so the module is only imported once the element
+ * is actually created. The placeholder is a bin: creating it imports the
+ * module and adds an instance of the class from __gstelementfactory__ as its
+ * only child, with ghost pads for the pads of the child. Once the module is
+ * imported the factory is registered again with the type of the class, so
+ * only the first element created in a process is wrapped and the next ones
+ * are instances of the class.
+ *
+ * The placeholder has the properties of the manifest, forwarded to its child
+ * like the GstChildProxy interface. If the module can't be imported or
+ * doesn't provide the element, the placeholder stays empty and fails to go
+ * to READY with an error.
+ */
+
+#define GST_PYTHON_MANIFEST_SUFFIX ".gstmanifest"
+
+typedef struct
+{
+  gchar *name;
+  GstPadDirection direction;
+  GstPadPresence presence;
+  gchar *caps;
+} GstPythonPadTemplateInfo;
+
+typedef struct
+{
+  gchar *module;
+  gchar *name;
+  guint rank;
+  gchar *longname;
+  gchar *classification;
+  gchar *description;
+  gchar *author;
+  GList *templates;
+  GList *properties;
+  GstPlugin *plugin;
+  GType type;
+  gboolean failed;
+} GstPythonFactoryInfo;
+
+typedef struct
+{
+  GstBinClass parent_class;
+  GstPythonFactoryInfo *info;
+} GstPythonLazyElementClass;
+
+typedef struct
+{
+  GstBin parent;
+  GstElement *element;
+} GstPythonLazyElement;
+
+#define GST_PYTHON_LAZY_GHOST_PAD "gst-python-lazy-ghost-pad"
+
+static const struct
+{
+  GParamFlags flag;
+  const gchar *name;
+} gst_python_property_flags[] = {
+  {G_PARAM_READABLE, "readable"},
+  {G_PARAM_WRITABLE, "writable"},
+  {G_PARAM_DEPRECATED, "deprecated"},
+  {GST_PARAM_CONTROLLABLE, "controllable"},
+  {GST_PARAM_MUTABLE_READY, "mutable-ready"},
+  {GST_PARAM_MUTABLE_PAUSED, "mutable-paused"},
+  {GST_PARAM_MUTABLE_PLAYING, "mutable-playing"},
+};
+
+/* the GstChildProxy of GstBin, for the placeholders without child proxy */
+static GstChildProxyInterface *gst_python_bin_child_proxy = NULL;
+
+static void
+gst_python_pad_template_info_free (GstPythonPadTemplateInfo * templ)
+{
+  g_free (templ->name);
+  g_free (templ->caps);
+  g_free (templ);
+}
+
+static void
+gst_python_factory_info_free (GstPythonFactoryInfo * info)
+{
+  g_free (info->module);
+  g_free (info->name);
+  g_free (info->longname);
+  g_free (info->classification);
+  g_free (info->description);
+  g_free (info->author);
+  g_list_free_full (info->templates,
+      (GDestroyNotify) gst_python_pad_template_info_free);
+  g_list_free_full (info->properties, (GDestroyNotify) g_param_spec_unref);
+  g_free (info);
+}
+
+/* Imports the module of @info the first time, returning the element type
+ * its placeholder stands for and registering the factory again with it */
+static GType
+gst_python_factory_info_get_type (GstPythonFactoryInfo * info)
+{
+  PyGILState_STATE state;
+  PyObject *module;
+  GList *factories, *l;
+
+  state = PyGILState_Ensure ();
+
+  if (info->type != G_TYPE_INVALID || info->failed)
+    goto done;
+
+  GST_DEBUG ("importing %s for element %s", info->module, info->name);
+  module = PyImport_ImportModule (info->module);
+  if (!module) {
+    GST_ERROR ("Could not import %s for element %s", info->module,
+        info->name);
+    PyErr_Print ();
+    PyErr_Clear ();
+    info->failed = TRUE;
+    goto done;
+  }
+
+  factories = gst_python_module_get_factories (module, info->module);
+  Py_DECREF (module);
+
+  for (l = factories; l; l = l->next) {
+    GstPythonFactory *factory = l->data;
+
+    if (g_strcmp0 (factory->name, info->name) == 0)
+      info->type = factory->type;
+  }
+  g_list_free_full (factories, (GDestroyNotify) gst_python_factory_free);
+
+  if (info->type == G_TYPE_INVALID) {
+    GST_ERROR ("%s doesn't provide element %s declared in its manifest",
+        info->module, info->name);
+    info->failed = TRUE;
+  } else if (!gst_element_register (info->plugin, info->name, info->rank,
+          info->type)) {
+    GST_WARNING ("Could not register %s again with its type", info->name);
+  }
+
+done:
+  PyGILState_Release (state);
+
+  return info->type;
+}
+
+static gpointer
+gst_python_lazy_element_parent_class (gpointer instance)
+{
+  return g_type_class_peek_parent (G_OBJECT_GET_CLASS (instance));
+}
+
+static GstPad *
+gst_python_lazy_element_ghost_pad (GstPythonLazyElement * self, GstPad * pad)
+{
+  GstPadTemplate *pad_templ, *templ = NULL;
+  GstPad *ghost;
+
+  pad_templ = gst_pad_get_pad_template (pad);
+  if (pad_templ) {
+    templ = gst_element_class_get_pad_template (GST_ELEMENT_GET_CLASS (self),
+        GST_PAD_TEMPLATE_NAME_TEMPLATE (pad_templ));
+    gst_object_unref (pad_templ);
+  }
+
+  if (templ)
+    ghost = gst_ghost_pad_new_from_template (GST_PAD_NAME (pad), pad, templ);
+  else
+    ghost = gst_ghost_pad_new (GST_PAD_NAME (pad), pad);
+
+  g_object_set_data (G_OBJECT (pad), GST_PYTHON_LAZY_GHOST_PAD, ghost);
+  if (GST_PAD_IS_ACTIVE (pad))
+    gst_pad_set_active (ghost, TRUE);
+  gst_element_add_pad (GST_ELEMENT (self), ghost);
+
+  return ghost;
+}
+
+static void
+gst_python_lazy_element_pad_added (GstElement * element, GstPad * pad,
+    GstPythonLazyElement * self)
+{
+  GstPadTemplate *templ = gst_pad_get_pad_template (pad);
+  gboolean requested = FALSE;
+
+  if (templ) {
+    requested = GST_PAD_TEMPLATE_PRESENCE (templ) == GST_PAD_REQUEST;
+    gst_object_unref (templ);
+  }
+
+  /* request pads are ghosted by request_new_pad() */
+  if (!requested)
+    gst_python_lazy_element_ghost_pad (self, pad);
+}
+
+static void
+gst_python_lazy_element_pad_removed (GstElement * element, GstPad * pad,
+    GstPythonLazyElement * self)
+{
+  GstPad *ghost = g_object_steal_data (G_OBJECT (pad),
+      GST_PYTHON_LAZY_GHOST_PAD);
+
+  if (ghost)
+    gst_element_remove_pad (GST_ELEMENT (self), ghost);
+}
+
+static void
+gst_python_lazy_element_constructed (GObject * object)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) object;
+  GstPythonFactoryInfo *info =
+      ((GstPythonLazyElementClass *) G_OBJECT_GET_CLASS (object))->info;
+  GObjectClass *parent_class = gst_python_lazy_element_parent_class (object);
+  GstElementFactory *factory;
+  GList *pads, *l;
+  GType type;
+
+  if (parent_class->constructed)
+    parent_class->constructed (object);
+
+  type = gst_python_factory_info_get_type (info);
+  if (type == G_TYPE_INVALID)
+    return;
+
+  /* from the factory registered again, so that the element knows it */
+  factory = gst_element_factory_find (info->name);
+  if (factory && gst_element_factory_get_element_type (factory) == type)
+    self->element = gst_element_factory_create (factory, info->name);
+  else
+    self->element = g_object_new (type, "name", info->name, NULL);
+  if (factory)
+    gst_object_unref (factory);
+
+  if (self->element == NULL)
+    return;
+
+  gst_object_ref_sink (self->element);
+  gst_bin_add (GST_BIN (self), self->element);
+
+  GST_OBJECT_LOCK (self->element);
+  pads = g_list_copy_deep (GST_ELEMENT_PADS (self->element),
+      (GCopyFunc) gst_object_ref, NULL);
+  GST_OBJECT_UNLOCK (self->element);
+
+  for (l = pads; l; l = l->next)
+    gst_python_lazy_element_ghost_pad (self, l->data);
+  g_list_free_full (pads, gst_object_unref);
+
+  g_signal_connect_object (self->element, "pad-added",
+      G_CALLBACK (gst_python_lazy_element_pad_added), self, 0);
+  g_signal_connect_object (self->element, "pad-removed",
+      G_CALLBACK (gst_python_lazy_element_pad_removed), self, 0);
+}
+
+static void
+gst_python_lazy_element_dispose (GObject * object)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) object;
+  GObjectClass *parent_class = gst_python_lazy_element_parent_class (object);
+
+  if (self->element) {
+    gst_object_unref (self->element);
+    self->element = NULL;
+  }
+
+  parent_class->dispose (object);
+}
+
+static GstStateChangeReturn
+gst_python_lazy_element_change_state (GstElement * element,
+    GstStateChange transition)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) element;
+  GstElementClass *parent_class = gst_python_lazy_element_parent_class (self);
+  GstPythonFactoryInfo *info =
+      ((GstPythonLazyElementClass *) G_OBJECT_GET_CLASS (self))->info;
+
+  if (transition == GST_STATE_CHANGE_NULL_TO_READY && self->element == NULL) {
+    GST_ELEMENT_ERROR (element, CORE, MISSING_PLUGIN, (NULL),
+        ("%s can't be imported or doesn't provide element %s", info->module,
+            info->name));
+    return GST_STATE_CHANGE_FAILURE;
+  }
+
+  return parent_class->change_state (element, transition);
+}
+
+static GstPad *
+gst_python_lazy_element_request_new_pad (GstElement * element,
+    GstPadTemplate * templ, const gchar * name, const GstCaps * caps)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) element;
+  GstPadTemplate *element_templ;
+  GstPad *pad, *ghost;
+
+  if (self->element == NULL)
+    return NULL;
+
+  element_templ =
+      gst_element_class_get_pad_template (GST_ELEMENT_GET_CLASS
+      (self->element), GST_PAD_TEMPLATE_NAME_TEMPLATE (templ));
+  if (element_templ == NULL)
+    return NULL;
+
+  pad = gst_element_request_pad (self->element, element_templ, name, caps);
+  if (pad == NULL)
+    return NULL;
+
+  ghost = gst_python_lazy_element_ghost_pad (self, pad);
+  gst_object_unref (pad);
+
+  return ghost;
+}
+
+static void
+gst_python_lazy_element_release_pad (GstElement * element, GstPad * pad)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) element;
+  GstPad *target = gst_ghost_pad_get_target (GST_GHOST_PAD (pad));
+
+  if (target)
+    g_object_steal_data (G_OBJECT (target), GST_PYTHON_LAZY_GHOST_PAD);
+  gst_element_remove_pad (element, pad);
+
+  if (target) {
+    if (self->element)
+      gst_element_release_request_pad (self->element, target);
+    gst_object_unref (target);
+  }
+}
+
+static void
+gst_python_lazy_element_set_property (GObject * object, guint prop_id,
+    const GValue * value, GParamSpec * pspec)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) object;
+
+  if (self->element)
+    g_object_set_property (G_OBJECT (self->element), pspec->name, value);
+}
+
+static void
+gst_python_lazy_element_get_property (GObject * object, guint prop_id,
+    GValue * value, GParamSpec * pspec)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) object;
+
+  if (self->element)
+    g_object_get_property (G_OBJECT (self->element), pspec->name, value);
+  else
+    g_param_value_set_default (pspec, value);
+}
+
+/* The children of the child when it is a GstChildProxy, the child itself
+ * otherwise */
+static GObject *
+gst_python_lazy_element_get_child_by_name (GstChildProxy * proxy,
+    const gchar * name)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) proxy;
+
+  if (self->element && GST_IS_CHILD_PROXY (self->element))
+    return gst_child_proxy_get_child_by_name (GST_CHILD_PROXY (self->element),
+        name);
+
+  return gst_python_bin_child_proxy->get_child_by_name (proxy, name);
+}
+
+static GObject *
+gst_python_lazy_element_get_child_by_index (GstChildProxy * proxy,
+    guint index)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) proxy;
+
+  if (self->element && GST_IS_CHILD_PROXY (self->element))
+    return gst_child_proxy_get_child_by_index (GST_CHILD_PROXY
+        (self->element), index);
+
+  return gst_python_bin_child_proxy->get_child_by_index (proxy, index);
+}
+
+static guint
+gst_python_lazy_element_get_children_count (GstChildProxy * proxy)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) proxy;
+
+  if (self->element && GST_IS_CHILD_PROXY (self->element))
+    return gst_child_proxy_get_children_count (GST_CHILD_PROXY
+        (self->element));
+
+  return gst_python_bin_child_proxy->get_children_count (proxy);
+}
+
+static void
+gst_python_lazy_element_child_proxy_init (gpointer g_iface,
+    gpointer iface_data)
+{
+  GstChildProxyInterface *iface = g_iface;
+
+  gst_python_bin_child_proxy = g_type_interface_peek_parent (iface);
+  iface->get_child_by_name = gst_python_lazy_element_get_child_by_name;
+  iface->get_child_by_index = gst_python_lazy_element_get_child_by_index;
+  iface->get_children_count = gst_python_lazy_element_get_children_count;
+}
+
+/* Events and queries sent to the placeholder are the ones of its child */
+static gboolean
+gst_python_lazy_element_send_event (GstElement * element, GstEvent * event)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) element;
+  GstElementClass *parent_class = gst_python_lazy_element_parent_class (self);
+
+  if (self->element)
+    return gst_element_send_event (self->element, event);
+
+  return parent_class->send_event (element, event);
+}
+
+static gboolean
+gst_python_lazy_element_query (GstElement * element, GstQuery * query)
+{
+  GstPythonLazyElement *self = (GstPythonLazyElement *) element;
+  GstElementClass *parent_class = gst_python_lazy_element_parent_class (self);
+
+  if (self->element)
+    return gst_element_query (self->element, query);
+
+  return parent_class->query (element, query);
+}
+
+static void
+gst_python_lazy_element_class_init (gpointer g_class, gpointer class_data)
+{
+  GstPythonLazyElementClass *klass = g_class;
+  GObjectClass *gobject_class = G_OBJECT_CLASS (klass);
+  GstElementClass *element_class = GST_ELEMENT_CLASS (klass);
+  GstPythonFactoryInfo *info = class_data;
+  guint prop_id = 1;
+  GList *l;
+
+  klass->info = info;
+  gobject_class->constructed = gst_python_lazy_element_constructed;
+  gobject_class->dispose = gst_python_lazy_element_dispose;
+  gobject_class->set_property = gst_python_lazy_element_set_property;
+  gobject_class->get_property = gst_python_lazy_element_get_property;
+  element_class->change_state = gst_python_lazy_element_change_state;
+  element_class->request_new_pad = gst_python_lazy_element_request_new_pad;
+  element_class->release_pad = gst_python_lazy_element_release_pad;
+  element_class->send_event = gst_python_lazy_element_send_event;
+  element_class->query = gst_python_lazy_element_query;
+
+  gst_element_class_set_metadata (element_class, info->longname,
+      info->classification, info->description, info->author);
+
+  for (l = info->templates; l; l = l->next) {
+    GstPythonPadTemplateInfo *templ = l->data;
+    GstCaps *caps = gst_caps_from_string (templ->caps);
+
+    if (caps == NULL) {
+      GST_WARNING ("Invalid caps for pad template %s of %s: %s", templ->name,
+          info->name, templ->caps);
+      continue;
+    }
+
+    gst_element_class_add_pad_template (element_class,
+        gst_pad_template_new (templ->name, templ->direction, templ->presence,
+            caps));
+    gst_caps_unref (caps);
+  }
+
+  for (l = info->properties; l; l = l->next) {
+    GParamSpec *pspec = l->data;
+
+    /* the ones of GstBin stay the placeholder's own */
+    if (g_object_class_find_property (gobject_class, pspec->name))
+      continue;
+    g_object_class_install_property (gobject_class, prop_id++, pspec);
+  }
+}
+
+/* Takes ownership of @info */
+static gboolean
+gst_python_lazy_element_register (GstPlugin * plugin,
+    GstPythonFactoryInfo * info)
+{
+  GTypeInfo type_info = { 0, };
+  GInterfaceInfo child_proxy_info = {
+    gst_python_lazy_element_child_proxy_init, NULL, NULL
+  };
+  gchar *type_name;
+  GType type;
+
+  type_name = g_strdup_printf ("GstPythonLazy+%s", info->name);
+  type = g_type_from_name (type_name);
+  if (type == G_TYPE_INVALID) {
+    type_info.class_size = sizeof (GstPythonLazyElementClass);
+    type_info.class_init = gst_python_lazy_element_class_init;
+    type_info.class_data = info;
+    type_info.instance_size = sizeof (GstPythonLazyElement);
+    type = g_type_register_static (GST_TYPE_BIN, type_name, &type_info, 0);
+    g_type_add_interface_static (type, GST_TYPE_CHILD_PROXY,
+        &child_proxy_info);
+  } else {
+    gst_python_factory_info_free (info);
+    info = ((GstPythonLazyElementClass *) g_type_class_ref (type))->info;
+  }
+  g_free (type_name);
+
+  GST_INFO ("Registering %s from the manifest of %s", info->name,
+      info->module);
+
+  info->plugin = plugin;
+  if (info->type != G_TYPE_INVALID)
+    return gst_element_register (plugin, info->name, info->rank, info->type);
+
+  return gst_element_register (plugin, info->name, info->rank, type);
+}
+
+static gchar *
+gst_python_manifest_get_string (GKeyFile * manifest, const gchar * group,
+    const gchar * key, const gchar * default_value)
+{
+  gchar *value = g_key_file_get_string (manifest, group, key, NULL);
+
+  return value ? value : g_strdup (default_value);
+}
+
+static GstPythonPadTemplateInfo *
+gst_python_manifest_get_pad_template (GKeyFile * manifest,
+    const gchar * factory, const gchar * name)
+{
+  GstPythonPadTemplateInfo *templ;
+  gchar *group, *direction, *presence;
+
+  group = g_strdup_printf ("%s:%s", factory, name);
+  if (!g_key_file_has_group (manifest, group)) {
+    GST_WARNING ("No pad template %s for %s in manifest", name, factory);
+    g_free (group);
+    return NULL;
+  }
+
+  templ = g_new0 (GstPythonPadTemplateInfo, 1);
+  templ->name = g_strdup (name);
+  templ->caps = gst_python_manifest_get_string (manifest, group, "caps",
+      "ANY");
+
+  direction = gst_python_manifest_get_string (manifest, group, "direction",
+      "");
+  if (g_strcmp0 (direction, "src") == 0)
+    templ->direction = GST_PAD_SRC;
+  else if (g_strcmp0 (direction, "sink") == 0)
+    templ->direction = GST_PAD_SINK;
+  else
+    templ->direction = GST_PAD_UNKNOWN;
+
+  presence = gst_python_manifest_get_string (manifest, group, "presence",
+      "always");
+  if (g_strcmp0 (presence, "sometimes") == 0)
+    templ->presence = GST_PAD_SOMETIMES;
+  else if (g_strcmp0 (presence, "request") == 0)
+    templ->presence = GST_PAD_REQUEST;
+  else
+    templ->presence = GST_PAD_ALWAYS;
+
+  g_free (group);
+  g_free (presence);
+  g_free (direction);
+
+  if (templ->direction == GST_PAD_UNKNOWN) {
+    GST_WARNING ("Invalid direction for pad template %s of %s", name,
+        factory);
+    gst_python_pad_template_info_free (templ);
+    return NULL;
+  }
+
+  return templ;
+}
+
+static gint64
+gst_python_manifest_get_int64 (GKeyFile * manifest, const gchar * group,
+    const gchar * key, gint64 default_value)
+{
+  GError *error = NULL;
+  gint64 value = g_key_file_get_int64 (manifest, group, key, &error);
+
+  if (error) {
+    g_error_free (error);
+    return default_value;
+  }
+  return value;
+}
+
+static guint64
+gst_python_manifest_get_uint64 (GKeyFile * manifest, const gchar * group,
+    const gchar * key, guint64 default_value)
+{
+  GError *error = NULL;
+  guint64 value = g_key_file_get_uint64 (manifest, group, key, &error);
+
+  if (error) {
+    g_error_free (error);
+    return default_value;
+  }
+  return value;
+}
+
+static gdouble
+gst_python_manifest_get_double (GKeyFile * manifest, const gchar * group,
+    const gchar * key, gdouble default_value)
+{
+  GError *error = NULL;
+  gdouble value = g_key_file_get_double (manifest, group, key, &error);
+
+  if (error) {
+    g_error_free (error);
+    return default_value;
+  }
+  return value;
+}
+
+static GParamSpec *
+gst_python_manifest_get_property (GKeyFile * manifest,
+    const gchar * factory, const gchar * name)
+{
+  GParamSpec *pspec = NULL;
+  GParamFlags flags = 0;
+  gchar *group, *type_name, *nick, *blurb, **flag_names;
+  gint64 imin, imax, idef;
+  guint64 umin, umax, udef;
+  gdouble dmin, dmax, ddef;
+  GType type;
+  gint i, j;
+
+  group = g_strdup_printf ("%s::%s", factory, name);
+  if (!g_key_file_has_group (manifest, group)) {
+    GST_WARNING ("No property %s for %s in manifest", name, factory);
+    g_free (group);
+    return NULL;
+  }
+
+  type_name = gst_python_manifest_get_string (manifest, group, "type", "");
+  type = g_type_from_name (type_name);
+  nick = gst_python_manifest_get_string (manifest, group, "nick", name);
+  blurb = gst_python_manifest_get_string (manifest, group, "blurb", "");
+
+  flag_names = g_key_file_get_string_list (manifest, group, "flags", NULL,
+      NULL);
+  for (i = 0; flag_names && flag_names[i]; i++) {
+    for (j = 0; j < G_N_ELEMENTS (gst_python_property_flags); j++) {
+      if (strcmp (flag_names[i], gst_python_property_flags[j].name) == 0)
+        flags |= gst_python_property_flags[j].flag;
+    }
+  }
+  g_strfreev (flag_names);
+
+  switch (G_TYPE_FUNDAMENTAL (type)) {
+    case G_TYPE_BOOLEAN:
+      pspec = g_param_spec_boolean (name, nick, blurb,
+          g_key_file_get_boolean (manifest, group, "default", NULL), flags);
+      break;
+    case G_TYPE_INT:
+    case G_TYPE_LONG:
+    case G_TYPE_INT64:
+      imin = gst_python_manifest_get_int64 (manifest, group, "minimum",
+          type == G_TYPE_INT ? G_MININT : type == G_TYPE_LONG ? G_MINLONG :
+          G_MININT64);
+      imax = gst_python_manifest_get_int64 (manifest, group, "maximum",
+          type == G_TYPE_INT ? G_MAXINT : type == G_TYPE_LONG ? G_MAXLONG :
+          G_MAXINT64);
+      idef = gst_python_manifest_get_int64 (manifest, group, "default",
+          CLAMP (0, imin, imax));
+      if (imin > idef || idef > imax)
+        break;
+      if (type == G_TYPE_INT)
+        pspec = g_param_spec_int (name, nick, blurb, imin, imax, idef, flags);
+      else if (type == G_TYPE_LONG)
+        pspec = g_param_spec_long (name, nick, blurb, imin, imax, idef, flags);
+      else
+        pspec = g_param_spec_int64 (name, nick, blurb, imin, imax, idef,
+            flags);
+      break;
+    case G_TYPE_UINT:
+    case G_TYPE_ULONG:
+    case G_TYPE_UINT64:
+      umin = gst_python_manifest_get_uint64 (manifest, group, "minimum", 0);
+      umax = gst_python_manifest_get_uint64 (manifest, group, "maximum",
+          type == G_TYPE_UINT ? G_MAXUINT : type == G_TYPE_ULONG ? G_MAXULONG :
+          G_MAXUINT64);
+      udef = gst_python_manifest_get_uint64 (manifest, group, "default",
+          umin);
+      if (umin > udef || udef > umax)
+        break;
+      if (type == G_TYPE_UINT)
+        pspec = g_param_spec_uint (name, nick, blurb, umin, umax, udef, flags);
+      else if (type == G_TYPE_ULONG)
+        pspec = g_param_spec_ulong (name, nick, blurb, umin, umax, udef,
+            flags);
+      else
+        pspec = g_param_spec_uint64 (name, nick, blurb, umin, umax, udef,
+            flags);
+      break;
+    case G_TYPE_FLOAT:
+    case G_TYPE_DOUBLE:
+      dmin = gst_python_manifest_get_double (manifest, group, "minimum",
+          type == G_TYPE_FLOAT ? -G_MAXFLOAT : -G_MAXDOUBLE);
+      dmax = gst_python_manifest_get_double (manifest, group, "maximum",
+          type == G_TYPE_FLOAT ? G_MAXFLOAT : G_MAXDOUBLE);
+      ddef = gst_python_manifest_get_double (manifest, group, "default",
+          CLAMP (0, dmin, dmax));
+      if (dmin > ddef || ddef > dmax)
+        break;
+      if (type == G_TYPE_FLOAT)
+        pspec = g_param_spec_float (name, nick, blurb, dmin, dmax, ddef,
+            flags);
+      else
+        pspec = g_param_spec_double (name, nick, blurb, dmin, dmax, ddef,
+            flags);
+      break;
+    case G_TYPE_STRING:{
+      gchar *value = g_key_file_get_string (manifest, group, "default", NULL);
+
+      pspec = g_param_spec_string (name, nick, blurb, value, flags);
+      g_free (value);
+      break;
+    }
+    case G_TYPE_ENUM:{
+      GEnumClass *klass = g_type_class_ref (type);
+      gchar *nick_value = g_key_file_get_string (manifest, group, "default",
+          NULL);
+      GEnumValue *value = nick_value ?
+          g_enum_get_value_by_nick (klass, nick_value) : NULL;
+
+      pspec = g_param_spec_enum (name, nick, blurb, type,
+          value ? value->value : klass->values[0].value, flags);
+      g_free (nick_value);
+      g_type_class_unref (klass);
+      break;
+    }
+    case G_TYPE_FLAGS:
+      pspec = g_param_spec_flags (name, nick, blurb, type,
+          gst_python_manifest_get_uint64 (manifest, group, "default", 0),
+          flags);
+      break;
+    case G_TYPE_BOXED:
+      pspec = g_param_spec_boxed (name, nick, blurb, type, flags);
+      break;
+    case G_TYPE_OBJECT:
+      pspec = g_param_spec_object (name, nick, blurb, type, flags);
+      break;
+    default:
+      break;
+  }
+
+  if (pspec == NULL)
+    GST_WARNING ("Invalid property %s of %s, of type %s", name, factory,
+        type_name);
+  else
+    g_param_spec_ref_sink (pspec);
+
+  g_free (blurb);
+  g_free (nick);
+  g_free (type_name);
+  g_free (group);
+
+  return pspec;
+}
+
+static GstPythonFactoryInfo *
+gst_python_manifest_get_factory (GKeyFile * manifest, const gchar * module,
+    const gchar * name)
+{
+  GstPythonFactoryInfo *info;
+  gchar **templates, **properties, **interfaces;
+  gint i;
+
+  info = g_new0 (GstPythonFactoryInfo, 1);
+  info->module = g_strdup (module);
+  info->name = g_strdup (name);
+  info->rank = g_key_file_get_integer (manifest, name, "rank", NULL);
+  info->longname = gst_python_manifest_get_string (manifest, name,
+      "long-name", name);
+  info->classification = gst_python_manifest_get_string (manifest, name,
+      "klass", "Unknown");
+  info->description = gst_python_manifest_get_string (manifest, name,
+      "description", "");
+  info->author = gst_python_manifest_get_string (manifest, name, "author",
+      "");
+
+  templates = g_key_file_get_string_list (manifest, name, "pad-templates",
+      NULL, NULL);
+  for (i = 0; templates && templates[i]; i++) {
+    GstPythonPadTemplateInfo *templ;
+
+    templ = gst_python_manifest_get_pad_template (manifest, name,
+        templates[i]);
+    if (templ == NULL) {
+      g_strfreev (templates);
+      gst_python_factory_info_free (info);
+      return NULL;
+    }
+
+    info->templates = g_list_append (info->templates, templ);
+  }
+  g_strfreev (templates);
+
+  properties = g_key_file_get_string_list (manifest, name, "properties",
+      NULL, NULL);
+  for (i = 0; properties && properties[i]; i++) {
+    GParamSpec *pspec;
+
+    pspec = gst_python_manifest_get_property (manifest, name, properties[i]);
+    if (pspec == NULL) {
+      g_strfreev (properties);
+      gst_python_factory_info_free (info);
+      return NULL;
+    }
+
+    info->properties = g_list_append (info->properties, pspec);
+  }
+  g_strfreev (properties);
+
+  interfaces = g_key_file_get_string_list (manifest, name, "interfaces",
+      NULL, NULL);
+  for (i = 0; interfaces && interfaces[i]; i++) {
+    GType iface = g_type_from_name (interfaces[i]);
+
+    if (iface == G_TYPE_INVALID || !g_type_is_a (GST_TYPE_BIN, iface)) {
+      GST_DEBUG ("The placeholder of %s can't implement %s", name,
+          interfaces[i]);
+      g_strfreev (interfaces);
+      gst_python_factory_info_free (info);
+      return NULL;
+    }
+  }
+  g_strfreev (interfaces);
+
+  return info;
+}
+
+/* Registers the factories described in @manifest, the ones from its groups
+ * that are not pad templates unless @names are given, and adds them to
+ * @record. Returns FALSE if they can't be used and the module must be
+ * imported instead. */
+static gboolean
+gst_python_manifest_register (GstPlugin * plugin, GKeyFile * manifest,
+    const gchar * module, gchar ** names, GstPythonModuleRecord * record)
+{
+  GList *factories = NULL, *l;
+  gchar **groups = NULL;
+  gint i;
+
+  if (names == NULL)
+    names = groups = g_key_file_get_groups (manifest, NULL);
+
+  for (i = 0; names[i]; i++) {
+    GstPythonFactoryInfo *info;
+
+    /* pad template groups */
+    if (strchr (names[i], ':'))
+      continue;
+
+    info = gst_python_manifest_get_factory (manifest, module, names[i]);
+    if (info == NULL) {
+      g_list_free_full (factories,
+          (GDestroyNotify) gst_python_factory_info_free);
+      g_strfreev (groups);
+      return FALSE;
+    }
+
+    factories = g_list_append (factories, info);
+  }
+  g_strfreev (groups);
+
+  for (l = factories; l; l = l->next) {
+    GstPythonFactoryInfo *info = l->data;
+
+    g_ptr_array_add (record->factories, g_strdup (info->name));
+    gst_python_lazy_element_register (plugin, info);
+  }
+  g_list_free (factories);
+
+  return TRUE;
+}
+
+static gboolean
+gst_python_plugin_load_manifest (GstPlugin * plugin, const gchar * path,
+    const gchar * module, GstPythonModuleRecord * record)
+{
+  GKeyFile *manifest;
+  GError *error = NULL;
+  gboolean ret;
+
+  manifest = g_key_file_new ();
+  if (!g_key_file_load_from_file (manifest, path, G_KEY_FILE_NONE, &error)) {
+    GST_WARNING ("Could not load manifest %s: %s", path, error->message);
+    g_error_free (error);
+    g_key_file_free (manifest);
+    return FALSE;
+  }
+
+  ret = gst_python_manifest_register (plugin, manifest, module, NULL, record);
+  if (!ret)
+    GST_WARNING ("Invalid manifest %s", path);
+  g_key_file_free (manifest);
+
+  return ret;
+}
+
+/* Scan cache
+ *
+ * What importing a module without a manifest registered is kept in a cache
+ * file written in the manifest format, so the next scans can register it
+ * from there as long as the python ABI and the files it was loaded from
+ * didn't change. Those are the file of the module and the ones of the
+ * modules of the plugin directory it imported, directly or not, each
+ * stamped with its modification time and size, so changing a module only
+ * invalidates the modules using it. The imports are followed by wrapping
+ * __import__() while scanning, modules imported with importlib are not
+ * seen. The modules of a bundle are stamped with the archive.
+ *
+ * Elements implementing interfaces their placeholder can't stand for, any
+ * but GstChildProxy, are not cached.
+ * GST_PYTHON_PLUGIN_CACHE_DIR overrides the cache location, setting it empty
+ * disables the cache.
+ */
+
+#define GST_PYTHON_CACHE_GROUP "python-plugin-cache"
+#define GST_PYTHON_ABI PYTHON_VERSION PY_ABI_FLAGS
+
+/* the modules imported by each module while scanning, by name */
+static GHashTable *scan_imports = NULL;
+static PyObject *scan_builtin_import = NULL;
+
+/* Records that @importer imported @name and the packages above it */
+static void
+gst_python_scan_imports_add (const gchar * importer, const gchar * name)
+{
+  GHashTable *names;
+  gchar *prefix, *dot;
+
+  names = g_hash_table_lookup (scan_imports, importer);
+  if (names == NULL) {
+    names = g_hash_table_new_full (g_str_hash, g_str_equal, g_free, NULL);
+    g_hash_table_insert (scan_imports, g_strdup (importer), names);
+  }
+
+  prefix = g_strdup (name);
+  do {
+    g_hash_table_add (names, g_strdup (prefix));
+    dot = strrchr (prefix, '.');
+    if (dot)
+      *dot = '\0';
+  } while (dot);
+  g_free (prefix);
+}
+
+static void
+gst_python_scan_imports_add_module (const gchar * importer, PyObject * module)
+{
+  PyObject *name = PyObject_GetAttrString (module, "__name__");
+  const gchar *str;
+
+  if (name != NULL && PyArg_Parse (name, "s", &str))
+    gst_python_scan_imports_add (importer, str);
+  else
+    PyErr_Clear ();
+  Py_XDECREF (name);
+}
+
+/* The __import__() of the scans, calling the original one */
+static PyObject *
+gst_python_scan_import (PyObject * self, PyObject * args, PyObject * kwargs)
+{
+  static char *kwlist[] = { (char *) "name", (char *) "globals",
+    (char *) "locals", (char *) "fromlist", (char *) "level", NULL
+  };
+  PyObject *module, *name, *globals = NULL, *locals = NULL, *fromlist = NULL;
+  PyObject *importer;
+  const gchar *from, *str;
+  int level = 0;
+  Py_ssize_t i;
+
+  module = PyObject_Call (scan_builtin_import, args, kwargs);
+  if (module == NULL)
+    return NULL;
+
+  if (!PyArg_ParseTupleAndKeywords (args, kwargs, "U|OOOi:__import__", kwlist,
+          &name, &globals, &locals, &fromlist, &level)) {
+    PyErr_Clear ();
+    return module;
+  }
+
+  importer = globals && PyDict_Check (globals) ?
+      PyDict_GetItemString (globals, "__name__") : NULL;
+  if (importer == NULL || !PyArg_Parse (importer, "s", &from)) {
+    PyErr_Clear ();
+    return module;
+  }
+
+  if (fromlist == NULL || !PyObject_IsTrue (fromlist)) {
+    /* the top-level package is returned, the name is absolute */
+    if (PyArg_Parse (name, "s", &str))
+      gst_python_scan_imports_add (from, str);
+    PyErr_Clear ();
+    return module;
+  }
+
+  /* the module is the one named, the list can name its submodules */
+  gst_python_scan_imports_add_module (from, module);
+  for (i = 0; PySequence_Check (fromlist) && i < PySequence_Size (fromlist);
+      i++) {
+    PyObject *item = PySequence_GetItem (fromlist, i);
+    PyObject *attr = NULL;
+
+    if (item != NULL && PyUnicode_Check (item))
+      attr = PyObject_GetAttr (module, item);
+    if (attr != NULL && PyModule_Check (attr))
+      gst_python_scan_imports_add_module (from, attr);
+    Py_XDECREF (attr);
+    Py_XDECREF (item);
+    PyErr_Clear ();
+  }
+
+  return module;
+}
+
+static PyMethodDef gst_python_scan_import_def = {
+  "__import__", (PyCFunction) gst_python_scan_import,
+  METH_VARARGS | METH_KEYWORDS, NULL
+};
+
+static void
+gst_python_scan_imports_start (void)
+{
+  PyObject *builtins, *func;
+
+  scan_imports = g_hash_table_new_full (g_str_hash, g_str_equal, g_free,
+      (GDestroyNotify) g_hash_table_unref);
+
+  builtins = PyImport_ImportModule ("builtins");
+  scan_builtin_import = builtins ?
+      PyObject_GetAttrString (builtins, "__import__") : NULL;
+  func = PyCFunction_New (&gst_python_scan_import_def, NULL);
+  if (scan_builtin_import == NULL || func == NULL ||
+      PyObject_SetAttrString (builtins, "__import__", func) < 0) {
+    GST_WARNING ("Could not follow the imports, not caching the scan");
+    Py_CLEAR (scan_builtin_import);
+    PyErr_Clear ();
+  }
+  Py_XDECREF (func);
+  Py_XDECREF (builtins);
+}
+
+static void
+gst_python_scan_imports_stop (void)
+{
+  PyObject *builtins;
+
+  if (scan_builtin_import != NULL) {
+    builtins = PyImport_ImportModule ("builtins");
+    if (builtins == NULL ||
+        PyObject_SetAttrString (builtins, "__import__",
+            scan_builtin_import) < 0) {
+      GST_WARNING ("Could not restore __import__");
+      PyErr_Clear ();
+    }
+    Py_XDECREF (builtins);
+    Py_CLEAR (scan_builtin_import);
+  }
+
+  g_hash_table_unref (scan_imports);
+  scan_imports = NULL;
+}
+
+static gchar *
+gst_python_cache_get_stamp (const gchar * path)
+{
+  GStatBuf st;
+
+  if (g_stat (path, &st) != 0)
+    return NULL;
+
+  return g_strdup_printf ("%" G_GINT64_FORMAT " %" G_GINT64_FORMAT,
+      (gint64) st.st_mtime, (gint64) st.st_size);
+}
+
+/* Returns the files below the directory @root of the module @name, of its
+ * packages and of the modules they imported while scanning, or the bundle
+ * @root itself for the modules of a bundle */
+static GPtrArray *
+gst_python_cache_get_files (const gchar * name, const gchar * root)
+{
+  GPtrArray *files, *names;
+  GHashTable *seen;
+  PyObject *modules;
+  gchar *prefix, *dot;
+  guint i;
+
+  files = g_ptr_array_new_with_free_func (g_free);
+  if (g_file_test (root, G_FILE_TEST_IS_REGULAR)) {
+    g_ptr_array_add (files, g_strdup (root));
+    return files;
+  }
+
+  names = g_ptr_array_new_with_free_func (g_free);
+  prefix = g_strdup (name);
+  do {
+    g_ptr_array_add (names, g_strdup (prefix));
+    dot = strrchr (prefix, '.');
+    if (dot)
+      *dot = '\0';
+  } while (dot);
+  g_free (prefix);
+
+  /* the names stay alive until the end of the walk */
+  seen = g_hash_table_new (g_str_hash, g_str_equal);
+  modules = PyImport_GetModuleDict ();
+  for (i = 0; i < names->len; i++) {
+    const gchar *module_name = names->pdata[i];
+    PyObject *module, *file;
+    const gchar *filename;
+    GHashTable *imports;
+    GHashTableIter iter;
+    gpointer imported;
+
+    if (g_hash_table_contains (seen, module_name))
+      continue;
+    g_hash_table_add (seen, (gpointer) module_name);
+
+    module = PyDict_GetItemString (modules, module_name);
+    file = module ? PyObject_GetAttrString (module, "__file__") : NULL;
+    if (file == NULL || !PyArg_Parse (file, "s", &filename) ||
+        !g_str_has_prefix (filename, root) ||
+        filename[strlen (root)] != G_DIR_SEPARATOR) {
+      /* not a module of the plugin directory */
+      PyErr_Clear ();
+      Py_XDECREF (file);
+      continue;
+    }
+    g_ptr_array_add (files, g_strdup (filename));
+    Py_DECREF (file);
+
+    imports = scan_imports ? g_hash_table_lookup (scan_imports,
+        module_name) : NULL;
+    if (imports == NULL)
+      continue;
+
+    g_hash_table_iter_init (&iter, imports);
+    while (g_hash_table_iter_next (&iter, &imported, NULL))
+      g_ptr_array_add (names, g_strdup (imported));
+  }
+  g_hash_table_unref (seen);
+  g_ptr_array_unref (names);
+
+  return files;
+}
+
+static gchar *
+gst_python_cache_get_filename (const gchar * path)
+{
+  const gchar *cache_dir;
+  gchar *checksum, *basename, *filename;
+
+  cache_dir = g_getenv ("GST_PYTHON_PLUGIN_CACHE_DIR");
+  if (cache_dir != NULL && *cache_dir == '\0')
+    return NULL;
+
+  checksum = g_compute_checksum_for_string (G_CHECKSUM_SHA1, path, -1);
+  basename = g_strconcat (checksum, GST_PYTHON_MANIFEST_SUFFIX, NULL);
+  if (cache_dir != NULL)
+    filename = g_build_filename (cache_dir, basename, NULL);
+  else
+    filename = g_build_filename (g_get_user_cache_dir (),
+        "gstreamer-" GST_API_VERSION, "python", basename, NULL);
+  g_free (basename);
+  g_free (checksum);
+
+  return filename;
+}
+
+static gboolean
+gst_python_cache_is_valid (GKeyFile * cache, const gchar * path,
+    const gchar * module)
+{
+  gchar *value, **files, **stamps;
+  gsize n_files = 0, n_stamps = 0, i;
+  gboolean valid;
+
+  value = g_key_file_get_string (cache, GST_PYTHON_CACHE_GROUP, "path", NULL);
+  valid = g_strcmp0 (value, path) == 0;
+  g_free (value);
+
+  value = g_key_file_get_string (cache, GST_PYTHON_CACHE_GROUP, "module",
+      NULL);
+  valid &= g_strcmp0 (value, module) == 0;
+  g_free (value);
+
+  value = g_key_file_get_string (cache, GST_PYTHON_CACHE_GROUP, "abi", NULL);
+  valid &= g_strcmp0 (value, GST_PYTHON_ABI) == 0;
+  g_free (value);
+
+  files = g_key_file_get_string_list (cache, GST_PYTHON_CACHE_GROUP, "files",
+      &n_files, NULL);
+  stamps = g_key_file_get_string_list (cache, GST_PYTHON_CACHE_GROUP,
+      "stamps", &n_stamps, NULL);
+  valid &= files != NULL && n_files == n_stamps;
+
+  for (i = 0; valid && i < n_files; i++) {
+    gchar *stamp = gst_python_cache_get_stamp (files[i]);
+
+    if (g_strcmp0 (stamp, stamps[i]) != 0) {
+      GST_DEBUG ("%s changed since the scan of %s", files[i], path);
+      valid = FALSE;
+    }
+    g_free (stamp);
+  }
+  g_strfreev (stamps);
+  g_strfreev (files);
+
+  return valid;
+}
+
+/* Registers what the cache has for the module @path if it is up to date */
+static gboolean
+gst_python_cache_load (GstPlugin * plugin, const gchar * path,
+    const gchar * module, GstPythonModuleRecord * record)
+{
+  GKeyFile *cache;
+  gchar *filename;
+  gchar **factories;
+  gboolean ret = FALSE;
+
+  filename = gst_python_cache_get_filename (path);
+  if (filename == NULL)
+    return FALSE;
+
+  cache = g_key_file_new ();
+  if (!g_key_file_load_from_file (cache, filename, G_KEY_FILE_NONE, NULL))
+    goto done;
+
+  if (!gst_python_cache_is_valid (cache, path, module)) {
+    GST_DEBUG ("Cache for %s is outdated", path);
+    goto done;
+  }
+
+  factories = g_key_file_get_string_list (cache, GST_PYTHON_CACHE_GROUP,
+      "factories", NULL, NULL);
+  if (factories != NULL) {
+    ret = gst_python_manifest_register (plugin, cache, module, factories,
+        record);
+    g_strfreev (factories);
+  }
+
+done:
+  g_key_file_free (cache);
+  g_free (filename);
+
+  return ret;
+}
+
+/* Writes @pspec in the [factory::property] group of the @cache, returns FALSE
+ * if its type of parameter can't be described */
+static gboolean
+gst_python_cache_add_property (GKeyFile * cache, const gchar * facname,
+    GParamSpec * pspec)
+{
+  GParamSpec *target = g_param_spec_get_redirect_target (pspec);
+  GPtrArray *flags;
+  gchar *group;
+  gboolean ret = TRUE;
+  guint i;
+
+  if (target != NULL)
+    pspec = target;
+
+  group = g_strdup_printf ("%s::%s", facname, pspec->name);
+  g_key_file_set_string (cache, group, "type",
+      g_type_name (G_PARAM_SPEC_VALUE_TYPE (pspec)));
+  g_key_file_set_string (cache, group, "nick", g_param_spec_get_nick (pspec));
+  if (g_param_spec_get_blurb (pspec))
+    g_key_file_set_string (cache, group, "blurb",
+        g_param_spec_get_blurb (pspec));
+
+  flags = g_ptr_array_new ();
+  for (i = 0; i < G_N_ELEMENTS (gst_python_property_flags); i++) {
+    GParamFlags flag = gst_python_property_flags[i].flag;
+
+    /* set once the element exists */
+    if (flag == G_PARAM_WRITABLE && (pspec->flags & G_PARAM_CONSTRUCT_ONLY))
+      continue;
+    if (pspec->flags & flag)
+      g_ptr_array_add (flags, (gpointer) gst_python_property_flags[i].name);
+  }
+  g_key_file_set_string_list (cache, group, "flags",
+      (const gchar * const *) flags->pdata, flags->len);
+  g_ptr_array_unref (flags);
+
+  if (G_IS_PARAM_SPEC_BOOLEAN (pspec)) {
+    g_key_file_set_boolean (cache, group, "default",
+        G_PARAM_SPEC_BOOLEAN (pspec)->default_value);
+  } else if (G_IS_PARAM_SPEC_INT (pspec)) {
+    GParamSpecInt *spec = G_PARAM_SPEC_INT (pspec);
+
+    g_key_file_set_int64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_int64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_int64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_UINT (pspec)) {
+    GParamSpecUInt *spec = G_PARAM_SPEC_UINT (pspec);
+
+    g_key_file_set_uint64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_uint64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_uint64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_LONG (pspec)) {
+    GParamSpecLong *spec = G_PARAM_SPEC_LONG (pspec);
+
+    g_key_file_set_int64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_int64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_int64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_ULONG (pspec)) {
+    GParamSpecULong *spec = G_PARAM_SPEC_ULONG (pspec);
+
+    g_key_file_set_uint64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_uint64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_uint64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_INT64 (pspec)) {
+    GParamSpecInt64 *spec = G_PARAM_SPEC_INT64 (pspec);
+
+    g_key_file_set_int64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_int64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_int64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_UINT64 (pspec)) {
+    GParamSpecUInt64 *spec = G_PARAM_SPEC_UINT64 (pspec);
+
+    g_key_file_set_uint64 (cache, group, "minimum", spec->minimum);
+    g_key_file_set_uint64 (cache, group, "maximum", spec->maximum);
+    g_key_file_set_uint64 (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_FLOAT (pspec)) {
+    GParamSpecFloat *spec = G_PARAM_SPEC_FLOAT (pspec);
+
+    g_key_file_set_double (cache, group, "minimum", spec->minimum);
+    g_key_file_set_double (cache, group, "maximum", spec->maximum);
+    g_key_file_set_double (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_DOUBLE (pspec)) {
+    GParamSpecDouble *spec = G_PARAM_SPEC_DOUBLE (pspec);
+
+    g_key_file_set_double (cache, group, "minimum", spec->minimum);
+    g_key_file_set_double (cache, group, "maximum", spec->maximum);
+    g_key_file_set_double (cache, group, "default", spec->default_value);
+  } else if (G_IS_PARAM_SPEC_STRING (pspec)) {
+    if (G_PARAM_SPEC_STRING (pspec)->default_value)
+      g_key_file_set_string (cache, group, "default",
+          G_PARAM_SPEC_STRING (pspec)->default_value);
+  } else if (G_IS_PARAM_SPEC_ENUM (pspec)) {
+    GParamSpecEnum *spec = G_PARAM_SPEC_ENUM (pspec);
+    GEnumValue *value = g_enum_get_value (spec->enum_class,
+        spec->default_value);
+
+    if (value)
+      g_key_file_set_string (cache, group, "default", value->value_nick);
+  } else if (G_IS_PARAM_SPEC_FLAGS (pspec)) {
+    g_key_file_set_uint64 (cache, group, "default",
+        G_PARAM_SPEC_FLAGS (pspec)->default_value);
+  } else if (!G_IS_PARAM_SPEC_BOXED (pspec) && !G_IS_PARAM_SPEC_OBJECT (pspec)) {
+    ret = FALSE;
+  }
+  g_free (group);
+
+  return ret;
+}
+
+/* Returns FALSE if a placeholder can't stand for @type */
+static gboolean
+gst_python_cache_add_factory (GKeyFile * cache, GType type,
+    const gchar * facname, guint rank)
+{
+  GstElementClass *klass;
+  GList *templates, *l;
+  GPtrArray *names;
+  GParamSpec **pspecs;
+  GType *interfaces;
+  guint n_pspecs, n_interfaces;
+  const gchar *keys[] = {
+    GST_ELEMENT_METADATA_LONGNAME, GST_ELEMENT_METADATA_KLASS,
+    GST_ELEMENT_METADATA_DESCRIPTION, GST_ELEMENT_METADATA_AUTHOR
+  };
+  gboolean ret = TRUE;
+  gint i;
+
+  klass = g_type_class_ref (type);
+
+  g_key_file_set_integer (cache, facname, "rank", rank);
+  for (i = 0; i < G_N_ELEMENTS (keys); i++) {
+    const gchar *value = gst_element_class_get_metadata (klass, keys[i]);
+
+    if (value)
+      g_key_file_set_string (cache, facname, keys[i], value);
+  }
+
+  names = g_ptr_array_new_with_free_func (g_free);
+  templates = gst_element_class_get_pad_template_list (klass);
+  for (l = templates; l; l = l->next) {
+    GstPadTemplate *templ = l->data;
+    gchar *group, *caps;
+
+    group = g_strdup_printf ("%s:%s", facname,
+        GST_PAD_TEMPLATE_NAME_TEMPLATE (templ));
+    g_key_file_set_string (cache, group, "direction",
+        GST_PAD_TEMPLATE_DIRECTION (templ) == GST_PAD_SRC ? "src" : "sink");
+    g_key_file_set_string (cache, group, "presence",
+        GST_PAD_TEMPLATE_PRESENCE (templ) == GST_PAD_REQUEST ? "request" :
+        GST_PAD_TEMPLATE_PRESENCE (templ) == GST_PAD_SOMETIMES ? "sometimes" :
+        "always");
+    caps = gst_caps_to_string (GST_PAD_TEMPLATE_CAPS (templ));
+    g_key_file_set_string (cache, group, "caps", caps);
+    g_free (caps);
+    g_free (group);
+
+    g_ptr_array_add (names, g_strdup (GST_PAD_TEMPLATE_NAME_TEMPLATE (templ)));
+  }
+  g_key_file_set_string_list (cache, facname, "pad-templates",
+      (const gchar * const *) names->pdata, names->len);
+  g_ptr_array_set_size (names, 0);
+
+  /* the ones of GstObject are the placeholder's own */
+  pspecs = g_object_class_list_properties (G_OBJECT_CLASS (klass), &n_pspecs);
+  for (i = 0; ret && i < n_pspecs; i++) {
+    if (g_type_is_a (GST_TYPE_ELEMENT, pspecs[i]->owner_type))
+      continue;
+
+    ret = gst_python_cache_add_property (cache, facname, pspecs[i]);
+    g_ptr_array_add (names, g_strdup (pspecs[i]->name));
+  }
+  g_free (pspecs);
+  if (names->len > 0)
+    g_key_file_set_string_list (cache, facname, "properties",
+        (const gchar * const *) names->pdata, names->len);
+  g_ptr_array_set_size (names, 0);
+
+  interfaces = g_type_interfaces (type, &n_interfaces);
+  for (i = 0; ret && i < n_interfaces; i++) {
+    ret = g_type_is_a (GST_TYPE_BIN, interfaces[i]);
+    g_ptr_array_add (names, g_strdup (g_type_name (interfaces[i])));
+  }
+  g_free (interfaces);
+  if (names->len > 0)
+    g_key_file_set_string_list (cache, facname, "interfaces",
+        (const gchar * const *) names->pdata, names->len);
+  g_ptr_array_unref (names);
+
+  g_type_class_unref (klass);
+
+  return ret;
+}
+
+/* Remembers the @factories the module @name loaded from @path registers,
+ * which can be none */
+static void
+gst_python_cache_save (const gchar * path, const gchar * module,
+    const gchar * root, GList * factories)
+{
+  GKeyFile *cache;
+  GError *error = NULL;
+  gchar *filename, *dirname;
+  GPtrArray *names, *files, *stamps;
+  GList *l;
+  guint i;
+
+  /* the imports were not followed */
+  if (scan_builtin_import == NULL)
+    return;
+
+  filename = gst_python_cache_get_filename (path);
+  if (filename == NULL)
+    return;
+
+  cache = g_key_file_new ();
+  g_key_file_set_string (cache, GST_PYTHON_CACHE_GROUP, "path", path);
+  g_key_file_set_string (cache, GST_PYTHON_CACHE_GROUP, "module", module);
+  g_key_file_set_string (cache, GST_PYTHON_CACHE_GROUP, "abi",
+      GST_PYTHON_ABI);
+
+  files = gst_python_cache_get_files (module, root);
+  stamps = g_ptr_array_new_with_free_func (g_free);
+  for (i = 0; i < files->len; i++) {
+    gchar *stamp = gst_python_cache_get_stamp (files->pdata[i]);
+
+    if (stamp == NULL) {
+      GST_DEBUG ("Not caching %s, %s can't be stamped", module,
+          (gchar *) files->pdata[i]);
+      goto done;
+    }
+    g_ptr_array_add (stamps, stamp);
+  }
+  g_key_file_set_string_list (cache, GST_PYTHON_CACHE_GROUP, "files",
+      (const gchar * const *) files->pdata, files->len);
+  g_key_file_set_string_list (cache, GST_PYTHON_CACHE_GROUP, "stamps",
+      (const gchar * const *) stamps->pdata, stamps->len);
+
+  names = g_ptr_array_new ();
+  for (l = factories; l; l = l->next) {
+    GstPythonFactory *factory = l->data;
+
+    if (!gst_python_cache_add_factory (cache, factory->type, factory->name,
+            factory->rank)) {
+      GST_DEBUG ("Not caching %s, the properties or interfaces of %s can't "
+          "be described", module, factory->name);
+      g_ptr_array_unref (names);
+      goto done;
+    }
+    g_ptr_array_add (names, factory->name);
+  }
+  g_key_file_set_string_list (cache, GST_PYTHON_CACHE_GROUP, "factories",
+      (const gchar * const *) names->pdata, names->len);
+  g_ptr_array_unref (names);
+
+  dirname = g_path_get_dirname (filename);
+  if (g_mkdir_with_parents (dirname, 0755) != 0 ||
+      !g_key_file_save_to_file (cache, filename, &error)) {
+    GST_WARNING ("Could not write the cache for %s in %s: %s", path, filename,
+        error ? error->message : g_strerror (errno));
+    g_clear_error (&error);
+  }
+  g_free (dirname);
+
+done:
+  g_ptr_array_unref (stamps);
+  g_ptr_array_unref (files);
+  g_key_file_free (cache);
+  g_free (filename);
+}
+
+/* Loads the module @name from the file @path, which is below the plugin
+ * directory or in the bundle @root, and adds the outcome to the load
+ * report */
 static gboolean
-gst_python_plugin_load_file (GstPlugin * plugin, const char *name)
+gst_python_plugin_load_file (GstPlugin * plugin, const gchar * path,
+    const gchar * root, const gchar * name)
 {
+  GstPythonModuleRecord *record = gst_python_module_record_new (name);
   PyObject *main_module, *main_locals;
-  PyObject *elementfactory;
-  PyObject *module;
-  const gchar *facname;
-  guint rank;
-  PyObject *class;
+  PyObject *module, *fromlist;
+  gboolean has_factory;
+  GList *factories, *l;
+  gboolean ret = TRUE;
+
+  if (gst_python_cache_load (plugin, path, name, record)) {
+    GST_DEBUG ("registered plugin %s from the cache", name);
+    gst_python_module_record_add (record, "cache");
+    return TRUE;
+  }
 
   GST_DEBUG ("loading plugin %s", name);
 
   main_module = PyImport_AddModule ("__main__");
   if (main_module == NULL) {
     GST_WARNING ("Could not get __main__, ignoring plugin %s", name);
-    PyErr_Print ();
-    PyErr_Clear ();
+    record->error = gst_python_error_print ();
+    gst_python_module_record_add (record, "import");
     return FALSE;
   }
 
   main_locals = PyModule_GetDict (main_module);
+  /* with a non-empty fromlist the module of a package is returned rather
+   * than the package itself */
+  fromlist = strchr (name, '.') ? Py_BuildValue ("(s)", "__name__") : NULL;
   module =
-      PyImport_ImportModuleEx ((char *) name, main_locals, main_locals, NULL);
+      PyImport_ImportModuleEx ((char *) name, main_locals, main_locals,
+      fromlist);
+  Py_XDECREF (fromlist);
   if (!module) {
     GST_DEBUG ("Could not load module, ignoring plugin %s", name);
-    PyErr_Print ();
-    PyErr_Clear ();
+    record->error = gst_python_error_print ();
+    gst_python_module_record_add (record, "import");
     return FALSE;
   }
 
-  /* Get __gstelementfactory__ from file */
-  elementfactory = PyObject_GetAttrString (module, "__gstelementfactory__");
-  if (!elementfactory) {
-    GST_DEBUG ("python file doesn't contain __gstelementfactory__");
-    PyErr_Clear ();
-    return FALSE;
+  has_factory = PyObject_HasAttrString (module, "__gstelementfactory__");
+  factories = gst_python_module_get_factories (module, name);
+  Py_DECREF (module);
+
+  if (factories != NULL || !has_factory)
+    gst_python_cache_save (path, name, root, factories);
+
+  if (factories == NULL)
+    ret = FALSE;
+
+  for (l = factories; l; l = l->next) {
+    GstPythonFactory *factory = l->data;
+
+    if (gst_element_register (plugin, factory->name, factory->rank,
+            factory->type))
+      g_ptr_array_add (record->factories, g_strdup (factory->name));
+    else
+      ret = FALSE;
   }
+  g_list_free_full (factories, (GDestroyNotify) gst_python_factory_free);
+  gst_python_module_record_add (record, "import");
 
-  /* parse tuple : name, rank, gst.ElementClass */
-  if (!PyArg_ParseTuple (elementfactory, "sIO", &facname, &rank, &class)) {
-    GST_WARNING ("__gstelementfactory__ isn't correctly formatted");
-    PyErr_Print ();
+  return ret;
+}
+
+/* Puts @path first in sys.path. The list is looked up as a strong
+ * reference since the sys module can be changed from other threads when
+ * python runs without a GIL. */
+static void
+gst_python_sys_path_prepend (const gchar * path)
+{
+  PyObject *sys, *sys_path, *item;
+
+  sys = PyImport_ImportModule ("sys");
+  sys_path = sys ? PyObject_GetAttrString (sys, "path") : NULL;
+  item = PyUnicode_FromString (path);
+  if (sys_path == NULL || item == NULL
+      || PyList_Insert (sys_path, 0, item) < 0) {
+    GST_WARNING ("Could not add %s to sys.path", path);
     PyErr_Clear ();
-    Py_DECREF (elementfactory);
-    return FALSE;
   }
+  Py_XDECREF (item);
+  Py_XDECREF (sys_path);
+  Py_XDECREF (sys);
+}
 
-  if (!PyObject_IsSubclass (class, (PyObject *) & PyGObject_Type)) {
-    GST_WARNING ("the class provided isn't a subclass of GObject.Object");
-    PyErr_Print ();
+/* Bundles
+ *
+ * Zip archives (.zip or .pyz) in the plugin directories are added to
+ * sys.path and their modules loaded like the ones of a plugin directory,
+ * which spares a lookup per file on slow file systems. Their manifests are
+ * read from the archive and the scan cache is keyed by the archive. */
+
+/* Returns the module name of the archive entry @entry without its suffix,
+ * NULL if it is not loaded: the modules of the archive are loaded like the
+ * ones of a plugin directory, using the @entries of the archive to find the
+ * packages */
+static gchar *
+gst_python_bundle_module_name (const gchar * entry, GHashTable * entries)
+{
+  GString *package;
+  gchar **parts;
+  gchar *name = NULL;
+  guint i, n_parts;
+
+  parts = g_strsplit (entry, "/", -1);
+  n_parts = g_strv_length (parts);
+
+  for (i = 0; i < n_parts; i++) {
+    gboolean last = i == n_parts - 1;
+
+    if (parts[i][0] == '\0' || (parts[i][0] == '_' && !last))
+      goto done;
+  }
+
+  /* the directories must be packages */
+  package = g_string_new (NULL);
+  for (i = 0; i + 1 < n_parts; i++) {
+    gchar *init;
+    gboolean is_package;
+
+    g_string_append (package, parts[i]);
+    g_string_append_c (package, '/');
+    init = g_strconcat (package->str, "__init__.py", NULL);
+    is_package = g_hash_table_contains (entries, init);
+    g_free (init);
+
+    if (!is_package) {
+      g_string_free (package, TRUE);
+      goto done;
+    }
+  }
+  g_string_free (package, TRUE);
+
+  if (n_parts > 1 && strcmp (parts[n_parts - 1], "__init__") == 0) {
+    g_free (parts[n_parts - 1]);
+    parts[n_parts - 1] = NULL;
+  } else if (n_parts > 1 && parts[n_parts - 1][0] == '_') {
+    goto done;
+  }
+
+  name = g_strjoinv (".", parts);
+
+done:
+  g_strfreev (parts);
+
+  return name;
+}
+
+static gboolean
+gst_python_bundle_load_manifest (GstPlugin * plugin, PyObject * archive,
+    const gchar * entry, const gchar * name, GstPythonModuleRecord * record)
+{
+  GKeyFile *manifest;
+  GError *error = NULL;
+  PyObject *data;
+  gboolean ret = FALSE;
+
+  data = PyObject_CallMethod (archive, (char *) "read", (char *) "s", entry);
+  if (data == NULL || !PyBytes_Check (data)) {
+    GST_WARNING ("Could not read manifest %s", entry);
     PyErr_Clear ();
-    Py_DECREF (elementfactory);
-    Py_DECREF (class);
+    Py_XDECREF (data);
     return FALSE;
   }
 
-  if (!g_type_is_a (pyg_type_from_object (class), GST_TYPE_ELEMENT)) {
-    GST_WARNING ("the class provided isn't a subclass of Gst.Element");
-    PyErr_Print ();
-    PyErr_Clear ();
-    Py_DECREF (elementfactory);
-    Py_DECREF (class);
+  manifest = g_key_file_new ();
+  if (g_key_file_load_from_data (manifest, PyBytes_AS_STRING (data),
+          PyBytes_GET_SIZE (data), G_KEY_FILE_NONE, &error)) {
+    ret = gst_python_manifest_register (plugin, manifest, name, NULL, record);
+  } else {
+    GST_WARNING ("Could not load manifest %s: %s", entry, error->message);
+    g_error_free (error);
+  }
+  g_key_file_free (manifest);
+  Py_DECREF (data);
+
+  return ret;
+}
+
+static gboolean
+gst_python_load_bundle (GstPlugin * plugin, const gchar * path)
+{
+  PyObject *zipfile, *archive, *entries, *ret;
+  GHashTable *names, *declared;
+  Py_ssize_t i, n_entries;
+
+  GST_DEBUG ("loading bundle %s", path);
+
+  if (!g_file_test (path, G_FILE_TEST_IS_REGULAR))
     return FALSE;
+
+  zipfile = PyImport_ImportModule ("zipfile");
+  if (zipfile == NULL)
+    goto error;
+
+  archive = PyObject_CallMethod (zipfile, (char *) "ZipFile", (char *) "s",
+      path);
+  Py_DECREF (zipfile);
+  if (archive == NULL)
+    goto error;
+
+  entries = PyObject_CallMethod (archive, (char *) "namelist", NULL);
+  if (entries == NULL || !PyList_Check (entries)) {
+    Py_XDECREF (entries);
+    Py_DECREF (archive);
+    goto error;
   }
 
-  GST_INFO ("Valid plugin");
-  Py_DECREF (elementfactory);
+  gst_python_sys_path_prepend (path);
+
+  names = g_hash_table_new_full (g_str_hash, g_str_equal, g_free, NULL);
+  n_entries = PyList_GET_SIZE (entries);
+  for (i = 0; i < n_entries; i++) {
+    const gchar *entry;
+
+    if (PyArg_Parse (PyList_GET_ITEM (entries, i), "s", &entry))
+      g_hash_table_add (names, g_strdup (entry));
+    else
+      PyErr_Clear ();
+  }
+
+  /* modules with a manifest are not imported */
+  declared = g_hash_table_new_full (g_str_hash, g_str_equal, g_free, NULL);
+  for (i = 0; i < n_entries; i++) {
+    const gchar *entry;
+    gchar *stem, *name;
+    GstPythonModuleRecord *record;
+
+    if (!PyArg_Parse (PyList_GET_ITEM (entries, i), "s", &entry)) {
+      PyErr_Clear ();
+      continue;
+    }
+
+    if (!g_str_has_suffix (entry, GST_PYTHON_MANIFEST_SUFFIX))
+      continue;
+
+    stem = g_strndup (entry,
+        strlen (entry) - strlen (GST_PYTHON_MANIFEST_SUFFIX));
+    name = gst_python_bundle_module_name (stem, names);
+    g_free (stem);
+
+    if (name == NULL)
+      continue;
+
+    record = gst_python_module_record_new (name);
+    if (gst_python_bundle_load_manifest (plugin, archive, entry, name, record)) {
+      gst_python_module_record_add (record, "manifest");
+      g_hash_table_add (declared, name);
+    } else {
+      gst_python_module_record_free (record);
+      g_free (name);
+    }
+  }
+
+  for (i = 0; i < n_entries; i++) {
+    const gchar *entry;
+    gchar *stem, *name, *filename;
+
+    if (!PyArg_Parse (PyList_GET_ITEM (entries, i), "s", &entry)) {
+      PyErr_Clear ();
+      continue;
+    }
+
+    if (!g_str_has_suffix (entry, ".py"))
+      continue;
+
+    stem = g_strndup (entry, strlen (entry) - 3);
+    name = gst_python_bundle_module_name (stem, names);
+    g_free (stem);
+
+    if (name != NULL && !g_hash_table_contains (declared, name)) {
+      /* cached by archive and entry, and invalidated with the archive */
+      filename = g_build_filename (path, entry, NULL);
+      gst_python_plugin_load_file (plugin, filename, path, name);
+      g_free (filename);
+    }
+    g_free (name);
+  }
+
+  g_hash_table_unref (declared);
+  g_hash_table_unref (names);
+  Py_DECREF (entries);
+
+  ret = PyObject_CallMethod (archive, (char *) "close", NULL);
+  Py_XDECREF (ret);
+  Py_DECREF (archive);
+  PyErr_Clear ();
 
-  return gst_element_register (plugin, facname, rank,
-      pyg_type_from_object (class));
+  return TRUE;
+
+error:
+  GST_WARNING ("Could not open python bundle %s", path);
+  PyErr_Print ();
+  PyErr_Clear ();
+
+  return FALSE;
+}
+
+static gchar *
+gst_python_module_name (const gchar * package, const gchar * basename)
+{
+  if (package == NULL)
+    return g_strdup (basename);
+  if (strcmp (basename, "__init__") == 0)
+    return g_strdup (package);
+  return g_strdup_printf ("%s.%s", package, basename);
 }
 
+/* Loads the modules of the directory @path, which is the python package
+ * @package, or a plugin directory if NULL, below the plugin directory
+ * @root. All the modules of a plugin directory are loaded.
+ * Sub-directories having an __init__.py are loaded as packages, the modules
+ * and packages of a package whose name starts with an underscore are
+ * considered private helpers and are only imported by the modules using
+ * them. */
 static gboolean
-gst_python_load_directory (GstPlugin * plugin, gchar * path)
+gst_python_load_package (GstPlugin * plugin, const gchar * path,
+    const gchar * package, const gchar * root)
 {
   GDir *dir;
   const gchar *file;
   GError *error = NULL;
+  GHashTable *declared;
   gboolean ret = TRUE;
 
   dir = g_dir_open (path, 0, &error);
@@ -122,26 +2189,90 @@ gst_python_load_directory (GstPlugin * plugin, gchar * path)
     g_error_free (error);
     return FALSE;
   }
+
+  /* modules with a manifest are not imported */
+  declared = g_hash_table_new_full (g_str_hash, g_str_equal, g_free, NULL);
   while ((file = g_dir_read_name (dir))) {
-    /* FIXME : go down in subdirectories */
-    if (g_str_has_suffix (file, ".py")) {
-      gsize len = strlen (file) - 3;
-      gchar *name = g_strndup (file, len);
-      ret &= gst_python_plugin_load_file (plugin, name);
+    if (g_str_has_suffix (file, GST_PYTHON_MANIFEST_SUFFIX)) {
+      gsize len = strlen (file) - strlen (GST_PYTHON_MANIFEST_SUFFIX);
+      gchar *basename = g_strndup (file, len);
+      gchar *filename = g_build_filename (path, file, NULL);
+      gchar *name = gst_python_module_name (package, basename);
+      GstPythonModuleRecord *record = gst_python_module_record_new (name);
+
+      if (gst_python_plugin_load_manifest (plugin, filename, name, record)) {
+        gst_python_module_record_add (record, "manifest");
+        g_hash_table_add (declared, basename);
+      } else {
+        gst_python_module_record_free (record);
+        g_free (basename);
+      }
       g_free (name);
+      g_free (filename);
+    }
+  }
+
+  g_dir_rewind (dir);
+  while ((file = g_dir_read_name (dir))) {
+    gchar *filename;
+
+    if (file[0] == '.')
+      continue;
+
+    filename = g_build_filename (path, file, NULL);
+    if (package == NULL && (g_str_has_suffix (file, ".zip") ||
+            g_str_has_suffix (file, ".pyz"))) {
+      ret &= gst_python_load_bundle (plugin, filename);
+    } else if (g_str_has_suffix (file, ".py")) {
+      gsize len = strlen (file) - 3;
+      gchar *basename = g_strndup (file, len);
+
+      if ((package == NULL || basename[0] != '_' ||
+              strcmp (basename, "__init__") == 0) &&
+          !g_hash_table_contains (declared, basename)) {
+        gchar *name = gst_python_module_name (package, basename);
+
+        ret &= gst_python_plugin_load_file (plugin, filename, root, name);
+        g_free (name);
+      }
+      g_free (basename);
+    } else if (file[0] != '_' && g_file_test (filename, G_FILE_TEST_IS_DIR)) {
+      gchar *init = g_build_filename (filename, "__init__.py", NULL);
+
+      /* directories without __init__.py, which python 3 would import as
+       * namespace packages, are data or helper directories */
+      if (g_file_test (init, G_FILE_TEST_EXISTS)) {
+        gchar *name = gst_python_module_name (package, file);
+
+        ret &= gst_python_load_package (plugin, filename, name, root);
+        g_free (name);
+      }
+      g_free (init);
     }
+    g_free (filename);
   }
+
+  g_hash_table_unref (declared);
+  g_dir_close (dir);
+
+  return ret;
+}
+
+static gboolean
+gst_python_load_directory (GstPlugin * plugin, gchar * path)
+{
+  gst_python_load_package (plugin, path, NULL, path);
+
   return TRUE;
 }
 
 static gboolean
 gst_python_plugin_load (GstPlugin * plugin)
 {
-  PyObject *sys_path;
   const gchar *plugin_path;
   gboolean ret = TRUE;
 
-  sys_path = PySys_GetObject ("path");
+  gst_python_scan_imports_start ();
 
   /* Mimic the order in which the registry is checked in core */
 
@@ -155,7 +2286,7 @@ gst_python_plugin_load (GstPlugin * plugin)
     list = g_strsplit (plugin_path, G_SEARCHPATH_SEPARATOR_S, 0);
     for (i = 0; list[i]; i++) {
       gchar *sysdir = g_build_filename (list[i], "python", NULL);
-      PyList_Insert (sys_path, 0, PyUnicode_FromString (sysdir));
+      gst_python_sys_path_prepend (sysdir);
       gst_python_load_directory (plugin, sysdir);
       g_free (sysdir);
     }
@@ -175,12 +2306,12 @@ gst_python_plugin_load (GstPlugin * plugin)
      * system-installed ones */
     home_plugins = g_build_filename (g_get_home_dir (),
         ".gstreamer-" GST_API_VERSION, "plugins", "python", NULL);
-    PyList_Insert (sys_path, 0, PyUnicode_FromString (home_plugins));
+    gst_python_sys_path_prepend (home_plugins);
     gst_python_load_directory (plugin, home_plugins);
     g_free (home_plugins);
 
     /* add the main (installed) library path */
-    PyList_Insert (sys_path, 0, PyUnicode_FromString (PLUGINDIR "/python"));
+    gst_python_sys_path_prepend (PLUGINDIR "/python");
     gst_python_load_directory (plugin, PLUGINDIR "/python");
   } else {
     gchar **list;
@@ -194,17 +2325,31 @@ gst_python_plugin_load (GstPlugin * plugin)
 
       sysdir = g_build_filename (list[i], "python", NULL);
 
-      PyList_Insert (sys_path, 0, PyUnicode_FromString (sysdir));
+      gst_python_sys_path_prepend (sysdir);
       gst_python_load_directory (plugin, sysdir);
       g_free (sysdir);
     }
     g_strfreev (list);
   }
 
+  gst_python_scan_imports_stop ();
+  gst_python_module_records_report ();
 
   return ret;
 }
 
+/* Sub-interpreters
+ *
+ * All the python elements of a process share the main interpreter and its
+ * GIL, including the ones of pipeline branches running in different
+ * streaming threads. Running plugins in sub-interpreters having their own
+ * GIL (python >= 3.12) needs every extension they import to support
+ * multi-phase initialization and per-interpreter state, which is not the
+ * case of gi._gi: pygobject keeps its type wrappers and closures in
+ * process-wide globals. Elements doing
+ * heavy work in python can subclass GstBase.ProcessPoolTransform to process
+ * buffers in worker processes instead. */
+
 static gboolean
 plugin_init (GstPlugin * plugin)
 {
@@ -222,7 +2367,7 @@ plugin_init (GstPlugin * plugin)
       "/plugins/python:GST_PLUGIN_SYSTEM_PATH/python:GST_PLUGIN_PATH/python",
       PLUGINDIR "/python:HOME/.gstreamer-" GST_API_VERSION "/plugins/python:"
       "GST_PLUGIN_SYSTEM_PATH/python:GST_PLUGIN_PATH/python", NULL,
-      GST_PLUGIN_DEPENDENCY_FLAG_NONE);
+      GST_PLUGIN_DEPENDENCY_FLAG_RECURSE);
 
   GST_LOG ("Checking to see if libpython is already loaded");
   if (g_module_symbol (g_module_open (NULL, G_MODULE_BIND_LOCAL),
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- Mode: Python -*-
+# vi:si:et:sw=4:sts=4:ts=4
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+
+"""Measure how long `from gi.repository import Gst` takes.
+
+Each sample runs the import in a fresh interpreter, using the overrides from
+this tree, and only times the import itself, not the interpreter startup.
+
+    python3 benchmark_import.py [--runs N] [--init]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+SNIPPET = """
+import time
+import overrides_hack
+start = time.perf_counter()
+from gi.repository import Gst
+%s
+print(time.perf_counter() - start)
+"""
+
+
+def run_once(init):
+    snippet = SNIPPET % ("Gst.init(None)" if init else "")
+    output = subprocess.check_output(
+        [sys.executable, "-c", snippet],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--init", action="store_true",
+                        help="also time Gst.init()")
+    args = parser.parse_args()
+
+    samples = sorted(run_once(args.init) for i in range(args.runs))
+    print("runs: %d  min: %.2f ms  median: %.2f ms  max: %.2f ms" % (
+        len(samples), samples[0] * 1000, samples[len(samples) // 2] * 1000,
+        samples[-1] * 1000))
+
+
+if __name__ == "__main__":
+    main()
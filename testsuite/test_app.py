@@ -0,0 +1,143 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+import gi
+gi.require_version('GstApp', '1.0')
+
+from gi.repository import Gst, GstApp
+Gst.init(None)
+
+HAVE_APP = Gst.ElementFactory.find("appsink") is not None
+
+
+@unittest.skipIf(not HAVE_APP, "the app plugin is not available")
+class TestAppSinkStream(TestCase):
+    def setUp(self):
+        self.pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=10 sizetype=fixed sizemax=4 filltype=zero ! "
+            "appsink name=sink")
+        self.stream = GstApp.AppSinkStream(
+            self.pipeline.get_by_name("sink"), max_buffers=2)
+
+    def tearDown(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+    def testIterate(self):
+        self.pipeline.set_state(Gst.State.PLAYING)
+        views = [view.tobytes() for view in self.stream.views()]
+        self.assertEqual(views, [b"\0\0\0\0"] * 10)
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def testAsyncIterate(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+        samples = []
+        try:
+            while True:
+                samples.append(loop.run_until_complete(
+                    asyncio.wait_for(self.stream.__anext__(), 5)))
+        except StopAsyncIteration:
+            pass
+        finally:
+            self.stream.close()
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(len(samples), 10)
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def testAsyncClose(self):
+        # the appsrc produces nothing
+        pipeline = Gst.parse_launch("appsrc ! appsink name=sink")
+        stream = GstApp.AppSinkStream(pipeline.get_by_name("sink"))
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        pipeline.set_state(Gst.State.PLAYING)
+        try:
+            waiting = stream.__anext__()
+            loop.call_soon(stream.close)
+            self.assertRaises(StopAsyncIteration, loop.run_until_complete,
+                              asyncio.wait_for(waiting, 5))
+            self.assertRaises(StopAsyncIteration, stream.__anext__)
+        finally:
+            pipeline.set_state(Gst.State.NULL)
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def testInvalidPolicy(self):
+        self.assertRaises(ValueError, GstApp.AppSinkStream,
+                          self.pipeline.get_by_name("sink"), policy="leak")
+
+
+@unittest.skipIf(not HAVE_APP, "the app plugin is not available")
+class TestAppSrcDriver(TestCase):
+    def setUp(self):
+        self.pipeline = Gst.parse_launch("appsrc name=src ! appsink name=sink")
+        self.stream = GstApp.AppSinkStream(self.pipeline.get_by_name("sink"))
+
+    def tearDown(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+    def checkSamples(self):
+        samples = list(self.stream)
+        self.assertEqual([s.get_buffer().pts for s in samples],
+                         [Gst.util_uint64_scale(i, Gst.SECOND, 25)
+                          for i in range(10)])
+        self.assertEqual(samples[0].get_buffer().extract_dup(0, 4), b"abcd")
+
+    def testRun(self):
+        driver = GstApp.AppSrcDriver(self.pipeline.get_by_name("src"),
+                                     (b"abcd" for i in range(10)),
+                                     rate=(25, 1), batch_size=4)
+        self.pipeline.set_state(Gst.State.PLAYING)
+        self.assertEqual(driver.run(), Gst.FlowReturn.OK)
+        self.checkSamples()
+
+    @unittest.skipIf(asyncio is None, "asyncio is not available")
+    def testRunAsync(self):
+        driver = GstApp.AppSrcDriver(self.pipeline.get_by_name("src"),
+                                     [bytearray(b"abcd")] * 10, rate=25,
+                                     batch_size=3)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.pipeline.set_state(Gst.State.PLAYING)
+        try:
+            ret = loop.run_until_complete(
+                asyncio.wait_for(driver.run_async(), 5))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertEqual(ret, Gst.FlowReturn.OK)
+        self.checkSamples()
+
+
+if __name__ == "__main__":
+    unittest.main()
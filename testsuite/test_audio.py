@@ -0,0 +1,85 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import gi
+gi.require_version('GstAudio', '1.0')
+
+from gi.repository import Gst, GstAudio
+Gst.init(None)
+
+
+def audio_info(caps):
+    info = GstAudio.AudioInfo()
+    info.from_caps(Gst.Caps.from_string(caps))
+    return info
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestBufAsArray(TestCase):
+    def testInterleaved(self):
+        info = audio_info("audio/x-raw,format=S16LE,rate=8000,channels=2,"
+                          "layout=interleaved")
+        buf = Gst.Buffer.new_wrapped(
+            numpy.arange(6, dtype='<i2').tobytes())
+
+        array = GstAudio.buf_as_array(buf, info)
+        self.assertEqual(array.dtype, numpy.dtype('<i2'))
+        self.assertEqual(array.tolist(), [[0, 1], [2, 3], [4, 5]])
+
+    def testNonInterleaved(self):
+        info = audio_info("audio/x-raw,format=F32LE,rate=8000,channels=2,"
+                          "layout=non-interleaved")
+        buf = Gst.Buffer.new_wrapped(
+            numpy.arange(6, dtype='<f4').tobytes())
+
+        array = GstAudio.buf_as_array(buf, info)
+        self.assertEqual(array.tolist(), [[0, 1, 2], [3, 4, 5]])
+
+    def testNonInterleavedWithMetaOffsets(self):
+        info = audio_info("audio/x-raw,format=S16LE,rate=8000,channels=2,"
+                          "layout=non-interleaved")
+        buf = Gst.Buffer.new_wrapped(
+            numpy.arange(8, dtype='<i2').tobytes())
+        GstAudio.buffer_add_audio_meta(buf, info, 4, None)
+
+        # trimming non-interleaved audio only moves the planes in the meta,
+        # leaving gaps between them
+        buf = GstAudio.AudioBuffer.truncate(buf, info.bpf, 1, 2)
+
+        array = GstAudio.buf_as_array(buf, info)
+        self.assertEqual(array.shape, (2, 2))
+        self.assertEqual(array.tolist(), [[1, 2], [5, 6]])
+
+    def testInvalidInfo(self):
+        buf = Gst.Buffer.new_wrapped(b"\0" * 4)
+        self.assertRaises(ValueError, GstAudio.buf_as_array, buf,
+                          GstAudio.AudioInfo())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import os
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from gi.repository import Gst
+from gi.overrides import _gi_gst
+Gst.init(None)
+
+
+class TestBufferMap(TestCase):
+    def testMapRead(self):
+        buf = Gst.Buffer.new_wrapped(b"abcd")
+        with buf.map_memoryview(Gst.MapFlags.READ) as mv:
+            self.assertEqual(len(mv), 4)
+            self.assertTrue(mv.readonly)
+            self.assertEqual(mv.tobytes(), b"abcd")
+
+        self.assertRaises(ValueError, len, mv)
+
+    def testMapWrite(self):
+        buf = Gst.Buffer.new_wrapped(b"abcd")
+        with buf.map_memoryview(Gst.MapFlags.READ | Gst.MapFlags.WRITE) as mv:
+            self.assertFalse(mv.readonly)
+            mv[0] = ord("x")
+
+        self.assertEqual(buf.extract_dup(0, 4), b"xbcd")
+
+    def testUnmapWithExportedView(self):
+        buf = Gst.Buffer.new_wrapped(b"abcd")
+        mapping = _gi_gst.buffer_map(buf, Gst.MapFlags.READ)
+        view = memoryview(mapping)
+        self.assertRaises(BufferError, mapping.unmap)
+        view.release()
+        mapping.unmap()
+        self.assertFalse(mapping.mapped)
+
+    def testErrorWithExportedView(self):
+        buf = Gst.Buffer.new_wrapped(b"abcd")
+        kept = []
+        with self.assertRaises(KeyError):
+            with buf.map_memoryview(Gst.MapFlags.READ) as mv:
+                kept.append(mv[1:])
+                raise KeyError("failed")
+
+
+class TestBufferNewWrappedObject(TestCase):
+    def testWrapBytearray(self):
+        data = bytearray(b"abcd")
+        buf = Gst.Buffer.new_wrapped_object(data)
+        self.assertEqual(buf.get_size(), 4)
+
+        data[0] = ord("x")
+        self.assertEqual(buf.extract_dup(0, 4), b"xbcd")
+
+        with buf.map_memoryview(Gst.MapFlags.WRITE) as mv:
+            mv[1] = ord("y")
+        self.assertEqual(data, b"xycd")
+
+    def testWrapBytesIsReadOnly(self):
+        buf = Gst.Buffer.new_wrapped_object(b"abcd")
+        self.assertEqual(buf.extract_dup(0, 4), b"abcd")
+        self.assertRaises(ValueError, buf.map_memoryview(
+            Gst.MapFlags.WRITE).__enter__)
+
+    def testWrapInvalidObject(self):
+        self.assertRaises(TypeError, Gst.Buffer.new_wrapped_object, 42)
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestNumpyBufferPool(TestCase):
+    def testAcquireRelease(self):
+        pool = Gst.NumpyBufferPool(max_free_arrays=1)
+        config = pool.get_config()
+        Gst.BufferPool.config_set_params(config, None, 1024, 1, 2)
+        self.assertTrue(pool.set_config(config))
+        self.assertTrue(pool.set_active(True))
+
+        ret, buf = pool.acquire_buffer(None)
+        self.assertEqual(ret, Gst.FlowReturn.OK)
+        self.assertEqual(buf.get_size(), 1024)
+        with buf.map_memoryview(Gst.MapFlags.WRITE) as mv:
+            mv[0] = 42
+        del buf, mv
+
+        # deactivating frees the buffers, the array is allocated again for
+        # the buffer preallocated when reactivating
+        self.assertTrue(pool.set_active(False))
+        self.assertTrue(pool.set_active(True))
+        ret, buf = pool.acquire_buffer(None)
+        with buf.map_memoryview(Gst.MapFlags.READ) as mv:
+            self.assertEqual(mv[0], 42)
+        del buf, mv
+        self.assertTrue(pool.set_active(False))
+
+    def testResetBuffer(self):
+        pool = Gst.NumpyBufferPool()
+        config = pool.get_config()
+        Gst.BufferPool.config_set_params(config, None, 1024, 1, 1)
+        self.assertTrue(pool.set_config(config))
+        self.assertTrue(pool.set_active(True))
+
+        ret, buf = pool.acquire_buffer(None)
+        buf.set_size(10)
+        buf.pts = 5
+        del buf
+
+        ret, buf = pool.acquire_buffer(None)
+        self.assertEqual(buf.get_size(), 1024)
+        self.assertEqual(buf.pts, Gst.CLOCK_TIME_NONE)
+        del buf
+        self.assertTrue(pool.set_active(False))
+
+    def testDecideAllocation(self):
+        caps = Gst.Caps.from_string("audio/x-raw")
+        pool = Gst.NumpyBufferPool()
+
+        query = Gst.Query.new_allocation(caps, True)
+        query.add_allocation_pool(None, 512, 2, 0)
+        pool.decide_allocation(query)
+        proposed, size, min_buffers, max_buffers = \
+            query.parse_nth_allocation_pool(0)
+        self.assertIs(proposed, pool)
+        self.assertEqual((size, min_buffers, max_buffers), (512, 2, 0))
+
+        query = Gst.Query.new_allocation(caps, True)
+        self.assertRaises(ValueError, pool.decide_allocation, query)
+        pool.decide_allocation(query, 256)
+        self.assertEqual(query.get_n_allocation_pools(), 1)
+        self.assertEqual(query.parse_nth_allocation_pool(0)[1], 256)
+
+
+@unittest.skipIf(os.name != "posix", "shared memory needs a unix platform")
+class TestMemfdAllocator(TestCase):
+    def testShareBuffer(self):
+        allocator = Gst.memfd_allocator_get()
+        buf = Gst.Buffer.new()
+        buf.append_memory(allocator.alloc(16, None))
+        with buf.map_memoryview(Gst.MapFlags.WRITE) as mv:
+            mv[:4] = b"abcd"
+
+        memfds = buf.get_memfds()
+        self.assertEqual(len(memfds), 1)
+        self.assertEqual(memfds[0][2], 16)
+
+        shared = Gst.Buffer.new_from_memfds(memfds)
+        self.assertEqual(shared.extract_dup(0, 4), b"abcd")
+
+        with buf.map_memoryview(Gst.MapFlags.WRITE) as mv:
+            mv[:4] = b"efgh"
+        self.assertEqual(shared.extract_dup(0, 4), b"efgh")
+
+    def testNotMemfdMemory(self):
+        buf = Gst.Buffer.new_wrapped(b"abcd")
+        self.assertRaises(ValueError, buf.get_memfds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import gc
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from gi.repository import Gst
+Gst.init(None)
+
+
+def _application_message(name):
+    return Gst.Message.new_application(None, Gst.Structure.new_empty(name))
+
+
+class TestBus(TestCase):
+    def testDrain(self):
+        bus = Gst.Bus.new()
+        for i in range(3):
+            bus.post(_application_message("app%d" % i))
+        bus.post(Gst.Message.new_eos(None))
+
+        messages = bus.drain(Gst.MessageType.APPLICATION, 2)
+        self.assertEqual([m.get_structure().get_name() for m in messages],
+                         ["app0", "app1"])
+
+        messages = bus.drain(Gst.MessageType.APPLICATION)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual([m.type for m in bus.drain()], [Gst.MessageType.EOS])
+        self.assertIsNone(bus.pop())
+
+    def testDrainKeepsOtherTypes(self):
+        bus = Gst.Bus.new()
+        bus.post(_application_message("app0"))
+        bus.post(Gst.Message.new_eos(None))
+        bus.post(_application_message("app1"))
+        bus.post(Gst.Message.new_eos(None))
+        bus.post(_application_message("app2"))
+
+        # the matches behind a message of another type are popped too
+        messages = bus.drain(Gst.MessageType.APPLICATION, 2)
+        self.assertEqual([m.get_structure().get_name() for m in messages],
+                         ["app0", "app1"])
+
+        # the others are still there, in order
+        self.assertEqual([m.type for m in bus.drain()],
+                         [Gst.MessageType.EOS, Gst.MessageType.EOS,
+                          Gst.MessageType.APPLICATION])
+        self.assertIsNone(bus.pop())
+
+    def testDrainNotSeenTwiceBySyncHandler(self):
+        bus = Gst.Bus.new()
+        handled = []
+
+        def handler(bus, message):
+            handled.append(message.type)
+            return Gst.BusSyncReply.PASS
+
+        bus.set_sync_handler(handler)
+        bus.post(Gst.Message.new_eos(None))
+        bus.post(_application_message("app"))
+        self.assertEqual(len(bus.drain(Gst.MessageType.APPLICATION)), 1)
+        self.assertEqual(handled, [Gst.MessageType.EOS,
+                                   Gst.MessageType.APPLICATION])
+        self.assertEqual(bus.pop().type, Gst.MessageType.EOS)
+        bus.set_sync_handler(None)
+
+    def testSyncHandlerFiltered(self):
+        bus = Gst.Bus.new()
+        handled = []
+
+        def handler(bus, message, reply):
+            handled.append(message.type)
+            return reply
+
+        bus.set_sync_handler_filtered(Gst.MessageType.EOS, handler,
+                                      Gst.BusSyncReply.DROP)
+        bus.post(_application_message("app"))
+        bus.post(Gst.Message.new_eos(None))
+
+        self.assertEqual(handled, [Gst.MessageType.EOS])
+        messages = bus.drain()
+        self.assertEqual([m.type for m in messages],
+                         [Gst.MessageType.APPLICATION])
+
+        bus.set_sync_handler_filtered(0, None)
+        bus.post(Gst.Message.new_eos(None))
+        self.assertEqual(len(handled), 1)
+
+    def testSyncHandlerNotReplaced(self):
+        bus = Gst.Bus.new()
+        handled = []
+
+        def handler(bus, message):
+            handled.append(message.type)
+            return Gst.BusSyncReply.PASS
+
+        bus.set_sync_handler(handler)
+        self.assertRaises(RuntimeError, bus.set_sync_handler_filtered,
+                          Gst.MessageType.EOS, handler)
+        bus.post(Gst.Message.new_eos(None))
+        self.assertEqual(handled, [Gst.MessageType.EOS])
+
+        bus.set_sync_handler(None)
+        bus.set_sync_handler_filtered(Gst.MessageType.EOS, handler)
+        bus.post(Gst.Message.new_eos(None))
+        self.assertEqual(len(handled), 2)
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class TestAsyncio(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_until_complete(self, awaitable):
+        return self.loop.run_until_complete(asyncio.wait_for(awaitable, 5))
+
+    def testMessages(self):
+        bus = Gst.Bus.new()
+        messages = bus.messages(Gst.MessageType.EOS)
+        bus.post(_application_message("ignored"))
+        bus.post(Gst.Message.new_eos(None))
+
+        message = self.run_until_complete(messages.__anext__())
+        self.assertEqual(message.type, Gst.MessageType.EOS)
+
+        messages.close()
+        self.assertRaises(StopAsyncIteration, messages.__anext__)
+
+    def testMessagesKeepsOtherTypes(self):
+        bus = Gst.Bus.new()
+        messages = bus.messages(Gst.MessageType.EOS)
+        bus.post(_application_message("kept"))
+        bus.post(Gst.Message.new_eos(None))
+
+        message = self.run_until_complete(messages.__anext__())
+        self.assertEqual(message.type, Gst.MessageType.EOS)
+        messages.close()
+
+        kept = bus.drain()
+        self.assertEqual([m.get_structure().get_name() for m in kept],
+                         ["kept"])
+
+    def testMessagesLeaveOtherTypesOnBus(self):
+        bus = Gst.Bus.new()
+        messages = bus.messages(Gst.MessageType.EOS)
+        bus.post(_application_message("kept"))
+        bus.post(Gst.Message.new_eos(None))
+
+        # only the messages of the iterator are taken from the bus
+        self.assertEqual(bus.pop().type, Gst.MessageType.APPLICATION)
+        self.assertIsNone(bus.pop())
+        message = self.run_until_complete(messages.__anext__())
+        self.assertEqual(message.type, Gst.MessageType.EOS)
+        messages.close()
+
+    def testMessagesClosedWhileWaiting(self):
+        bus = Gst.Bus.new()
+        messages = bus.messages(Gst.MessageType.EOS)
+        waiting = messages.__anext__()
+        self.loop.call_soon(messages.close)
+        self.assertRaises(StopAsyncIteration, self.run_until_complete,
+                          waiting)
+
+    def testMessagesWithSyncHandler(self):
+        bus = Gst.Bus.new()
+        handled = []
+
+        def handler(bus, message):
+            handled.append(message.type)
+            return Gst.BusSyncReply.PASS
+
+        bus.set_sync_handler(handler)
+        messages = bus.messages(Gst.MessageType.EOS)
+        bus.post(Gst.Message.new_eos(None))
+
+        message = self.run_until_complete(messages.__anext__())
+        self.assertEqual(message.type, Gst.MessageType.EOS)
+        self.assertEqual(handled, [Gst.MessageType.EOS])
+        messages.close()
+        bus.set_sync_handler(None)
+
+    def testMessagesWithoutBusReference(self):
+        pipeline = Gst.Pipeline()
+        messages = pipeline.get_bus().messages(Gst.MessageType.EOS)
+        gc.collect()
+
+        pipeline.post_message(Gst.Message.new_eos(pipeline))
+        message = self.run_until_complete(messages.__anext__())
+        self.assertEqual(message.src, pipeline)
+        messages.close()
+
+    def testSetStateAsync(self):
+        pipeline = Gst.parse_launch("fakesrc ! fakesink")
+        ret = self.run_until_complete(
+            pipeline.set_state_async(Gst.State.PAUSED))
+        self.assertEqual(ret, Gst.StateChangeReturn.SUCCESS)
+        self.assertEqual(pipeline.get_state(0)[1], Gst.State.PAUSED)
+        pipeline.set_state(Gst.State.NULL)
+
+    def testSetStateAsyncLeavesMessages(self):
+        pipeline = Gst.parse_launch("fakesrc ! fakesink")
+        self.run_until_complete(pipeline.set_state_async(Gst.State.PAUSED))
+        pipeline.set_state(Gst.State.NULL)
+
+        messages = pipeline.get_bus().drain(Gst.MessageType.ASYNC_DONE)
+        self.assertEqual(len(messages), 1)
+
+    def testSetStateAsyncWithoutBusReference(self):
+        pipeline = Gst.parse_launch("fakesrc ! fakesink")
+        future = pipeline.set_state_async(Gst.State.PAUSED)
+        gc.collect()
+
+        ret = self.run_until_complete(future)
+        self.assertEqual(ret, Gst.StateChangeReturn.SUCCESS)
+        pipeline.set_state(Gst.State.NULL)
+
+    def testPromise(self):
+        promise = Gst.Promise.new_async()
+        promise.reply(Gst.Structure.new_empty("reply"))
+        reply = self.run_until_complete(promise)
+        self.assertEqual(reply.get_name(), "reply")
+
+    def testPromiseInterrupted(self):
+        promise = Gst.Promise.new_async()
+        promise.interrupt()
+        self.assertRaises(Gst.PromiseError, self.run_until_complete, promise)
+
+
+if __name__ == "__main__":
+    unittest.main()
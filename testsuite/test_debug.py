@@ -0,0 +1,75 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import gc
+import weakref
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+from gi.repository import Gst
+Gst.init(None)
+
+
+class TestDebugLog(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        # whatever GST_DEBUG and the default threshold of the build are
+        Gst.debug_set_threshold_for_name("python", Gst.DebugLevel.ERROR)
+
+    def tearDown(self):
+        Gst.debug_unset_threshold_for_name("python")
+        TestCase.tearDown(self)
+
+    def testFormatArgs(self):
+        Gst.error("%s %d", "formatted", 1)
+        self.assertRaises(TypeError, Gst.error, "%d", "not a number")
+
+    def testNotFormattedWhenDisabled(self):
+        Gst.memdump("%d", "not a number")
+
+    def testCategory(self):
+        cat = Gst.debug_category_new("pytestcategory", 0, "Test category")
+        self.assertEqual(cat.name, "pytestcategory")
+        self.assertEqual(cat.description, "Test category")
+
+        cat.set_threshold(Gst.DebugLevel.LOG)
+        self.assertEqual(cat.get_threshold(), Gst.DebugLevel.LOG)
+        self.assertRaises(TypeError, cat.log, "%d", "not a number")
+        cat.debug("%s", "formatted")
+
+        cat.set_threshold(Gst.DebugLevel.NONE)
+        cat.log("%d", "not a number")
+
+    def testCallSitesDontKeepCode(self):
+        cat = Gst.debug_category_new("pytestcallsites", 0, "Test category")
+        cat.set_threshold(Gst.DebugLevel.LOG)
+
+        namespace = {}
+        exec("def log(cat):\n    cat.log('from exec')\n", namespace)
+        namespace['log'](cat)
+        code = weakref.ref(namespace['log'].__code__)
+        del namespace
+        gc.collect()
+        self.assertIsNone(code())
+        cat.set_threshold(Gst.DebugLevel.NONE)
+
+
+if __name__ == "__main__":
+    unittest.main()
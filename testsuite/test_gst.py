@@ -53,6 +53,13 @@ class TestNotInitialized(TestCase):
         with self.assertRaises(assert_type):
             Gst.ElementFactory.make("identity", None)
 
+    def testLazilyGuarded(self):
+        # Only resolved when first accessed, which must still be guarded
+        self.assertNotIn("util_get_timestamp",
+                         Gst._introspection_module.__dict__)
+        with self.assertRaises(Gst.NotInitialized):
+            Gst.util_get_timestamp()
+
     def testNotDeinitialized(self):
         Gst.init(None)
 
@@ -0,0 +1,155 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+from gi.repository import Gst
+Gst.init(None)
+
+
+def _new_buffer_list(*contents):
+    buffer_list = Gst.BufferList.new()
+    for data in contents:
+        buffer_list.add(Gst.Buffer.new_wrapped(data))
+    return buffer_list
+
+
+class TestBufferList(TestCase):
+    def testSequence(self):
+        buffer_list = _new_buffer_list(b"a", b"bc")
+        self.assertEqual(len(buffer_list), 2)
+        self.assertEqual(buffer_list[1].get_size(), 2)
+        self.assertEqual(buffer_list[-1].get_size(), 2)
+        self.assertEqual([b.get_size() for b in buffer_list], [1, 2])
+        self.assertRaises(IndexError, buffer_list.__getitem__, 2)
+
+
+class TestPadChainList(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.src = Gst.Pad.new("src", Gst.PadDirection.SRC)
+        self.sink = Gst.Pad.new("sink", Gst.PadDirection.SINK)
+        self.src.link(self.sink)
+        self.src.set_active(True)
+        self.sink.set_active(True)
+        self.src.push_event(Gst.Event.new_stream_start("test"))
+        self.src.push_event(Gst.Event.new_caps(Gst.Caps.new_any()))
+        segment = Gst.Segment()
+        segment.init(Gst.Format.BYTES)
+        self.src.push_event(Gst.Event.new_segment(segment))
+
+    def tearDown(self):
+        self.src.set_active(False)
+        self.sink.set_active(False)
+        TestCase.tearDown(self)
+
+    def testChainList(self):
+        received = []
+
+        def chain_list(pad, buffer_list):
+            received.append([b.get_size() for b in buffer_list])
+            return Gst.FlowReturn.OK
+
+        self.sink.set_chain_list_function(chain_list)
+        ret = self.src.push_list(_new_buffer_list(b"a", b"bc", b"def"))
+        self.assertEqual(ret, Gst.FlowReturn.OK)
+        self.assertEqual(received, [[1, 2, 3]])
+
+    def testChainListFallsBackToChain(self):
+        received = []
+
+        def chain(pad, buf):
+            received.append(buf.get_size())
+            return Gst.FlowReturn.OK
+
+        self.sink.set_chain_function(chain)
+        ret = self.src.push_list(_new_buffer_list(b"a", b"bc"))
+        self.assertEqual(ret, Gst.FlowReturn.OK)
+        self.assertEqual(received, [1, 2])
+
+
+class TestPadFunctions(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.src = Gst.Pad.new("src", Gst.PadDirection.SRC)
+        self.sink = Gst.Pad.new("sink", Gst.PadDirection.SINK)
+        self.src.link(self.sink)
+        self.src.set_active(True)
+        self.sink.set_active(True)
+
+    def tearDown(self):
+        self.src.set_active(False)
+        self.sink.set_active(False)
+        TestCase.tearDown(self)
+
+    def testEventFunction(self):
+        events = []
+
+        def event(pad, event):
+            events.append(event.type)
+            return True
+
+        self.sink.set_event_function(event)
+        self.assertTrue(self.src.push_event(Gst.Event.new_stream_start("s")))
+        self.assertEqual(events, [Gst.EventType.STREAM_START])
+
+    def testQueryFunctionWithParent(self):
+        def query(pad, parent, query):
+            self.assertIsNone(parent)
+            query.set_position(Gst.Format.TIME, 42)
+            return True
+
+        self.sink.set_query_function(query)
+        q = Gst.Query.new_position(Gst.Format.TIME)
+        self.assertTrue(self.src.peer_query(q))
+        self.assertEqual(q.parse_position(), (Gst.Format.TIME, 42))
+
+    def testQueryFunctionKeepsQuery(self):
+        kept = []
+
+        def query(pad, query):
+            kept.append(query)
+            return False
+
+        self.sink.set_query_function(query)
+        q = Gst.Query.new_position(Gst.Format.TIME)
+        self.assertFalse(self.src.peer_query(q))
+        del q
+        self.assertEqual(kept[0].type, Gst.QueryType.POSITION)
+
+    def testOptionalThirdParameter(self):
+        events = []
+
+        def event(pad, event, extra=None):
+            events.append((event.type, extra))
+            return True
+
+        self.sink.set_event_function(event)
+        self.assertTrue(self.src.push_event(Gst.Event.new_stream_start("s")))
+        self.assertEqual(events, [(Gst.EventType.STREAM_START, None)])
+
+    def testInvalidFunction(self):
+        self.assertRaises(TypeError, self.sink.set_query_function,
+                          lambda query: True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,380 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+from gi.repository import Gst
+Gst.init(None)
+
+# Scans the plugin directories in a fresh process and prints, for each element
+# name given, whether its factory exists, whether the modules were imported
+# before creating the element, the class of the element, the one inside it when
+# it is the placeholder of a manifest, whether it can go to READY, the class
+# of a second element, what its "value" property reads once set to 7 and the
+# class of its "inner" child.
+SNIPPET = """
+import json
+import os
+import sys
+import overrides_hack
+from gi.repository import Gst
+Gst.init(None)
+
+
+def describe(element):
+    if element is None:
+        return None, False
+    if element.__gtype__.name.startswith("GstPythonLazy+"):
+        children = list(element.iterate_elements())
+        return type(children[0]).__name__ if children else None, True
+    return type(element).__name__, False
+
+
+def value(element):
+    if element is None or element.find_property("value") is None:
+        return None
+    element.set_property("value", 7)
+    return element.get_property("value")
+
+
+def inner(element):
+    if not isinstance(element, Gst.ChildProxy):
+        return None
+    child = element.get_child_by_name("inner")
+    return type(child).__name__ if child is not None else None
+
+
+marker = os.environ["GST_PYTHON_TEST_MARKER"]
+result = {}
+for name in sys.argv[1:]:
+    imported = os.path.exists(marker)
+    element = Gst.ElementFactory.make(name, None)
+    cls, placeholder = describe(element)
+    ready = element is not None and \\
+        element.set_state(Gst.State.READY) != Gst.StateChangeReturn.FAILURE
+    if element is not None:
+        element.set_state(Gst.State.NULL)
+    result[name] = {
+        "factory": Gst.ElementFactory.find(name) is not None,
+        "imported": imported,
+        "element": cls,
+        "placeholder": placeholder,
+        "ready": ready,
+        "value": value(element),
+        "inner": inner(element),
+        "again": describe(Gst.ElementFactory.make(name, None))[0],
+    }
+print(json.dumps(result))
+"""
+
+ELEMENT = """
+from gi.repository import Gst, GObject, GstBase
+Gst.init(None)
+
+with open(%(marker)r, "a") as f:
+    f.write(__name__ + "\\n")
+
+
+class %(cls)s(GstBase.BaseTransform):
+    __gstmetadata__ = ('%(cls)s', 'Transform', 'Test element', 'gst-python')
+
+    __gsttemplates__ = (Gst.PadTemplate.new("src",
+                                            Gst.PadDirection.SRC,
+                                            Gst.PadPresence.ALWAYS,
+                                            Gst.Caps.new_any()),
+                        Gst.PadTemplate.new("sink",
+                                            Gst.PadDirection.SINK,
+                                            Gst.PadPresence.ALWAYS,
+                                            Gst.Caps.new_any()))
+
+GObject.type_register(%(cls)s)
+__gstelementfactory__ = ("%(name)s", Gst.Rank.NONE, %(cls)s)
+"""
+
+MANIFEST = """
+[%(name)s]
+rank=0
+long-name=%(name)s
+klass=Transform
+description=Test element
+author=gst-python
+pad-templates=src;sink;
+
+[%(name)s:src]
+direction=src
+presence=always
+caps=ANY
+
+[%(name)s:sink]
+direction=sink
+presence=always
+caps=ANY
+"""
+
+
+@unittest.skipIf(Gst.Registry.get().find_plugin("python") is None,
+                 "the python plugin loader is not available")
+class PluginTestCase(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        self.plugindir = os.path.join(self.tmpdir, "python")
+        self.marker = os.path.join(self.tmpdir, "imported")
+        os.mkdir(self.plugindir)
+        self.runs = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        TestCase.tearDown(self)
+
+    def write(self, path, contents):
+        path = os.path.join(self.plugindir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(textwrap.dedent(contents))
+
+    def write_element(self, path, name):
+        self.write(path, ELEMENT % {"marker": self.marker, "name": name,
+                                    "cls": name.capitalize()})
+
+    def imported(self):
+        if not os.path.exists(self.marker):
+            return []
+        with open(self.marker) as f:
+            return f.read().split()
+
+    def scan(self, *names):
+        # a new registry for every run, so that the directories are scanned
+        # again, the module cache is kept between the runs of a test
+        self.runs += 1
+        if os.path.exists(self.marker):
+            os.remove(self.marker)
+        env = dict(os.environ)
+        env["GST_PLUGIN_PATH"] = self.tmpdir
+        env["GST_REGISTRY"] = os.path.join(self.tmpdir,
+                                           "registry%d" % self.runs)
+        env["GST_PYTHON_PLUGIN_CACHE_DIR"] = os.path.join(self.tmpdir,
+                                                          "cache")
+        env["GST_PYTHON_TEST_MARKER"] = self.marker
+        output = subprocess.check_output(
+            [sys.executable, "-c", SNIPPET] + list(names), env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        return json.loads(output.decode().strip().splitlines()[-1])
+
+
+class TestManifest(PluginTestCase):
+    def testLazyImport(self):
+        self.write_element("lazyelement.py", "pylazy")
+        self.write("lazyelement.gstmanifest", MANIFEST % {"name": "pylazy"})
+
+        result = self.scan("pylazy")["pylazy"]
+        self.assertTrue(result["factory"])
+        self.assertFalse(result["imported"])
+        self.assertEqual(result["element"], "Pylazy")
+        self.assertTrue(result["placeholder"])
+        self.assertTrue(result["ready"])
+        # registered again with the class once imported
+        self.assertEqual(result["again"], "Pylazy")
+        self.assertEqual(self.imported(), ["lazyelement"])
+
+    def testPackage(self):
+        self.write_element("lazypackage/__init__.py", "pylazypackage")
+        self.write("lazypackage/__init__.gstmanifest",
+                   MANIFEST % {"name": "pylazypackage"})
+
+        result = self.scan("pylazypackage")["pylazypackage"]
+        self.assertFalse(result["imported"])
+        self.assertEqual(result["element"], "Pylazypackage")
+
+    def testBrokenModule(self):
+        self.write("broken.py", "raise ImportError('broken')\n")
+        self.write("broken.gstmanifest", MANIFEST % {"name": "pybroken"})
+
+        result = self.scan("pybroken")["pybroken"]
+        self.assertTrue(result["factory"])
+        self.assertIsNone(result["element"])
+        self.assertTrue(result["placeholder"])
+        self.assertFalse(result["ready"])
+
+    def testMissingElement(self):
+        self.write_element("mismatch.py", "pyother")
+        self.write("mismatch.gstmanifest", MANIFEST % {"name": "pymissing"})
+
+        result = self.scan("pymissing")["pymissing"]
+        self.assertTrue(result["factory"])
+        self.assertIsNone(result["element"])
+        self.assertTrue(result["placeholder"])
+        self.assertFalse(result["ready"])
+
+
+class TestScan(PluginTestCase):
+    def testTopLevelModules(self):
+        self.write_element("_private.py", "pyprivate")
+
+        result = self.scan("pyprivate")["pyprivate"]
+        self.assertTrue(result["factory"])
+        self.assertEqual(result["element"], "Pyprivate")
+
+    def testPackages(self):
+        self.write("package/__init__.py", "")
+        self.write_element("package/public.py", "pypublic")
+        self.write_element("package/_helper.py", "pyhelper")
+        self.write("package/sub/__init__.py", "")
+        self.write_element("package/sub/nested.py", "pynested")
+        # not packages
+        self.write_element("data/notpackage.py", "pynotpackage")
+        self.write_element("package/data/notpackage.py", "pynotsubpackage")
+
+        result = self.scan("pypublic", "pyhelper", "pynested", "pynotpackage",
+                           "pynotsubpackage")
+        self.assertEqual(dict((name, value["factory"])
+                              for name, value in result.items()),
+                         {"pypublic": True, "pyhelper": False,
+                          "pynested": True, "pynotpackage": False,
+                          "pynotsubpackage": False})
+        self.assertNotIn("data.notpackage", self.imported())
+
+
+CACHED = """
+from gi.repository import Gst, GObject
+Gst.init(None)
+from %(names)s import NAME
+
+with open(%(marker)r, "a") as f:
+    f.write(__name__ + "\\n")
+
+
+class Cached(%(base)s):
+    __gstmetadata__ = ('Cached', 'Generic', 'Test element', 'gst-python')
+%(body)s
+
+GObject.type_register(Cached)
+__gstelementfactory__ = (NAME, Gst.Rank.NONE, Cached)
+"""
+
+
+class TestCache(PluginTestCase):
+    def write_cached(self, path, names, base="Gst.Element", body=""):
+        self.write(path, CACHED % {"marker": self.marker, "names": names,
+                                   "base": base, "body": body})
+
+    def testPackageHelperChanged(self):
+        self.write_cached("cached/__init__.py", "._names")
+        self.write("cached/_names.py", "NAME = 'pycachedone'\n")
+
+        self.assertTrue(self.scan("pycachedone")["pycachedone"]["imported"])
+        result = self.scan("pycachedone")["pycachedone"]
+        self.assertFalse(result["imported"])
+        self.assertEqual(result["element"], "Cached")
+
+        # only the helper of the package changes
+        self.write("cached/_names.py", "NAME = 'pycachedsecond'\n")
+        result = self.scan("pycachedone", "pycachedsecond")
+        self.assertFalse(result["pycachedone"]["factory"])
+        self.assertTrue(result["pycachedsecond"]["factory"])
+
+    def testTopLevelHelperChanged(self):
+        self.write_cached("cachedmodule.py", "_cachednames")
+        self.write("_cachednames.py", "NAME = 'pycachedone'\n")
+
+        self.scan("pycachedone")
+        self.write("_cachednames.py", "NAME = 'pycachedsecond'\n")
+        result = self.scan("pycachedone", "pycachedsecond")
+        self.assertFalse(result["pycachedone"]["factory"])
+        self.assertTrue(result["pycachedsecond"]["factory"])
+
+    def testUnrelatedModuleChanged(self):
+        self.write_cached("cachedone.py", "_cachednames")
+        self.write("_cachednames.py", "NAME = 'pycachedone'\n")
+        self.write_cached("cachedsecond.py", "_cachedother")
+        self.write("_cachedother.py", "NAME = 'pycachedsecond'\n")
+
+        self.scan("pycachedone", "pycachedsecond")
+        self.write("_cachedother.py", "NAME = 'pycachedsecond'\nOTHER = 1\n")
+        result = self.scan("pycachedsecond")["pycachedsecond"]
+        self.assertFalse(result["placeholder"])
+        # the other module is still cached
+        self.assertEqual(self.imported(), ["cachedsecond"])
+
+    def testPropertiesCached(self):
+        self.write_cached("cachedprop.py", "_cachednames", body="""
+    __gproperties__ = {
+        "value": (int, "Value", "A value", 0, 10, 0,
+                  GObject.ParamFlags.READWRITE),
+    }
+
+    def __init__(self):
+        Gst.Element.__init__(self)
+        self.value = 0
+
+    def do_get_property(self, prop):
+        return self.value
+
+    def do_set_property(self, prop, value):
+        self.value = value
+""")
+        self.write("_cachednames.py", "NAME = 'pycachedprop'\n")
+
+        self.assertEqual(self.scan("pycachedprop")["pycachedprop"]["value"], 7)
+        result = self.scan("pycachedprop")["pycachedprop"]
+        self.assertFalse(result["imported"])
+        self.assertTrue(result["placeholder"])
+        # forwarded to the element once imported
+        self.assertEqual(result["value"], 7)
+        self.assertEqual(result["element"], "Cached")
+
+    def testChildProxyCached(self):
+        self.write_cached("cachedbin.py", "_cachednames", base="Gst.Bin",
+                          body="""
+    def __init__(self):
+        Gst.Bin.__init__(self)
+        self.add(Gst.ElementFactory.make("identity", "inner"))
+""")
+        self.write("_cachednames.py", "NAME = 'pycachedbin'\n")
+
+        self.assertEqual(self.scan("pycachedbin")["pycachedbin"]["inner"],
+                         "GstIdentity")
+        result = self.scan("pycachedbin")["pycachedbin"]
+        self.assertFalse(result["imported"])
+        self.assertTrue(result["placeholder"])
+        self.assertEqual(result["inner"], "GstIdentity")
+
+    def testOtherInterfacesNotCached(self):
+        self.write_cached("cachedpreset.py", "_cachednames",
+                          base="Gst.Element, Gst.Preset")
+        self.write("_cachednames.py", "NAME = 'pycachedpreset'\n")
+
+        self.scan("pycachedpreset")
+        result = self.scan("pycachedpreset")["pycachedpreset"]
+        self.assertTrue(result["imported"])
+        self.assertFalse(result["placeholder"])
+
+
+if __name__ == "__main__":
+    unittest.main()
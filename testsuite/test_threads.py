@@ -0,0 +1,347 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import os
+import threading
+import time
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+import gi
+gi.require_version('GstBase', '1.0')
+
+from gi.repository import Gst, GObject, GstBase
+Gst.init(None)
+
+N_BRANCHES = 4
+N_BUFFERS = 500
+
+
+class Counter(GstBase.BaseTransform):
+    __gstmetadata__ = ('Counter', 'Transform',
+                       'Counts buffers from python', 'gst-python')
+
+    __gsttemplates__ = (Gst.PadTemplate.new("src",
+                                            Gst.PadDirection.SRC,
+                                            Gst.PadPresence.ALWAYS,
+                                            Gst.Caps.new_any()),
+                        Gst.PadTemplate.new("sink",
+                                            Gst.PadDirection.SINK,
+                                            Gst.PadPresence.ALWAYS,
+                                            Gst.Caps.new_any()))
+
+    def __init__(self):
+        super(Counter, self).__init__()
+        self.count = 0
+        self.size = 0
+        self.threads = set()
+        self.thread_names = set()
+
+    def do_transform_ip(self, buffer):
+        # touch what is shared between elements: the debug call sites, buffer
+        # mappings and the wrappers of the buffers
+        Gst.log("buffer %d", self.count)
+        with buffer.map_memoryview(Gst.MapFlags.READ) as mv:
+            self.size += len(mv.tobytes())
+        self.threads.add(threading.current_thread().ident)
+        self.thread_names.add(threading.current_thread().name)
+        self.count += 1
+        return Gst.FlowReturn.OK
+
+GObject.type_register(Counter)
+Gst.Element.register(None, "pythreadcounter", Gst.Rank.NONE, Counter)
+
+
+class Reverser(GstBase.ThreadPoolTransform):
+    __gstmetadata__ = ('Reverser', 'Transform',
+                       'Finishes buffers in reverse order', 'gst-python')
+
+    __gsttemplates__ = Counter.__gsttemplates__
+
+    max_workers = 4
+    max_in_flight = 8
+
+    def process(self, buffer):
+        # fakesrc sets the offset in bytes, later buffers of a window of 8
+        # are ready first
+        index = buffer.offset // 4
+        time.sleep((8 - index % 8) * 0.002)
+        if index % 5 == 4:
+            return None
+        return buffer
+
+GObject.type_register(Reverser)
+Gst.Element.register(None, "pythreadreverser", Gst.Rank.NONE, Reverser)
+
+
+class Sleeper(GstBase.ThreadPoolTransform):
+    __gstmetadata__ = ('Sleeper', 'Transform',
+                       'Processes buffers slowly', 'gst-python')
+
+    __gsttemplates__ = Counter.__gsttemplates__
+
+    delay = 0.2
+
+    def process(self, buffer):
+        time.sleep(self.delay)
+        return buffer
+
+GObject.type_register(Sleeper)
+
+
+class Exclaimer(GstBase.ProcessPoolTransform):
+    __gstmetadata__ = ('Exclaimer', 'Transform',
+                       'Appends a byte to buffers in worker processes',
+                       'gst-python')
+
+    __gsttemplates__ = Counter.__gsttemplates__
+
+    max_workers = 2
+    output_size = 16
+
+    @staticmethod
+    def process_data(data):
+        return bytes(data) + b"!"
+
+GObject.type_register(Exclaimer)
+Gst.Element.register(None, "pyprocessexclaimer", Gst.Rank.NONE, Exclaimer)
+
+
+class Copier(GstBase.ProcessPoolTransform):
+    __gstmetadata__ = ('Copier', 'Transform',
+                       'Copies buffers in worker processes', 'gst-python')
+
+    __gsttemplates__ = Counter.__gsttemplates__
+
+    max_workers = 2
+
+    # the workers don't import this module, nor GstBase, to run it
+    process_data = staticmethod(bytes)
+
+GObject.type_register(Copier)
+Gst.Element.register(None, "pyprocesscopier", Gst.Rank.NONE, Copier)
+
+
+class TestConcurrentElements(TestCase):
+    def testBranches(self):
+        pipeline = Gst.parse_launch(" ".join(
+            "fakesrc num-buffers=%d sizetype=fixed sizemax=64 filltype=zero "
+            "! pythreadcounter name=counter%d ! fakesink sync=false" %
+            (N_BUFFERS, i) for i in range(N_BRANCHES)))
+
+        self.assertEqual(pipeline.set_state(Gst.State.PLAYING),
+                         Gst.StateChangeReturn.ASYNC)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        self.assertIsNotNone(msg)
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+
+        threads = set()
+        for i in range(N_BRANCHES):
+            counter = pipeline.get_by_name("counter%d" % i)
+            self.assertEqual(counter.count, N_BUFFERS)
+            self.assertEqual(counter.size, N_BUFFERS * 64)
+            self.assertEqual(len(counter.threads), 1)
+            threads |= counter.threads
+        self.assertEqual(len(threads), N_BRANCHES)
+
+
+class TestThreadPoolTransform(TestCase):
+    def testOrder(self):
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=64 sizetype=fixed sizemax=4 ! "
+            "pythreadreverser ! fakesink name=sink signal-handoffs=true")
+        offsets = []
+        pipeline.get_by_name("sink").connect(
+            "handoff", lambda sink, buffer, pad: offsets.append(buffer.offset))
+
+        pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(offsets, [i * 4 for i in range(64) if i % 5 != 4])
+
+
+class TestThreadPoolTransformEvents(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        # the source pad of the element is not linked
+        self.pipeline = Gst.Pipeline()
+        self.element = Sleeper()
+        self.pipeline.add(self.element)
+        self.src = Gst.Pad.new("src", Gst.PadDirection.SRC)
+        self.src.link(self.element.get_static_pad("sink"))
+        self.src.set_active(True)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+        self.src.push_event(Gst.Event.new_stream_start("test"))
+        self.src.push_event(Gst.Event.new_caps(Gst.Caps.new_any()))
+        segment = Gst.Segment()
+        segment.init(Gst.Format.BYTES)
+        self.src.push_event(Gst.Event.new_segment(segment))
+
+    def tearDown(self):
+        self.pipeline.set_state(Gst.State.NULL)
+        self.src.set_active(False)
+        TestCase.tearDown(self)
+
+    def testDrainError(self):
+        self.assertEqual(self.src.push(Gst.Buffer.new_allocate(None, 4, None)),
+                         Gst.FlowReturn.OK)
+        self.assertFalse(self.src.push_event(Gst.Event.new_eos()))
+
+        msg = self.pipeline.get_bus().timed_pop_filtered(
+            Gst.SECOND, Gst.MessageType.ERROR)
+        self.assertIsNotNone(msg)
+        self.assertIn("not-linked", msg.parse_error()[1])
+
+    def testFlushCancels(self):
+        self.element.delay = 2
+        self.element.max_in_flight = 1
+        results = []
+
+        def push():
+            # waits for the result of the buffer since the window is full
+            results.append(self.src.push(
+                Gst.Buffer.new_allocate(None, 4, None)))
+
+        thread = threading.Thread(target=push)
+        thread.start()
+        time.sleep(0.1)
+        start = time.time()
+        self.src.push_event(Gst.Event.new_flush_start())
+        thread.join()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(results, [Gst.FlowReturn.FLUSHING])
+        self.src.push_event(Gst.Event.new_flush_stop(True))
+
+
+class TestThreadPoolTaskPool(TestCase):
+    def testPipeline(self):
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=50 ! queue ! pythreadcounter name=counter ! "
+            "fakesink")
+        pipeline.set_task_pool(Gst.ThreadPoolTaskPool())
+
+        pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        counter = pipeline.get_by_name("counter")
+        self.assertEqual(counter.count, 50)
+        for name in counter.thread_names:
+            self.assertTrue(name.startswith("gst-task"), name)
+
+    def testBusWithSyncHandler(self):
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=10 ! queue ! pythreadcounter name=counter ! "
+            "fakesink")
+        handled = []
+
+        def handler(bus, message):
+            handled.append(message.type)
+            return Gst.BusSyncReply.PASS
+
+        pipeline.get_bus().set_sync_handler_filtered(
+            Gst.MessageType.STREAM_STATUS, handler)
+        pipeline.set_task_pool(Gst.ThreadPoolTaskPool())
+        # replaces the previous pool
+        pipeline.set_task_pool(Gst.ThreadPoolTaskPool(max_workers=4))
+
+        pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            30 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+        pipeline.get_bus().set_sync_handler(None)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertIn(Gst.MessageType.STREAM_STATUS, handled)
+        for name in pipeline.get_by_name("counter").thread_names:
+            self.assertTrue(name.startswith("gst-task"), name)
+
+    def testWorkersBusy(self):
+        # the source and the queue each need a worker
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=10 ! queue ! fakesink")
+        pipeline.set_task_pool(Gst.ThreadPoolTaskPool(max_workers=1))
+
+        ret = pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            5 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        # the second task fails to start instead of waiting for the first
+        self.assertTrue(ret == Gst.StateChangeReturn.FAILURE or
+                        (msg is not None and
+                         msg.type == Gst.MessageType.ERROR))
+
+
+@unittest.skipIf(not os.path.isdir("/proc/self/fd"), "the workers need /proc")
+class TestProcessPoolTransform(TestCase):
+    def testMemfd(self):
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=32 sizetype=fixed sizemax=4 filltype=zero ! "
+            "pyprocessexclaimer ! fakesink name=sink signal-handoffs=true")
+        received = []
+        pipeline.get_by_name("sink").connect(
+            "handoff", lambda sink, buffer, pad: received.append(
+                (buffer.offset, buffer.extract_dup(0, buffer.get_size()))))
+        memfds = []
+        pipeline.get_by_name("sink").connect(
+            "handoff", lambda sink, buffer, pad: memfds.append(
+                len(buffer.get_memfds())))
+
+        pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            60 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(received,
+                         [(i * 4, b"\0\0\0\0!") for i in range(32)])
+        # written by the workers in the pushed buffers
+        self.assertEqual(memfds, [1] * 32)
+
+    def testWorkersWithoutGstBase(self):
+        pipeline = Gst.parse_launch(
+            "fakesrc num-buffers=8 sizetype=fixed sizemax=4 filltype=zero ! "
+            "pyprocesscopier ! fakesink name=sink signal-handoffs=true")
+        received = []
+        pipeline.get_by_name("sink").connect(
+            "handoff", lambda sink, buffer, pad: received.append(
+                buffer.extract_dup(0, buffer.get_size())))
+
+        pipeline.set_state(Gst.State.PLAYING)
+        msg = pipeline.get_bus().timed_pop_filtered(
+            60 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        pipeline.set_state(Gst.State.NULL)
+
+        self.assertEqual(msg.type, Gst.MessageType.EOS)
+        self.assertEqual(received, [b"\0\0\0\0"] * 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- Mode: Python; py-indent-offset: 4 -*-
+# vim: tabstop=4 shiftwidth=4 expandtab
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor,
+# Boston, MA 02110-1301, USA.
+
+import overrides_hack
+overrides_hack
+
+from common import TestCase, unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import gi
+gi.require_version('GstVideo', '1.0')
+
+from gi.repository import Gst, GstVideo
+Gst.init(None)
+
+
+def video_info(caps):
+    info = GstVideo.VideoInfo()
+    info.from_caps(Gst.Caps.from_string(caps))
+    return info
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class TestMapFramePlanes(TestCase):
+    def testPacked(self):
+        info = video_info("video/x-raw,format=RGBx,width=4,height=2")
+        buf = Gst.Buffer.new_wrapped(bytes(bytearray(range(info.size))))
+
+        with GstVideo.map_frame_planes(buf, info) as planes:
+            self.assertEqual(len(planes), 1)
+            rgbx = planes[0]
+            self.assertEqual(rgbx.shape, (2, 4, 4))
+            self.assertFalse(rgbx.flags.writeable)
+            self.assertEqual(list(rgbx[1, 0]), [16, 17, 18, 19])
+            del planes, rgbx
+
+    def testPlanarWithStridedMeta(self):
+        info = video_info("video/x-raw,format=I420,width=4,height=4")
+
+        # rows padded to 8 bytes for luma and 4 for chroma, which is not the
+        # layout of the caps
+        strides = [8, 4, 4]
+        offsets = [0, 32, 40]
+        data = bytearray(b"\xff" * 48)
+        for row in range(4):
+            data[row * 8:row * 8 + 4] = bytearray([row] * 4)
+        for plane, value in ((1, 10), (2, 20)):
+            for row in range(2):
+                start = offsets[plane] + row * 4
+                data[start:start + 2] = bytearray([value + row] * 2)
+
+        buf = Gst.Buffer.new_wrapped(bytes(data))
+        GstVideo.buffer_add_video_meta_full(
+            buf, GstVideo.VideoFrameFlags.NONE, GstVideo.VideoFormat.I420,
+            4, 4, 3, offsets, strides)
+
+        with GstVideo.map_frame_planes(buf, info) as planes:
+            y, u, v = planes
+            self.assertEqual(y.shape, (4, 4))
+            self.assertEqual(u.shape, (2, 2))
+            self.assertEqual(y.tolist(), [[row] * 4 for row in range(4)])
+            self.assertEqual(u.tolist(), [[10, 10], [11, 11]])
+            self.assertEqual(v.tolist(), [[20, 20], [21, 21]])
+            del planes, y, u, v
+
+    def testBottomUp(self):
+        info = video_info("video/x-raw,format=GRAY8,width=4,height=2")
+
+        # the first row is the last one in memory
+        buf = Gst.Buffer.new_wrapped(bytes(bytearray(range(8))))
+        GstVideo.buffer_add_video_meta_full(
+            buf, GstVideo.VideoFrameFlags.NONE, GstVideo.VideoFormat.GRAY8,
+            4, 2, 1, [4], [-4])
+
+        with GstVideo.map_frame_planes(buf, info) as planes:
+            self.assertEqual(planes[0].tolist(), [[4, 5, 6, 7], [0, 1, 2, 3]])
+            del planes
+
+    def testWrite(self):
+        info = video_info("video/x-raw,format=GRAY8,width=4,height=2")
+        buf = Gst.Buffer.new_allocate(None, info.size, None)
+
+        with GstVideo.map_frame_planes(buf, info,
+                                       Gst.MapFlags.WRITE) as planes:
+            planes[0][:] = 7
+            del planes
+
+        self.assertEqual(buf.extract_dup(0, 4), b"\x07" * 4)
+
+    def testUnmapWithLiveViews(self):
+        info = video_info("video/x-raw,format=GRAY8,width=4,height=2")
+        buf = Gst.Buffer.new_allocate(None, info.size, None)
+
+        kept = []
+        with self.assertRaises(BufferError):
+            with GstVideo.map_frame_planes(buf, info) as planes:
+                kept.append(planes[0])
+                del planes
+
+        # the frame is unmapped once the last view is gone
+        self.assertEqual(kept[0].shape, (2, 4))
+        del kept[:]
+        with GstVideo.map_frame_planes(buf, info, Gst.MapFlags.WRITE) as p:
+            del p
+
+    def testErrorWithLiveViews(self):
+        info = video_info("video/x-raw,format=GRAY8,width=4,height=2")
+        buf = Gst.Buffer.new_allocate(None, info.size, None)
+
+        with self.assertRaises(KeyError):
+            with GstVideo.map_frame_planes(buf, info) as planes:
+                raise KeyError("failed")
+
+
+if __name__ == "__main__":
+    unittest.main()